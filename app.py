@@ -1,51 +1,395 @@
 # app.py
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+from typing import List, Literal, Optional
+from datetime import datetime
+import asyncio
+import functools
 import joblib
 import pandas as pd
+import numpy as np
+import hashlib
 import os
+import threading
+import time
+import warnings
 import aws_utils # Our S3 script
+import etl # Category levels the models were trained on
+import storage # File digests for the compact model check
+from feature_encoder import FeatureEncoder, SharedEncoder # Precompiled NumPy feature encoding
+from prediction_cache import PredictionCache # Per-model LRU/TTL prediction cache
+from lookup_table import LookupTable # Materialized predictions from train.py --materialize
+from forest_engine import CompiledForest # Flat-array forest inference
+from inference_executor import InferenceExecutor, ExecutorBusy # Bounded pool for model calls
+from micro_batcher import MicroBatcher # Coalesces concurrent single-row requests
+from sensor_state import SensorState # Per-entity ring buffers of raw sensor readings
+import fleet # Precomputed fleet-wide forecasts (fleet.py)
+import metrics # Prometheus-style timers and counters
+
+# Models are fitted on DataFrames but served NumPy rows from FeatureEncoder,
+# whose column order already matches; silence sklearn's per-call name check.
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
 
 app = FastAPI(title="Smart City Forecasting API")
 
+class RequestMetrics:
+    """ASGI middleware timing every HTTP request by method, route template and status.
+
+    Covers what the handlers can't time themselves: FastAPI's body
+    validation and response serialization. Route templates (not raw paths)
+    keep the label set bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.API_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, status[0])
+
+if metrics.ENABLED: # Disabled at startup: no middleware at all
+    app.add_middleware(RequestMetrics)
+
 # --- Model Loading ---
 LOCAL_MODEL_FOLDER = "models"
+PREDICTION_CACHE_SIZE = 4096 # Entries per model
+PREDICTION_CACHE_TTL_SECONDS = 300
+# Memory-map model files instead of reading them in. Compact models (CompiledForest) are served
+# straight from the mapping, so every worker process shares their pages; sklearn copies a .joblib
+# forest's node arrays out of it, so there this only saves reading the file into a buffer first.
+MODEL_MMAP_MODE = "r"
+# Set SMART_CITY_LAZY_LOAD=1 to load each model on its first request instead of at startup
+LAZY_LOAD_MODELS = os.environ.get("SMART_CITY_LAZY_LOAD", "0") == "1"
+# Serve forests through CompiledForest instead of sklearn's predict (falls back if compiling fails)
+COMPILE_FORESTS = True
+# Serve <model>_compact.npz (compress.py: fewer trees, float32) in place of the .joblib it was made from
+SERVE_COMPACT_MODELS = os.environ.get("SMART_CITY_COMPACT_MODELS", "1") == "1"
+# Above this many rows sklearn's threaded tree walk beats the compiled engine's NumPy passes
+COMPILED_MAX_BATCH = 1000
+# Hot reload: every MODEL_WATCH_INTERVAL_SECONDS (0 = off) re-sync the model folder and swap in
+# changed models. Source "s3" pulls from the model bucket first, "local" only watches the folder.
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get("SMART_CITY_MODEL_WATCH_SECONDS", "60"))
+MODEL_WATCH_SOURCE = os.environ.get("SMART_CITY_MODEL_WATCH_SOURCE", "s3")
+WARMUP_ROWS = 16 # Rows scored by a new model version before it takes traffic
+# Model calls run on a dedicated "thread" or "process" pool; past INFERENCE_MAX_PENDING queued
+# calls, requests get a 503 instead of waiting (0 = defaults: one worker per core, 16 per worker)
+INFERENCE_EXECUTOR = os.environ.get("SMART_CITY_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("SMART_CITY_INFERENCE_WORKERS", "0"))
+INFERENCE_MAX_PENDING = int(os.environ.get("SMART_CITY_INFERENCE_MAX_PENDING", "0"))
+# Single-row requests arriving within MICROBATCH_MAX_WAIT_MS of each other (up to MICROBATCH_MAX_BATCH)
+# share one model call; 0 sends every request on its own
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("SMART_CITY_MICROBATCH_MAX_WAIT_MS", "2"))
+MICROBATCH_MAX_BATCH = int(os.environ.get("SMART_CITY_MICROBATCH_MAX_BATCH", "64"))
+# Sensor ingestion: readings kept per entity, and entities tracked per domain (new ones past it are rejected)
+SENSOR_WINDOW = int(os.environ.get("SMART_CITY_SENSOR_WINDOW", "24"))
+SENSOR_MAX_ENTITIES = int(os.environ.get("SMART_CITY_SENSOR_MAX_ENTITIES", "100000"))
 models = {}
 features = {}
+encoders = {}
+engines = {}
+caches = {}
+tables = {}
+horizons = {} # multi-horizon model name -> hours ahead of each of its outputs
+model_versions = {} # model name -> {"version", "loaded_at", "load_seconds"} of the version being served
+available_models = set() # Model files present locally, loaded or not
+_load_lock = threading.Lock() # One model load (startup, lazy or watcher) at a time
+_swap_lock = threading.Lock() # Makes a model's entries across the dicts above change together
+_failed_versions = {} # model name -> version that failed to load, not retried until it changes
+_watcher_stop = threading.Event()
+_watcher_thread = None
+watcher_status = {"source": MODEL_WATCH_SOURCE, "interval_seconds": MODEL_WATCH_INTERVAL_SECONDS,
+                  "last_poll": None, "polls": 0, "reloads": 0}
 
 @app.on_event("startup")
 def load_models():
-    """Download models from S3 and load them into memory."""
+    """Download models from S3 and load them into memory (or just index them when lazy)."""
+    start = time.perf_counter()
     os.makedirs(LOCAL_MODEL_FOLDER, exist_ok=True) # Ensure folder exists
-    aws_utils.download_from_s3(LOCAL_MODEL_FOLDER, aws_utils.MODEL_BUCKET)
+    aws_utils.download_from_s3(LOCAL_MODEL_FOLDER, aws_utils.MODEL_BUCKET, exclude=compacted_joblib)
 
-    print("Loading models into memory...")
-    if not os.listdir(LOCAL_MODEL_FOLDER):
+    print("Loading models into memory..." if not LAZY_LOAD_MODELS else "Indexing models for lazy loading...")
+    model_names = local_model_names()
+    if not model_names:
         print("Warning: No models found in local models folder after S3 download.")
-        return
+    for model_name in model_names:
+        available_models.add(model_name)
+        if not LAZY_LOAD_MODELS or model_name in models: # Already-loaded models are refreshed
+            with _load_lock:
+                load_model(model_name)
 
+    print(f"Model startup finished in {time.perf_counter() - start:.2f}s, "
+          f"{len(models)}/{len(available_models)} models loaded, RSS {current_rss_mb():.1f} MB")
+    start_model_watcher()
+
+@app.on_event("shutdown")
+def stop_model_watcher():
+    _watcher_stop.set()
+
+def local_model_names():
+    """Names of the models with a .joblib (or a compact .npz) in the local model folder."""
+    if not os.path.isdir(LOCAL_MODEL_FOLDER):
+        return []
+    names = set()
     for filename in os.listdir(LOCAL_MODEL_FOLDER):
-        if filename.endswith(".joblib") and not filename.endswith("_features.joblib"):
-            model_name = filename.split('.')[0]
-            try:
-                model_path = os.path.join(LOCAL_MODEL_FOLDER, filename)
-                features_path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_features.joblib")
+        if filename.endswith(".joblib") and not filename.endswith(("_features.joblib", "_targets.joblib")):
+            names.add(filename[:-len(".joblib")])
+        elif SERVE_COMPACT_MODELS and filename.endswith("_compact.npz"):
+            names.add(filename[:-len("_compact.npz")])
+    return sorted(names)
+
+def compacted_joblib(filename, remote_files):
+    """download_from_s3 exclude: skip a model's .joblib when the API will serve its compact file."""
+    return (SERVE_COMPACT_MODELS and filename.endswith(".joblib")
+            and f"{filename[:-len('.joblib')]}_compact.npz" in remote_files)
+
+def model_files(model_name):
+    """Paths of the files that make up one model version."""
+    return {"model": os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}.joblib"),
+            "features": os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_features.joblib"),
+            "compact": os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_compact.npz"),
+            "table": os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_table.npz"),
+            "targets": os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_targets.joblib")} # Multi-horizon only
+
+def model_fingerprint(model_name):
+    """Version id of the model's files on disk: a hash of their names, sizes and mtimes."""
+    digest = hashlib.sha256()
+    for path in model_files(model_name).values():
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+def load_model(model_name):
+    """Loads one model version off the request path, warms it up, then swaps it in.
+
+    Requests keep being served by the previous version (if any) until the
+    swap. Returns True if the new version is now live.
+    """
+    start = time.perf_counter()
+    version = model_fingerprint(model_name)
+    paths = model_files(model_name)
+    try:
+        if not os.path.exists(paths["model"]) and not (SERVE_COMPACT_MODELS and os.path.exists(paths["compact"])):
+            print(f"  Warning: Model file not found during loading: {paths['model']}")
+            return False
+        state = {"model": load_forest(model_name, paths)}
+        if os.path.exists(paths["features"]):
+            state["features"] = joblib.load(paths["features"])
+        else:
+            # Attempt to load model even if features are missing, log warning
+            print(f"  Warning: Loaded {model_name} but feature file missing: {paths['features']}")
+            state["features"] = [] # Assign empty list to avoid key errors later
+        n_expected = getattr(state["model"], "n_features_in_", None)
+        if state["features"] and n_expected is not None and len(state["features"]) != n_expected:
+            raise ValueError(f"feature file lists {len(state['features'])} columns, model expects {n_expected}")
+
+        state["horizons"] = None
+        if os.path.exists(paths["targets"]): # target_<h>h column names, one per model output
+            state["horizons"] = [int(name[len("target_"):-1]) for name in joblib.load(paths["targets"])]
+
+        state["encoder"] = compile_encoder(model_name, state["features"])
+        state["engine"] = compile_forest(model_name, state["model"])
+        warm_up(model_name, state)
+        state["table"] = verify_table(model_name, paths["table"], state)
+    except Exception as e:
+        _failed_versions[model_name] = version
+        print(f"Error loading model {model_name} from {paths['model']}: {e}")
+        return False
+
+    swap_model(model_name, state)
+    _failed_versions.pop(model_name, None)
+    model_versions[model_name] = {"version": version, "load_seconds": round(time.perf_counter() - start, 3),
+                                  "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    print(f"  Loaded {model_name} version {version} in {model_versions[model_name]['load_seconds']:.2f}s.")
+    return True
+
+def swap_model(model_name, state):
+    """Makes a fully loaded model version live in every serving dict at once."""
+    with _swap_lock:
+        old_cache = caches.get(model_name)
+        cache = (old_cache.successor() if old_cache is not None
+                 else PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_SECONDS))
+        for registry, value in ((features, state["features"]), (encoders, state["encoder"]),
+                                (engines, state["engine"]), (tables, state["table"]),
+                                (horizons, state["horizons"])):
+            if value is None:
+                registry.pop(model_name, None)
+            else:
+                registry[model_name] = value
+        caches[model_name] = cache
+        models[model_name] = state["model"]
+    if inference.kind == "process":
+        inference.restart() # Workers forked earlier still hold the previous version
+
+def serving_state(model_key):
+    """Consistent (model, engine, encoder) of the version currently being served."""
+    with _swap_lock:
+        return {"model": models[model_key], "engine": engines.get(model_key),
+                "encoder": encoders.get(model_key)}
+
+def warm_up(model_name, state):
+    """Scores a few rows with a new version so its first request doesn't pay for it."""
+    n_features = getattr(state["model"], "n_features_in_", len(state["features"]))
+    X = np.random.default_rng(0).uniform(0, 100, size=(WARMUP_ROWS, n_features))
+    expected = state["model"].predict(X)
+    if state["engine"] is not None and not np.allclose(state["engine"].predict(X), expected):
+        print(f"  Warning: Compiled {model_name} disagrees with sklearn, serving it with sklearn.")
+        state["engine"] = None
+
+def ensure_loaded(model_key):
+    """Loads a model on first use when LAZY_LOAD_MODELS is on; True if it's available."""
+    if model_key not in models and model_key in available_models:
+        with _load_lock:
+            if model_key not in models: # Another request may have loaded it meanwhile
+                load_model(model_key)
+    return model_key in models
+
+def current_rss_mb():
+    """Resident set size of this process in MB (Linux only, 0 elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+def compile_encoder(model_key, feature_names):
+    """Builds the FeatureEncoder for a model from its feature list (None if it can't)."""
+    domain = MODEL_DOMAINS.get(model_key)
+    if domain and feature_names:
+        return FeatureEncoder(feature_names, DOMAINS[domain]["input"])
+    return None
+
+def load_forest(model_key, paths):
+    """The model's compact CompiledForest (memory-mapped) if there is a current one, else its .joblib."""
+    if SERVE_COMPACT_MODELS and os.path.exists(paths["compact"]):
+        compact = CompiledForest.load(paths["compact"], mmap_mode=MODEL_MMAP_MODE)
+        # A retrained .joblib next to an older compact file wins until compress.py runs again
+        if (not os.path.exists(paths["model"])
+                or storage.file_digest(paths["model"]) == compact.metadata.get("source_digest")):
+            print(f"  Serving compact {model_key} ({compact.n_trees} trees, {compact.nbytes / 2**20:.1f} MB).")
+            return compact
+        print(f"  Warning: Compact {model_key} was made from an older model, serving the .joblib.")
+    return joblib.load(paths["model"], mmap_mode=MODEL_MMAP_MODE)
+
+def compile_forest(model_key, model):
+    """Flattens a loaded forest into a CompiledForest for serving (None to use sklearn)."""
+    if isinstance(model, CompiledForest): # Already compact
+        return model
+    if not COMPILE_FORESTS:
+        return None
+    try:
+        return CompiledForest.from_sklearn(model)
+    except Exception as e:
+        print(f"  Warning: Could not compile {model_key}, serving it with sklearn: {e}")
+        return None
+
+def verify_table(model_key, table_path, state):
+    """Loads the model's lookup table if it matches the model (not e.g. a stale S3 copy)."""
+    if not os.path.exists(table_path):
+        return None
+    domain = MODEL_DOMAINS.get(model_key)
+    try:
+        table = LookupTable.load(table_path)
+        rows, stored = table.sample_rows()
+        if domain and np.allclose(score_rows(domain, rows, state), stored, rtol=1e-9, atol=0):
+            print(f"  Serving {model_key} from its lookup table ({table.values.size} grid points).")
+            return table
+        print(f"  Warning: Lookup table for {model_key} doesn't match the model, ignoring it.")
+    except Exception as e:
+        print(f"  Warning: Could not verify lookup table for {model_key}: {e}")
+    return None
+
+# --- Inference Executor ---
+def _init_inference_worker():
+    """Process workers that weren't forked from a loaded API load the local models themselves."""
+    if not models and not LAZY_LOAD_MODELS:
+        for model_name in local_model_names():
+            available_models.add(model_name)
+            load_model(model_name)
+
+inference = InferenceExecutor(INFERENCE_EXECUTOR, INFERENCE_WORKERS or None, INFERENCE_MAX_PENDING or None,
+                              initializer=_init_inference_worker)
+
+@app.on_event("startup")
+def start_inference_executor():
+    inference.start() # After load_models, so forked workers start with the models in memory
+    print(f"Inference executor: {inference.workers} {inference.kind} workers, "
+          f"at most {inference.max_pending} pending calls.")
+
+@app.on_event("shutdown")
+def stop_inference_executor():
+    inference.shutdown()
+
+async def model_available(model_key):
+    """Async ensure_loaded: a lazy first load runs on a worker thread, not the event loop."""
+    return model_key in models or await asyncio.to_thread(ensure_loaded, model_key)
+
+batchers = {} # domain -> MicroBatcher, created on first use
+
+def batcher_for(domain):
+    if domain not in batchers:
+        batchers[domain] = MicroBatcher(functools.partial(inference.submit, predict_rows, domain),
+                                        MICROBATCH_MAX_BATCH, MICROBATCH_MAX_WAIT_MS)
+    return batchers[domain]
+
+def busy_response(error):
+    return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                        content={"error": f"Server busy, retry later: {error}"})
+
+# --- Hot Model Reload ---
+def check_for_new_models():
+    """One watcher poll: syncs the model folder and swaps in every model whose files changed.
 
-                if os.path.exists(model_path):
-                    models[model_name] = joblib.load(model_path)
-                    if os.path.exists(features_path):
-                         features[model_name] = joblib.load(features_path)
-                         print(f"  Loaded {model_name} with features.")
-                    else:
-                        # Attempt to load model even if features are missing, log warning
-                        print(f"  Warning: Loaded {model_name} but feature file missing: {features_path}")
-                        features[model_name] = [] # Assign empty list to avoid key errors later
+    Returns the names of the models that were reloaded.
+    """
+    if MODEL_WATCH_SOURCE == "s3":
+        aws_utils.download_from_s3(LOCAL_MODEL_FOLDER, aws_utils.MODEL_BUCKET, exclude=compacted_joblib)
+    reloaded = []
+    for model_name in local_model_names():
+        available_models.add(model_name)
+        if LAZY_LOAD_MODELS and model_name not in models:
+            continue # Lazy models pick up the newest files whenever they're first used
+        version = model_fingerprint(model_name)
+        if version in (model_versions.get(model_name, {}).get("version"), _failed_versions.get(model_name)):
+            continue
+        print(f"New version {version} of {model_name} found, loading it...")
+        with _load_lock:
+            if load_model(model_name):
+                reloaded.append(model_name)
+    watcher_status["polls"] += 1
+    watcher_status["reloads"] += len(reloaded)
+    watcher_status["last_poll"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return reloaded
 
-                else:
-                     print(f"  Warning: Model file not found during loading: {model_path}")
+def _watch_models():
+    while not _watcher_stop.wait(MODEL_WATCH_INTERVAL_SECONDS):
+        try:
+            check_for_new_models()
+        except Exception as e: # Keep watching; the current versions stay live
+            print(f"Warning: Model watcher poll failed: {e}")
 
-            except Exception as e:
-                print(f"Error loading model {model_name} from {model_path}: {e}")
+def start_model_watcher():
+    """Starts the background thread that polls for new model versions (if not running yet)."""
+    global _watcher_thread
+    if MODEL_WATCH_INTERVAL_SECONDS <= 0 or (_watcher_thread and _watcher_thread.is_alive()):
+        return
+    _watcher_stop.clear()
+    _watcher_thread = threading.Thread(target=_watch_models, name="model-watcher", daemon=True)
+    _watcher_thread.start()
+    print(f"Watching {MODEL_WATCH_SOURCE} for new models every {MODEL_WATCH_INTERVAL_SECONDS:g}s.")
 
 # --- Pydantic Input Models (for validation) ---
 class TrafficInput(BaseModel):
@@ -76,13 +420,58 @@ class EmergencyInput(BaseModel):
     weather: str # "Clear", "Rain", "Fog"
     traffic_level: str # "Low", "High"
 
+class SnapshotInput(BaseModel):
+    """Union of every domain's inputs; a domain whose fields are missing is skipped."""
+    hour: Optional[int] = None
+    day_of_week: Optional[int] = None
+    weather: Optional[str] = None
+    traffic_level: Optional[str] = None
+    vehicle_count: Optional[int] = None
+    temperature: Optional[float] = None
+    grid_load_mw: Optional[int] = None
+    bin_type: Optional[str] = None
+    fill_level_percent: Optional[int] = None
+    days_since_collection: Optional[int] = None
+    aqi: Optional[int] = None
+
+# --- Raw Sensor Events (POST /ingest/<domain>) ---
+# Sensor events only take the levels the models know: they're stored as codes per entity (sensor_state.py)
+Weather = Literal[tuple(etl.CATEGORIES["weather"])]
+TrafficLevel = Literal[tuple(etl.CATEGORIES["traffic_level"])]
+BinType = Literal[tuple(etl.CATEGORIES["bin_type"])]
+
+class TrafficEvent(BaseModel):
+    segment_id: str
+    timestamp: datetime
+    vehicle_count: int
+    weather: Weather
+
+class EnergyEvent(BaseModel):
+    feeder_id: str
+    timestamp: datetime
+    grid_load_mw: int
+    temperature: float
+
+class WasteEvent(BaseModel):
+    bin_id: str
+    timestamp: datetime
+    fill_level_percent: int
+    bin_type: BinType
+
+class PollutionEvent(BaseModel):
+    station_id: str
+    timestamp: datetime
+    aqi: int
+    traffic_level: TrafficLevel
+
 # --- Helper Function to prepare features ---
 def prepare_features(input_data, model_name):
-    """Converts API input into a DataFrame suitable for the model."""
+    """Converts API input (one dict or a list of dicts) into a DataFrame suitable for the model."""
     if model_name not in features:
         raise ValueError(f"Feature list for model '{model_name}' not loaded.")
 
-    df = pd.DataFrame([input_data])
+    rows = input_data if isinstance(input_data, list) else [input_data]
+    df = pd.DataFrame(rows)
     df_dummies = pd.get_dummies(df) # Handles categorical to numeric
 
     model_features = features[model_name]
@@ -94,74 +483,416 @@ def prepare_features(input_data, model_name):
     return df_prepared[model_features]
 
 
+# --- Domain Registry (shared by the single-row and batch endpoints) ---
+DOMAINS = {
+    "traffic": {"model_key": "traffic_model", "input": TrafficInput,
+                "output_key": "predicted_vehicle_count_in_1_hr", "digits": 2},
+    "energy": {"model_key": "energy_model", "input": EnergyInput,
+               "output_key": "predicted_grid_load_mw_in_24_hrs", "digits": 2},
+    "waste": {"model_key": "waste_model", "input": WasteInput,
+              "output_key": "predicted_fill_level_in_1_day", "digits": 2,
+              "clip": (0, 100)}, # Fill level can't leave 0-100%
+    "pollution": {"model_key": "pollution_model", "input": PollutionInput,
+                  "output_key": "predicted_aqi_in_1_hr", "digits": 2},
+    "emergency": {"model_key": "emergency_model", "input": EmergencyInput,
+                  "output_key": "predicted_incident_probability_in_1_hr", "digits": 4,
+                  "proba": True}, # Classifier: return probability of class '1'
+}
+# Multi-output models (train.py --horizons) forecasting several hours ahead from the same inputs
+HORIZON_DOMAINS = {
+    "traffic": {"model_key": "traffic_horizons_model", "output_key": "predicted_vehicle_count"},
+    "energy": {"model_key": "energy_horizons_model", "output_key": "predicted_grid_load_mw"},
+    "pollution": {"model_key": "pollution_horizons_model", "output_key": "predicted_aqi"},
+}
+MODEL_DOMAINS = {config["model_key"]: domain for domain, config in DOMAINS.items()}
+MODEL_DOMAINS.update({config["model_key"]: domain for domain, config in HORIZON_DOMAINS.items()})
+# Raw sensor streams: the latest state of each entity is a ready model input for its domain
+SENSOR_STREAMS = {
+    "traffic": {"event": TrafficEvent, "entity": "segment_id", "value": "vehicle_count",
+                "categorical": ["weather"]},
+    "energy": {"event": EnergyEvent, "entity": "feeder_id", "value": "grid_load_mw", "numeric": ["temperature"]},
+    "waste": {"event": WasteEvent, "entity": "bin_id", "value": "fill_level_percent", "categorical": ["bin_type"],
+              "empty_below": 10}, # Same "near empty" level as etl.build_waste_features
+    "pollution": {"event": PollutionEvent, "entity": "station_id", "value": "aqi",
+                  "categorical": ["traffic_level"]},
+}
+sensors = {domain: SensorState(config["entity"], config["value"], config.get("categorical", ()),
+                               config.get("numeric", ()), config.get("empty_below"),
+                               window=SENSOR_WINDOW, max_entities=SENSOR_MAX_ENTITIES)
+           for domain, config in SENSOR_STREAMS.items()}
+
+def run_model(domain, input_rows, X=None):
+    """Scores a list of input dicts, returns a 1-D array of predictions.
+
+    Rows inside a materialized lookup table are answered by an array index;
+    everything else goes through the cache and the model. X optionally holds
+    the rows already encoded (see SharedEncoder).
+    """
+    table = tables.get(DOMAINS[domain]["model_key"])
+    if table is None:
+        return score_cached(domain, input_rows, X)
+
+    predictions, in_grid = table.lookup(input_rows)
+    if not in_grid.all():
+        miss_idx = np.nonzero(~in_grid)[0]
+        predictions[miss_idx] = score_cached(domain, [input_rows[i] for i in miss_idx],
+                                             None if X is None else X[miss_idx])
+    return predictions
+
+def score_cached(domain, input_rows, X=None):
+    """Scores a list of input dicts, serving repeated inputs from the model's cache.
+
+    Cache misses are scored together in one vectorized model call.
+    """
+    model_key = DOMAINS[domain]["model_key"]
+    cache = caches.get(model_key)
+    if cache is None:
+        return score_rows(domain, input_rows, X=X)
+
+    fields = DOMAINS[domain]["input"].model_fields
+    keys = [tuple(row[field] for field in fields) for row in input_rows]
+    predictions = np.empty(len(input_rows), dtype=np.float64)
+    miss_idx = []
+    for i, key in enumerate(keys):
+        hit, value = cache.get(key)
+        if hit:
+            predictions[i] = value
+        else:
+            miss_idx.append(i)
+
+    if miss_idx:
+        scored = score_rows(domain, [input_rows[i] for i in miss_idx], X=None if X is None else X[miss_idx])
+        for i, value in zip(miss_idx, scored):
+            predictions[i] = value
+            cache.put(keys[i], value)
+    return predictions
+
+def score_rows(domain, input_rows, state=None, X=None, model_key=None):
+    """Scores a list of input dicts with one vectorized model call, returns a 1-D array.
+
+    state is a serving_state()-shaped dict; by default the live version's.
+    A pre-encoded X is used only if it still fits the served encoder.
+    model_key picks another model of the domain (a multi-horizon one returns
+    an (n_rows, n_horizons) array).
+    """
+    config = DOMAINS[domain]
+    model_key = model_key or config["model_key"]
+    state = state or serving_state(model_key)
+    model = state["model"]
+    if state["engine"] is not None and len(input_rows) <= COMPILED_MAX_BATCH:
+        model = state["engine"]
+    encoder = state["encoder"]
+    if encoder is None: # Fall back to the pandas path if no encoder could be compiled
+        with metrics.API_STAGE_SECONDS.time(domain, "prepare_features"):
+            X = prepare_features(input_rows, model_key)
+    elif X is None or X.shape[1] != encoder.n_features:
+        with metrics.API_STAGE_SECONDS.time(domain, "encode"):
+            X = encoder.encode(input_rows)
+    with metrics.API_STAGE_SECONDS.time(domain, "inference"):
+        if config.get("proba"):
+            # For classifier, predict_proba gives [[prob_class_0, prob_class_1], ...]
+            return model.predict_proba(X)[:, 1]
+        return model.predict(X)
+
+def invalid_input_message(error):
+    """One-line summary of a pydantic ValidationError for an error response."""
+    details = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in error.errors())
+    return f"Invalid input: {details}"
+
+def format_prediction(domain, value):
+    """Builds the response dict for one predicted value."""
+    config = DOMAINS[domain]
+    value = float(value)
+    if "clip" in config:
+        low, high = config["clip"]
+        value = max(low, min(high, value))
+    return {config["output_key"]: round(value, config["digits"])}
+
+def predict_rows(domain, input_rows, X=None):
+    """Runs on the inference executor: scores validated rows (loading the model if needed)."""
+    ensure_loaded(DOMAINS[domain]["model_key"]) # No-op unless a process worker lacks a lazy model
+    return run_model(domain, input_rows, X)
+
+async def predict_one(domain, data):
+    """Shared body of the single-row /predict/* endpoints."""
+    model_key = DOMAINS[domain]["model_key"]
+    if not await model_available(model_key): return {"error": f"{model_key} not loaded"}
+    try:
+        row = data.model_dump()
+        if MICROBATCH_MAX_WAIT_MS > 0:
+            prediction = await batcher_for(domain).submit(row)
+        else:
+            prediction = (await inference.submit(predict_rows, domain, [row]))[0]
+        with metrics.API_STAGE_SECONDS.time(domain, "serialize"):
+            return format_prediction(domain, prediction)
+    except ExecutorBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        return {"error": f"Prediction failed: {str(e)}"}
+
+def score_batch(domain, rows):
+    """Runs on the inference executor: validates and scores the rows of one batch request.
+
+    Each row is validated on its own, so one bad record only fails its own
+    slot in the response instead of the whole request.
+    """
+    config = DOMAINS[domain]
+    results = [None] * len(rows)
+    valid_idx, valid_rows = [], []
+    with metrics.API_STAGE_SECONDS.time(domain, "validate"):
+        for i, row in enumerate(rows):
+            try:
+                valid_rows.append(config["input"].model_validate(row).model_dump())
+                valid_idx.append(i)
+            except ValidationError as e:
+                results[i] = {"error": invalid_input_message(e)}
+
+    if valid_rows:
+        try:
+            predictions = predict_rows(domain, valid_rows)
+            with metrics.API_STAGE_SECONDS.time(domain, "serialize"):
+                for i, value in zip(valid_idx, predictions):
+                    results[i] = format_prediction(domain, value)
+        except Exception as e:
+            for i in valid_idx:
+                results[i] = {"error": f"Prediction failed: {str(e)}"}
+
+    return {"count": len(rows), "predictions": results}
+
+
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
-    return {"status": "Smart City Forecasting API is running", "models_loaded": list(models.keys())}
+    return {"status": "Smart City Forecasting API is running", "models_loaded": list(models.keys()),
+            "models_available": sorted(available_models)}
+
+@app.get("/models")
+def list_models():
+    """Version and load time of every model being served, plus the reload watcher's state."""
+    return {"models": {name: {"loaded": name in models, **model_versions.get(name, {})}
+                       for name in sorted(available_models | set(models))},
+            "watcher": watcher_status}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, stage and S3 timings in the Prometheus text exposition format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/inference/stats")
+def inference_stats():
+    """Pending/completed/rejected counters of the inference executor."""
+    return inference.stats()
+
+@app.get("/batching/stats")
+def batching_stats():
+    """Achieved batch sizes of the single-row micro-batchers, per domain."""
+    return {domain: batcher.stats() for domain, batcher in batchers.items()}
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss/eviction counters of every model's prediction cache.
+
+    With SMART_CITY_INFERENCE_EXECUTOR=process, predictions are cached in each
+    worker process; this shows the API process's own caches, which then stay
+    empty (invalidations still count the model swaps).
+    """
+    return {model_key: cache.stats() for model_key, cache in caches.items()}
+
+@app.get("/sensors/stats")
+def sensor_stats():
+    """Entities, events and array memory of every sensor stream."""
+    return {domain: state.stats() for domain, state in sensors.items()}
 
 @app.post("/predict/traffic")
-def predict_traffic(data: TrafficInput):
-    model_key = "traffic_model"
-    if model_key not in models: return {"error": f"{model_key} not loaded"}
-    try:
-        model = models[model_key]
-        input_df = prepare_features(data.model_dump(), model_key)
-        prediction = model.predict(input_df)
-        return {"predicted_vehicle_count_in_1_hr": round(prediction[0], 2)}
-    except Exception as e:
-        return {"error": f"Prediction failed: {str(e)}"}
+async def predict_traffic(data: TrafficInput):
+    return await predict_one("traffic", data)
 
 @app.post("/predict/energy")
-def predict_energy(data: EnergyInput):
-    model_key = "energy_model"
-    if model_key not in models: return {"error": f"{model_key} not loaded"}
-    try:
-        model = models[model_key]
-        input_df = prepare_features(data.model_dump(), model_key)
-        prediction = model.predict(input_df)
-        return {"predicted_grid_load_mw_in_24_hrs": round(prediction[0], 2)}
-    except Exception as e:
-        return {"error": f"Prediction failed: {str(e)}"}
+async def predict_energy(data: EnergyInput):
+    return await predict_one("energy", data)
 
 @app.post("/predict/waste")
-def predict_waste(data: WasteInput):
-    model_key = "waste_model"
-    if model_key not in models: return {"error": f"{model_key} not loaded"}
+async def predict_waste(data: WasteInput):
+    return await predict_one("waste", data)
+
+@app.post("/predict/pollution")
+async def predict_pollution(data: PollutionInput):
+    return await predict_one("pollution", data)
+
+@app.post("/predict/emergency")
+async def predict_emergency(data: EmergencyInput):
+    return await predict_one("emergency", data)
+
+_snapshot_encoders = {} # (model, encoder id) pairs -> SharedEncoder built from those encoders
+
+def snapshot_encoder():
+    """SharedEncoder over the encoders being served, rebuilt after a model swap."""
+    current = dict(encoders)
+    key = tuple(sorted((name, id(encoder)) for name, encoder in current.items()))
+    if key not in _snapshot_encoders:
+        _snapshot_encoders.clear() # Only the latest set of versions is ever needed
+        _snapshot_encoders[key] = SharedEncoder(current)
+    return _snapshot_encoders[key]
+
+@app.post("/predict/snapshot")
+async def predict_snapshot(data: SnapshotInput):
+    """Forecasts every domain from one set of current conditions.
+
+    Shared fields (hour, weather, ...) are validated and encoded once, then
+    all models run concurrently on the inference executor. Each domain gets
+    its own result or error, so one missing input doesn't fail the rest.
+    """
+    snapshot = data.model_dump()
+    results, ready = {}, []
+    for domain, config in DOMAINS.items():
+        missing = [field for field in config["input"].model_fields if snapshot[field] is None]
+        if missing:
+            results[domain] = {"error": f"Missing fields: {', '.join(missing)}"}
+        elif not await model_available(config["model_key"]):
+            results[domain] = {"error": f"{config['model_key']} not loaded"}
+        else:
+            ready.append(domain)
+
+    shared = snapshot_encoder()
+    encoded = shared.encode([snapshot], [DOMAINS[d]["model_key"] for d in ready
+                                         if DOMAINS[d]["model_key"] in shared.gathers])
+
+    async def forecast(domain):
+        config = DOMAINS[domain]
+        row = {field: snapshot[field] for field in config["input"].model_fields}
+        try:
+            prediction = await inference.submit(predict_rows, domain, [row], encoded.get(config["model_key"]))
+            return format_prediction(domain, prediction[0])
+        except ExecutorBusy as e:
+            return {"error": f"Server busy, retry later: {e}"}
+        except Exception as e:
+            return {"error": f"Prediction failed: {str(e)}"}
+
+    for domain, result in zip(ready, await asyncio.gather(*(forecast(d) for d in ready))):
+        results[domain] = result
+    return {domain: results[domain] for domain in DOMAINS}
+
+def predict_horizon_vector(domain, row):
+    """Runs on the inference executor: every horizon of one row from a single model pass."""
+    model_key = HORIZON_DOMAINS[domain]["model_key"]
+    ensure_loaded(model_key)
+    return score_rows(domain, [row], model_key=model_key)[0]
+
+@app.post("/predict/{domain}/horizons")
+async def predict_horizons(domain: str, row: dict):
+    """Forecasts a domain for every hour its multi-horizon model covers (e.g. 1-24 h ahead)."""
+    if domain not in HORIZON_DOMAINS:
+        return {"error": f"No multi-horizon model for '{domain}' (available: {', '.join(HORIZON_DOMAINS)})"}
+    config = HORIZON_DOMAINS[domain]
+    if not await model_available(config["model_key"]): return {"error": f"{config['model_key']} not loaded"}
+    try:
+        with metrics.API_STAGE_SECONDS.time(domain, "validate"):
+            data = DOMAINS[domain]["input"].model_validate(row).model_dump()
+    except ValidationError as e:
+        return {"error": invalid_input_message(e)}
     try:
-        model = models[model_key]
-        input_df = prepare_features(data.model_dump(), model_key)
-        prediction = model.predict(input_df)
-        # Ensure prediction is within reasonable bounds for fill level
-        predicted_fill = max(0, min(100, prediction[0]))
-        return {"predicted_fill_level_in_1_day": round(predicted_fill, 2)}
+        values = await inference.submit(predict_horizon_vector, domain, data)
+    except ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         return {"error": f"Prediction failed: {str(e)}"}
+    digits = DOMAINS[domain]["digits"]
+    return {"horizons_hours": horizons.get(config["model_key"]),
+            config["output_key"]: [round(float(value), digits) for value in values]}
 
-@app.post("/predict/pollution")
-def predict_pollution(data: PollutionInput):
-    model_key = "pollution_model"
-    if model_key not in models: return {"error": f"{model_key} not loaded"}
+@app.post("/predict/{domain}/batch")
+async def predict_batch(domain: str, rows: List[dict]):
+    """Scores many records of one domain in a single model call (see score_batch)."""
+    if domain not in DOMAINS: return {"error": f"Unknown domain '{domain}'"}
+    model_key = DOMAINS[domain]["model_key"]
+    if not await model_available(model_key): return {"error": f"{model_key} not loaded"}
+    try:
+        return await inference.submit(score_batch, domain, rows)
+    except ExecutorBusy as e:
+        return busy_response(e)
+
+# --- Sensor Ingestion ---
+def model_input(domain, features):
+    return {field: features[field] for field in DOMAINS[domain]["input"].model_fields}
+
+@app.post("/ingest/{domain}")
+def ingest_events(domain: str, events: List[dict]):
+    """Applies a batch of raw sensor events, in order, to the domain's rolling state.
+
+    Each event is validated on its own, so a bad one is reported by its
+    index instead of failing the batch.
+    """
+    if domain not in SENSOR_STREAMS:
+        return {"error": f"No sensor stream for '{domain}' (available: {', '.join(SENSOR_STREAMS)})"}
+    event_model = SENSOR_STREAMS[domain]["event"]
+    valid, errors = [], []
+    with metrics.API_STAGE_SECONDS.time(domain, "validate"):
+        for i, event in enumerate(events):
+            try:
+                valid.append(event_model.model_validate(event).model_dump())
+            except ValidationError as e:
+                errors.append({"index": i, "error": invalid_input_message(e)})
+    with metrics.API_STAGE_SECONDS.time(domain, "ingest"):
+        counts = sensors[domain].ingest(valid)
+    for outcome, count in counts.items():
+        metrics.SENSOR_EVENTS.inc(domain, outcome, amount=count)
+    metrics.SENSOR_EVENTS.inc(domain, "invalid", amount=len(errors))
+    return {**counts, "invalid": len(errors), "errors": errors}
+
+@app.get("/sensors/{domain}/{entity_id}")
+async def sensor_prediction(domain: str, entity_id: str):
+    """An entity's rolling state and the domain model's forecast from it."""
+    if domain not in SENSOR_STREAMS: return {"error": f"No sensor stream for '{domain}'"}
     try:
-        model = models[model_key]
-        input_df = prepare_features(data.model_dump(), model_key)
-        prediction = model.predict(input_df)
-        return {"predicted_aqi_in_1_hr": round(prediction[0], 2)}
+        state = sensors[domain].state(entity_id)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"error": f"No events for {domain} entity '{entity_id}'"})
+    model_key = DOMAINS[domain]["model_key"]
+    if not await model_available(model_key): return {**state, "error": f"{model_key} not loaded"}
+    try:
+        prediction = (await inference.submit(predict_rows, domain, [model_input(domain, state["features"])]))[0]
+    except ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
-        return {"error": f"Prediction failed: {str(e)}"}
+        return {**state, "error": f"Prediction failed: {str(e)}"}
+    return {**state, **format_prediction(domain, prediction)}
 
-@app.post("/predict/emergency")
-def predict_emergency(data: EmergencyInput):
-    model_key = "emergency_model"
-    if model_key not in models: return {"error": f"{model_key} not loaded"}
+@app.get("/sensors/{domain}")
+async def sensor_predictions(domain: str):
+    """The domain model's forecast for every entity with events, in one vectorized call."""
+    if domain not in SENSOR_STREAMS: return {"error": f"No sensor stream for '{domain}'"}
+    model_key = DOMAINS[domain]["model_key"]
+    if not await model_available(model_key): return {"error": f"{model_key} not loaded"}
+    entity_ids, rows = sensors[domain].feature_rows()
+    if not rows:
+        return {"count": 0, "predictions": {}}
     try:
-        model = models[model_key]
-        input_df = prepare_features(data.model_dump(), model_key)
-        # For classifier, predict_proba gives [[prob_class_0, prob_class_1]]
-        prediction_prob = model.predict_proba(input_df)
-        # Return the probability of class '1' (incident happened)
-        return {"predicted_incident_probability_in_1_hr": round(prediction_prob[0][1], 4)}
+        predictions = await inference.submit(predict_rows, domain, [model_input(domain, row) for row in rows])
+    except ExecutorBusy as e:
+        return busy_response(e)
     except Exception as e:
         return {"error": f"Prediction failed: {str(e)}"}
+    return {"count": len(entity_ids), "predictions": {entity_id: format_prediction(domain, value)
+                                                      for entity_id, value in zip(entity_ids, predictions)}}
+
+# --- Precomputed Forecasts ---
+@app.get("/forecasts/{domain}")
+def precomputed_forecasts(domain: str, entity_id: Optional[str] = None, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None):
+    """The latest fleet.py run's forecasts for a domain, optionally one entity and a target time range.
+
+    Served straight from the forecast store, without running a model.
+    """
+    if domain not in fleet.FLEET_JOBS:
+        return {"error": f"No fleet forecasts for '{domain}' (available: {', '.join(fleet.FLEET_JOBS)})"}
+    with metrics.API_STAGE_SECONDS.time(domain, "forecast_store"):
+        result = fleet.read_forecasts(domain, entity_id, start, end)
+    if result is None:
+        return JSONResponse(status_code=404, content={"error": f"No fleet forecasts for '{domain}' yet"})
+    run, rows = result
+    return {"run": run, "count": len(rows),
+            "forecasts": [{"entity_id": entity, "as_of": as_of, "target_time": target_time,
+                           **format_prediction(domain, value)} for entity, as_of, target_time, value in rows]}
 
 if __name__ == "__main__":
       # This part is only for running locally without uvicorn command
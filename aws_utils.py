@@ -1,6 +1,12 @@
 # aws_utils.py
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
+import threading
+import time
+import metrics # Prometheus-style timers and counters
 
 # --- CONFIGURE YOUR BUCKET NAMES HERE ---
 # Replace with your actual S3 bucket names
@@ -8,48 +14,214 @@ DATA_BUCKET = "rk-digital-twin-data"
 MODEL_BUCKET = "rk-digital-twin-models"
 # ----------------------------------------
 
-s3_client = boto3.client('s3')
+MAX_TRANSFER_WORKERS = 8 # Concurrent uploads/downloads per sync
+# Local record of what was last synced: {bucket: {key: {"etag", "size", "mtime_ns"}}}
+MANIFEST_FILENAME = ".s3_manifest.json"
 
-def upload_to_s3(local_folder, bucket_name):
-    """Uploads all files from a local folder to an S3 bucket."""
+# One client shared by all transfer threads (boto3 clients are thread-safe)
+s3_client = boto3.client('s3', config=Config(max_pool_connections=MAX_TRANSFER_WORKERS))
+
+def load_manifest(local_folder):
+    """Reads the sync manifest of a local folder ({} if there is none)."""
+    path = os.path.join(local_folder, MANIFEST_FILENAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(local_folder, manifest):
+    """Writes the sync manifest atomically so a crash can't leave it half-written."""
+    path = os.path.join(local_folder, MANIFEST_FILENAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _local_state(local_path):
+    stat = os.stat(local_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _is_unchanged(entry, local_path, etag):
+    """True if the local file is still exactly what was synced with the object `etag`."""
+    if not entry or entry.get("etag") != etag or not os.path.isfile(local_path):
+        return False
+    return _local_state(local_path) == {"size": entry["size"], "mtime_ns": entry["mtime_ns"]}
+
+def _list_objects(client, bucket_name):
+    """Returns {key: {"etag", "size"}} for every object in the bucket."""
+    objects = {}
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name):
+        for obj in page.get('Contents', []):
+            objects[obj['Key']] = {"etag": obj['ETag'], "size": obj['Size']}
+    return objects
+
+def _run_transfers(jobs, max_workers, direction, bucket_name):
+    """Runs (name, size, fn) jobs on a bounded thread pool, printing and recording per-file timing.
+
+    Returns the list of names that failed.
+    """
+    failed = []
+    print_lock = threading.Lock()
+
+    def run(job):
+        name, size, fn = job
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            metrics.S3_TRANSFER_FAILURES.inc(direction, bucket_name)
+            with print_lock:
+                print(f"    Error transferring {name}: {e}")
+                failed.append(name)
+            return
+        elapsed = time.perf_counter() - start
+        metrics.S3_TRANSFER_SECONDS.observe(elapsed, direction, bucket_name)
+        metrics.S3_TRANSFER_BYTES.inc(direction, bucket_name, amount=size)
+        with print_lock:
+            print(f"  {name}: {size / 1024:.1f} KB in {elapsed:.2f}s")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(run, jobs))
+    return failed
+
+def _print_summary(action, transferred, skipped, failed, total_bytes, elapsed):
+    print(f"{action} complete: {len(transferred) - len(failed)} transferred "
+          f"({total_bytes / 2**20:.2f} MB), {len(skipped)} unchanged, {len(failed)} failed "
+          f"in {elapsed:.2f}s.")
+
+def upload_to_s3(local_folder, bucket_name, incremental=True, max_workers=MAX_TRANSFER_WORKERS, client=None):
+    """Uploads all files from a local folder to an S3 bucket.
+
+    With incremental=True, files whose size/mtime and remote ETag still match
+    the local manifest are skipped. Returns a summary dict.
+    """
+    client = client or s3_client
     print(f"Uploading files from '{local_folder}' to S3 bucket '{bucket_name}'...")
     if not os.path.exists(local_folder):
         print(f"  Error: Local folder '{local_folder}' does not exist.")
-        return
-    for filename in os.listdir(local_folder):
+        return None
+    start = time.perf_counter()
+
+    manifest = load_manifest(local_folder)
+    synced = manifest.setdefault(bucket_name, {})
+    remote = {}
+    if incremental:
+        try:
+            remote = _list_objects(client, bucket_name)
+        except Exception as e:
+            print(f"  Warning: Could not list bucket {bucket_name}, uploading everything: {e}")
+
+    jobs, skipped = [], []
+    for filename in sorted(os.listdir(local_folder)):
         local_path = os.path.join(local_folder, filename)
-        if os.path.isfile(local_path):
-            print(f"  Uploading {filename}...")
-            try:
-                s3_client.upload_file(local_path, bucket_name, filename)
-            except Exception as e:
-                print(f"    Error uploading {filename}: {e}")
-    print("Upload complete.")
-
-def download_from_s3(local_folder, bucket_name):
-    """Downloads all files from an S3 bucket to a local folder."""
+        if not os.path.isfile(local_path) or filename.startswith(MANIFEST_FILENAME):
+            continue
+        remote_etag = remote.get(filename, {}).get("etag")
+        if incremental and _is_unchanged(synced.get(filename), local_path, remote_etag):
+            skipped.append(filename)
+            continue
+
+        def upload(filename=filename, local_path=local_path):
+            state = _local_state(local_path)
+            client.upload_file(local_path, bucket_name, filename)
+            etag = client.head_object(Bucket=bucket_name, Key=filename)['ETag']
+            synced[filename] = {"etag": etag, **state}
+        jobs.append((filename, os.path.getsize(local_path), upload))
+
+    failed = _run_transfers(jobs, max_workers, "upload", bucket_name)
+    save_manifest(local_folder, manifest)
+    total_bytes = sum(size for name, size, _ in jobs if name not in failed)
+    elapsed = time.perf_counter() - start
+    _print_summary("Upload", jobs, skipped, failed, total_bytes, elapsed)
+    return {"transferred": [name for name, _, _ in jobs if name not in failed], "skipped": skipped,
+            "failed": failed, "bytes": total_bytes, "seconds": elapsed}
+
+def download_from_s3(local_folder, bucket_name, incremental=True, max_workers=MAX_TRANSFER_WORKERS, client=None,
+                     exclude=None):
+    """Downloads all files from an S3 bucket to a local folder.
+
+    With incremental=True, objects whose ETag matches the local manifest (and
+    whose local copy wasn't modified since) are skipped. Objects for which
+    exclude(filename, remote_filenames) is true aren't downloaded, and a copy
+    synced earlier is removed so it can't be mistaken for a current one.
+    Returns a summary dict.
+    """
+    client = client or s3_client
     print(f"Downloading files from S3 bucket '{bucket_name}' to '{local_folder}'...")
     os.makedirs(local_folder, exist_ok=True)
+    start = time.perf_counter()
 
     try:
-        paginator = s3_client.get_paginator('list_objects_v2')
-        for page in paginator.paginate(Bucket=bucket_name):
-            if 'Contents' not in page:
-                 print(f"  Warning: Bucket '{bucket_name}' might be empty or inaccessible.")
-                 continue
-            for obj in page.get('Contents', []):
-                filename = obj['Key']
-                local_path = os.path.join(local_folder, filename)
-                # Ensure subdirectories exist if needed (though not expected for this project)
-                # os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                print(f"  Downloading {filename}...")
-                try:
-                    s3_client.download_file(bucket_name, filename, local_path)
-                except Exception as e:
-                    print(f"    Error downloading {filename}: {e}")
+        remote = _list_objects(client, bucket_name)
     except Exception as e:
         print(f"Error listing objects in bucket {bucket_name}: {e}")
-    print("Download complete.")
+        return None
+    if not remote:
+        print(f"  Warning: Bucket '{bucket_name}' might be empty or inaccessible.")
+
+    manifest = load_manifest(local_folder)
+    synced = manifest.setdefault(bucket_name, {})
+    jobs, skipped = [], []
+    for filename, obj in sorted(remote.items()):
+        local_path = os.path.join(local_folder, filename)
+        # Ensure subdirectories exist if needed (though not expected for this project)
+        # os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        if exclude is not None and exclude(filename, remote):
+            if synced.pop(filename, None) and os.path.isfile(local_path):
+                os.remove(local_path)
+            continue
+        if incremental and _is_unchanged(synced.get(filename), local_path, obj["etag"]):
+            skipped.append(filename)
+            continue
+
+        def download(filename=filename, local_path=local_path, etag=obj["etag"]):
+            client.download_file(bucket_name, filename, local_path)
+            synced[filename] = {"etag": etag, **_local_state(local_path)}
+        jobs.append((filename, obj["size"], download))
+
+    failed = _run_transfers(jobs, max_workers, "download", bucket_name)
+    if synced or os.path.exists(os.path.join(local_folder, MANIFEST_FILENAME)):
+        save_manifest(local_folder, manifest)
+    total_bytes = sum(size for name, size, _ in jobs if name not in failed)
+    elapsed = time.perf_counter() - start
+    _print_summary("Download", jobs, skipped, failed, total_bytes, elapsed)
+    return {"transferred": [name for name, _, _ in jobs if name not in failed], "skipped": skipped,
+            "failed": failed, "bytes": total_bytes, "seconds": elapsed}
+
+def list_bucket(bucket_name, client=None):
+    """Returns {key: {"etag", "size"}} for every object in the bucket, or None if it can't be listed."""
+    try:
+        return _list_objects(client or s3_client, bucket_name)
+    except Exception as e:
+        print(f"Error listing objects in bucket {bucket_name}: {e}")
+        return None
+
+def delete_from_s3(local_folder, bucket_name, filenames, client=None):
+    """Deletes objects from an S3 bucket (missing ones are fine) and their entries in local_folder's manifest.
+
+    Returns the list of filenames that could not be deleted.
+    """
+    client = client or s3_client
+    if not filenames:
+        return []
+    print(f"Deleting {len(filenames)} file(s) from S3 bucket '{bucket_name}'...")
+    try:
+        response = client.delete_objects(Bucket=bucket_name,
+                                         Delete={"Objects": [{"Key": name} for name in filenames], "Quiet": True})
+        failed = [error["Key"] for error in response.get("Errors", [])]
+    except Exception as e:
+        print(f"  Error deleting from bucket {bucket_name}: {e}")
+        failed = list(filenames)
+    for name in failed:
+        print(f"    Could not delete {name}")
+    manifest = load_manifest(local_folder)
+    synced = manifest.get(bucket_name, {})
+    forgotten = [name for name in filenames if name not in failed and synced.pop(name, None) is not None]
+    if forgotten:
+        save_manifest(local_folder, manifest)
+    return failed
 
 if __name__ == "__main__":
     # This allows you to run this file directly to test S3
@@ -0,0 +1,60 @@
+# benchmarks/bench_batch.py
+# Compares single-row /predict/* calls against /predict/{domain}/batch.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_batch.py
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+from fastapi.testclient import TestClient
+import app
+
+BATCH_SIZES = [1000, 10000]
+SINGLE_ROW_SAMPLE = 200 # Single-row throughput is extrapolated from this many calls
+
+def random_row(domain):
+    """One plausible input record for a domain."""
+    if domain == "traffic":
+        return {"hour": random.randint(0, 23), "day_of_week": random.randint(0, 6),
+                "weather": random.choice(["Clear", "Rain", "Fog"]), "vehicle_count": random.randint(20, 300)}
+    if domain == "energy":
+        return {"hour": random.randint(0, 23), "day_of_week": random.randint(0, 6),
+                "temperature": round(random.uniform(-5, 35), 2), "grid_load_mw": random.randint(300, 1000)}
+    if domain == "waste":
+        return {"bin_type": random.choice(["Landfill", "Recycling"]),
+                "fill_level_percent": random.randint(0, 100), "days_since_collection": random.randint(0, 30)}
+    if domain == "pollution":
+        return {"hour": random.randint(0, 23), "traffic_level": random.choice(["Low", "High"]),
+                "aqi": random.randint(20, 120)}
+    return {"hour": random.randint(0, 23), "day_of_week": random.randint(0, 6),
+            "weather": random.choice(["Clear", "Rain", "Fog"]), "traffic_level": random.choice(["Low", "High"])}
+
+if __name__ == "__main__":
+    random.seed(42)
+    with TestClient(app.app) as client:
+        for domain in app.DOMAINS:
+            if app.DOMAINS[domain]["model_key"] not in app.models:
+                print(f"{domain}: model not loaded, skipping (run train.py first)")
+                continue
+
+            rows = [random_row(domain) for _ in range(SINGLE_ROW_SAMPLE)]
+            start = time.perf_counter()
+            for row in rows:
+                client.post(f"/predict/{domain}", json=row)
+            single_rps = SINGLE_ROW_SAMPLE / (time.perf_counter() - start)
+            print(f"{domain}: single-row  {single_rps:10.0f} rows/s")
+
+            for size in BATCH_SIZES:
+                rows = [random_row(domain) for _ in range(size)]
+                start = time.perf_counter()
+                response = client.post(f"/predict/{domain}/batch", json=rows)
+                elapsed = time.perf_counter() - start
+                assert response.json()["count"] == size
+                print(f"{domain}: batch {size:>6}  {size / elapsed:10.0f} rows/s "
+                      f"({size / elapsed / single_rps:.0f}x single-row)")
@@ -0,0 +1,83 @@
+# benchmarks/bench_compress.py
+# Trains the per-domain models on simulate.py data, runs compress.py on them and
+# checks that the compact files are smaller, load and score faster and stay
+# within the tolerance on held-out rows; then that the API serves them straight
+# from the memory-mapped files, and falls back to the .joblib once a retrained
+# model makes its compact copy stale.
+#   python benchmarks/bench_compress.py [--rows 50000] [--tolerance 0.01]
+import os
+import sys
+import argparse
+import tempfile
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import quiet, working_directory, generate_data # Offline S3 stubs, simulate.py data
+from bench_batch import random_row
+from fastapi.testclient import TestClient
+import app
+import train # Our training script
+import compress # Our compression script
+import feature_cache # Cached ETL output
+from forest_engine import CompiledForest
+
+MAX_ERROR_DELTA = 0.03 # Held-out rows are a sample too: allow this much on top of the tolerance
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact model size, load time, latency and accuracy.")
+    parser.add_argument("--rows", type=int, default=50_000, help="Hourly rows per simulated dataset.")
+    parser.add_argument("--tolerance", type=float, default=compress.TOLERANCE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        generate_data(args.rows)
+        os.makedirs(train.LOCAL_MODEL_FOLDER)
+        with quiet():
+            for model_name, domain, model_type in train.TRAINING_JOBS:
+                train.train_model(model_name, feature_cache.load_features(domain), model_type)
+            reports = compress.compress_all(tolerance=args.tolerance)
+        compress.print_report(reports)
+
+        for model_name, r in reports.items():
+            assert r["size_mb"][1] < r["size_mb"][0] and r["load_ms"][1] < r["load_ms"][0], (model_name, r)
+            assert r["latency_us"][1] < r["latency_us"][0] * 1.1, (model_name, r)
+            assert r["error_delta"] < args.tolerance + MAX_ERROR_DELTA, (model_name, r)
+
+        # The API serves the compact forests and answers with exactly what they predict
+        with quiet():
+            app.load_models()
+        client = TestClient(app.app)
+        for domain, config in app.DOMAINS.items():
+            model_key = config["model_key"]
+            if model_key not in reports:
+                continue
+            served = app.models[model_key]
+            assert isinstance(served, CompiledForest), model_key
+            for array in (served.feature, served.threshold, served.children, served.value): # Views of the mapping
+                assert not array.flags.owndata and not array.flags.writeable and array.flags.aligned, model_key
+            row = random_row(domain)
+            response = client.post(f"/predict/{domain}", json=row)
+            assert response.status_code == 200, response.text
+            compact = CompiledForest.load(compress.compact_path(model_key))
+            X = app.encoders[model_key].encode([row])
+            expected = compact.predict_proba(X)[0, 1] if config.get("proba") else compact.predict(X)[0]
+            assert response.json() == app.format_prediction(domain, expected), (domain, response.json(), expected)
+
+        # A retrained .joblib no longer matches its compact copy's digest: serve the .joblib until recompressed
+        model_path = os.path.join(train.LOCAL_MODEL_FOLDER, "traffic_model.joblib")
+        model = joblib.load(model_path)
+        model.estimators_ = model.estimators_[:-1]
+        joblib.dump(model, model_path, compress=0)
+        with quiet():
+            app.load_model("traffic_model")
+        assert not isinstance(app.models["traffic_model"], CompiledForest)
+        assert app.compacted_joblib("traffic_model.joblib", {"traffic_model_compact.npz": {}})
+        assert not app.compacted_joblib("traffic_model_features.joblib", {"traffic_model_compact.npz": {}})
+        app.stop_model_watcher()
+
+    sizes = np.array([r["size_mb"] for r in reports.values()]).sum(axis=0)
+    print(f"OK: {sizes[0]:.1f} MB of forests served from {sizes[1]:.1f} MB of memory-mapped compact files; "
+          f"a stale compact file falls back to its .joblib.")
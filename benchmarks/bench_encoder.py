@@ -0,0 +1,53 @@
+# benchmarks/bench_encoder.py
+# Checks FeatureEncoder against app.prepare_features and compares their latency.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_encoder.py
+import os
+import sys
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+import app
+from bench_batch import random_row
+
+CALLS = 2000
+
+def latency_ms(fn, rows):
+    """Calls fn(rows) CALLS times and returns (p50, p99) latency in milliseconds."""
+    timings = np.empty(CALLS)
+    for i in range(CALLS):
+        start = time.perf_counter()
+        fn(rows)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+if __name__ == "__main__":
+    random.seed(42)
+    app.load_models()
+    for domain, config in app.DOMAINS.items():
+        model_key = config["model_key"]
+        if model_key not in app.encoders:
+            print(f"{domain}: model not loaded, skipping (run train.py first)")
+            continue
+        encoder = app.encoders[model_key]
+
+        # Bit-identical check over single rows and one large batch
+        rows = [random_row(domain) for _ in range(5000)]
+        expected = app.prepare_features(rows, model_key).to_numpy(dtype=np.float64)
+        assert np.array_equal(encoder.encode(rows), expected), f"{domain}: batch encoding differs"
+        for row in rows[:500]:
+            expected = app.prepare_features(row, model_key).to_numpy(dtype=np.float64)
+            assert np.array_equal(encoder.encode([row]), expected), f"{domain}: row encoding differs"
+
+        row = [random_row(domain)]
+        pd_p50, pd_p99 = latency_ms(lambda r: app.prepare_features(r, model_key), row)
+        np_p50, np_p99 = latency_ms(encoder.encode, row)
+        print(f"{domain}: identical | pandas p50 {pd_p50:.3f} ms p99 {pd_p99:.3f} ms | "
+              f"encoder p50 {np_p50:.4f} ms p99 {np_p99:.4f} ms | p50 speedup {pd_p50 / np_p50:.0f}x")
@@ -0,0 +1,117 @@
+# benchmarks/bench_fleet.py
+# Fleet-wide batch forecasting: trains the models on simulate.py data (the traffic
+# one compressed, as the API then serves it), replaces the traffic file with
+# readings from many road segments (one of them long silent), runs fleet.py's
+# scoring in-process and on a process pool (same results), writes the SQLite
+# store and checks its queries use the indexes, then serves the forecasts from
+# GET /forecasts/<domain> and compares them with /predict/*.
+#   python benchmarks/bench_fleet.py [--segments 100000] [--rows 5000]
+import os
+import sys
+import time
+import argparse
+import tempfile
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suite import quiet, working_directory, generate_data # Offline S3 stubs, simulate.py data
+from fastapi.testclient import TestClient
+import app
+import etl # Our ETL script
+import fleet # Our fleet forecasting script
+import train # Our training script
+import storage # Parquet/CSV dataset files
+import feature_cache # Cached ETL output
+import simulate # Our data generator
+import compress # Our model compression script
+
+READINGS_PER_SEGMENT = 3
+
+def segment_traffic(n_segments, rng):
+    """READINGS_PER_SEGMENT hourly readings from each of n_segments road segments.
+
+    seg_0 stopped reporting after its first reading, hours before the others.
+    """
+    timestamps = pd.date_range(simulate.START_DATE, periods=READINGS_PER_SEGMENT, freq="h")
+    ts = np.repeat(timestamps, n_segments)
+    df = pd.DataFrame({"timestamp": ts, "segment_id": np.tile([f"seg_{i}" for i in range(n_segments)],
+                                                              READINGS_PER_SEGMENT),
+                       "hour": ts.hour, "day_of_week": ts.dayofweek,
+                       "weather": simulate.WEATHERS[rng.integers(0, 3, len(ts))],
+                       "vehicle_count": rng.integers(20, 300, len(ts))})
+    return df[(df["segment_id"] != "seg_0") | (df["timestamp"] == timestamps[0])]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fleet-wide batch forecasting and the precomputed forecast API.")
+    parser.add_argument("--segments", type=int, default=100_000, help="Road segments in the traffic file.")
+    parser.add_argument("--rows", type=int, default=5_000, help="Hourly rows per simulated training dataset.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        generate_data(args.rows)
+        os.makedirs(train.LOCAL_MODEL_FOLDER)
+        with quiet():
+            for model_name, domain, model_type in train.TRAINING_JOBS:
+                train.train_model(model_name, feature_cache.load_features(domain), model_type, n_jobs=1)
+            compress.compress_model("traffic_model") # Served compact: /forecasts must use it too to match /predict
+        storage.write_dataset(segment_traffic(args.segments, np.random.default_rng(0)), etl.LOCAL_DATA_FOLDER,
+                              "traffic_data")
+
+        runs = {}
+        for workers, chunk_rows in ((1, fleet.CHUNK_ROWS), (2, 10_000)):
+            start = time.perf_counter()
+            with quiet():
+                forecasts, timings, score_seconds = fleet.forecast_all(workers=workers, chunk_rows=chunk_rows)
+            runs[workers] = forecasts
+            print(f"{workers} worker(s), chunks of {chunk_rows:>6}: {len(forecasts)} forecasts in "
+                  f"{time.perf_counter() - start:.2f}s ({score_seconds:.2f}s scoring)")
+        assert len(runs[1]) == args.segments + 24 + 49 + 1 + 1, len(runs[1])
+        assert np.allclose(runs[1]["value"], runs[2]["value"])
+        stale = runs[1][runs[1]["entity_id"] == "seg_0"] # Still forecast, from its last reading
+        assert len(stale) == 1 and stale["as_of"].iloc[0] == pd.Timestamp(simulate.START_DATE), stale
+
+        start = time.perf_counter()
+        for _ in range(3): # Pruned back to keep_runs
+            run_id = fleet.write_forecasts(runs[1], "bench", keep_runs=2)
+        print(f"SQLite: {len(runs[1])} forecasts written in {(time.perf_counter() - start) / 3:.2f}s per run")
+        with closing(fleet.connect()) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2
+            for where in ("entity_id = 'seg_7'", "target_time >= '2024-01-01'"):
+                plan = conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM forecasts "
+                                    f"WHERE domain = 'traffic' AND run_id = {run_id} AND {where}").fetchall()
+                assert "USING INDEX" in str(plan), plan
+
+        with TestClient(app.app) as client:
+            raw = storage.read_dataset(etl.LOCAL_DATA_FOLDER, "traffic_data")
+            latest = raw[raw["segment_id"] == "seg_7"].iloc[[-1]][list(app.TrafficInput.model_fields)]
+            expected = client.post("/predict/traffic", json=latest.to_dict("records")[0]).json()
+            response = client.get("/forecasts/traffic", params={"entity_id": "seg_7"}).json()
+            assert response["count"] == 1 and response["run"]["run_id"] == run_id, response
+            assert response["forecasts"][0]["predicted_vehicle_count_in_1_hr"] == \
+                expected["predicted_vehicle_count_in_1_hr"], (response, expected)
+
+            energy = client.get("/forecasts/energy").json()["forecasts"]
+            target_times = pd.to_datetime([f["target_time"] for f in energy])
+            assert len(energy) == 24 and (np.diff(target_times) == pd.Timedelta(hours=1)).all()
+            window = client.get("/forecasts/energy", params={"start": energy[0]["target_time"],
+                                                             "end": energy[5]["target_time"]}).json()
+            assert window["count"] == 6, window
+
+            timings = {}
+            for name, call in (("GET /forecasts/traffic?entity_id=...",
+                                lambda i: client.get("/forecasts/traffic", params={"entity_id": f"seg_{i}"})),
+                               ("POST /predict/traffic", lambda i: client.post("/predict/traffic", json={
+                                   "hour": i % 24, "day_of_week": i % 7, "weather": "Rain", "vehicle_count": i % 300}))):
+                samples = []
+                for i in range(200):
+                    start = time.perf_counter()
+                    assert call(i).status_code == 200
+                    samples.append(time.perf_counter() - start)
+                timings[name] = np.median(samples) * 1000
+                print(f"{name:<38} p50 {timings[name]:.2f} ms")
+            assert client.get("/forecasts/waste", params={"entity_id": "nope"}).json()["count"] == 0
+    print(f"OK: {args.segments} segments forecast in one run and served by index lookups.")
@@ -0,0 +1,98 @@
+# benchmarks/bench_forest_engine.py
+# Parity and latency of CompiledForest vs the sklearn forest it was built from,
+# including rows with NaN features (routed the way each sklearn split sends them).
+# Small forests fit here on synthetic rows are always checked; the served models
+# need train.py to have written models/ first (the check fails without them):
+#   python benchmarks/bench_forest_engine.py
+import os
+import sys
+import time
+import random
+import tempfile
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+import app
+from forest_engine import CompiledForest
+from bench_batch import random_row
+
+BATCH_SIZES = [1, 100, 10_000]
+NAN_FRACTION = 0.1
+
+def p50_ms(fn, X, budget_s=2.0):
+    """Median latency of fn(X) in ms over as many calls as fit in budget_s (at least 3)."""
+    timings = []
+    deadline = time.perf_counter() + budget_s
+    while len(timings) < 3 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+def with_nans(X, rng):
+    """Copy of X with about NAN_FRACTION of its entries set to NaN."""
+    X = np.array(X, dtype=np.float64)
+    X[rng.random(X.shape) < NAN_FRACTION] = np.nan
+    return X
+
+def max_diff(model, engine, X):
+    method = "predict_proba" if hasattr(model, "classes_") else "predict"
+    return np.abs(getattr(model, method)(X) - getattr(engine, method)(X)).max()
+
+def check_synthetic(rows=4000, features=6):
+    """Fits small forests (with and without NaN in training) and checks both engines agree, NaN rows included."""
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(rows, features))
+    y = X[:, 0] + 0.5 * X[:, 1] ** 2 + rng.normal(scale=0.1, size=rows)
+    targets = {"regressor": y, "multi-output regressor": np.column_stack([y, X[:, 2] - y]),
+               "classifier": (y > np.median(y)).astype(int)}
+    for train_nan in (False, True):
+        X_fit = with_nans(X, rng) if train_nan else X
+        for name, target in targets.items():
+            forest = RandomForestClassifier if name == "classifier" else RandomForestRegressor
+            model = forest(n_estimators=20, max_depth=10, random_state=0).fit(X_fit, target)
+            engine = CompiledForest.from_sklearn(model)
+            with tempfile.TemporaryDirectory() as folder: # The routing has to survive save/load too
+                engine.save(os.path.join(folder, "forest.npz"))
+                mapped = CompiledForest.load(os.path.join(folder, "forest.npz"), mmap_mode="r")
+                for label, X_check in (("finite rows", X), ("NaN rows", with_nans(X, rng))):
+                    for served in (engine, mapped):
+                        diff = max_diff(model, served, X_check)
+                        assert diff < 1e-9, f"synthetic {name} ({label}): differs from sklearn by {diff}"
+                del mapped
+            print(f"synthetic {name}, fit {'with' if train_nan else 'without'} NaN: "
+                  f"matches sklearn on finite and NaN rows")
+
+if __name__ == "__main__":
+    random.seed(42)
+    check_synthetic()
+
+    app.COMPILE_FORESTS = True
+    app.SERVE_COMPACT_MODELS = False # Compile the .joblib forests, not compress.py's subsets of them
+    app.load_models()
+    missing = [domain for domain, config in app.DOMAINS.items() if config["model_key"] not in app.engines]
+    if missing:
+        sys.exit(f"compiled models not available for {', '.join(missing)} (run train.py first)")
+    rng = np.random.default_rng(42)
+    for domain, config in app.DOMAINS.items():
+        model_key = config["model_key"]
+        model, engine = app.models[model_key], app.engines[model_key]
+        method = "predict_proba" if config.get("proba") else "predict"
+        sklearn_fn, compiled_fn = getattr(model, method), getattr(engine, method)
+
+        X = app.encoders[model_key].encode([random_row(domain) for _ in range(max(BATCH_SIZES))])
+        diff, nan_diff = max_diff(model, engine, X), max_diff(model, engine, with_nans(X, rng))
+        assert diff < 1e-9, f"{domain}: compiled forest differs from sklearn by {diff}"
+        assert nan_diff < 1e-9, f"{domain}: compiled forest differs from sklearn on NaN rows by {nan_diff}"
+        print(f"{domain}: {engine.n_trees} trees, {len(engine.feature)} nodes, max |diff| {diff:.1e} "
+              f"({nan_diff:.1e} with NaN rows)")
+
+        for size in BATCH_SIZES:
+            sk, cf = p50_ms(sklearn_fn, X[:size]), p50_ms(compiled_fn, X[:size])
+            print(f"  batch {size:>6}: sklearn {sk:9.3f} ms, compiled {cf:9.3f} ms ({sk / cf:6.1f}x)")
@@ -0,0 +1,80 @@
+# benchmarks/bench_horizons.py
+# One multi-output forest over every horizon vs one forest per horizon:
+# fit time, size on disk, time to serve a full horizon profile, and accuracy.
+# Run from the repo root after simulate.py has written data/:
+#   python benchmarks/bench_horizons.py --domain traffic --horizons 1-24
+import io
+import os
+import sys
+import time
+import argparse
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+import etl # Our ETL script
+import train # For the forest settings
+from forest_engine import CompiledForest
+
+SERVE_REPEATS = 50
+
+def dumped_mb(model):
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer, compress=0)
+    return buffer.tell() / 2**20
+
+def p50_ms(fn, repeats=SERVE_REPEATS):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-output vs per-horizon forests.")
+    parser.add_argument("--domain", choices=etl.HORIZON_DOMAINS, default="traffic")
+    parser.add_argument("--horizons", default="1-24")
+    args = parser.parse_args()
+    horizons = etl.parse_horizons(args.horizons)
+
+    features_df = etl.prepare_horizon_forecast(args.domain, horizons)
+    if features_df.empty:
+        sys.exit(f"No {args.domain} data found in '{etl.LOCAL_DATA_FOLDER}/', run simulate.py first.")
+    targets = [etl.horizon_target(h) for h in horizons]
+    X, Y = features_df.drop(columns=targets).to_numpy(np.float64), features_df[targets].to_numpy()
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
+    print(f"{args.domain}: {len(X)} rows, {len(horizons)} horizons ({args.horizons})")
+
+    start = time.perf_counter()
+    multi = RandomForestRegressor(n_jobs=-1, **train.FOREST_PARAMS).fit(X_train, Y_train)
+    multi_fit = time.perf_counter() - start
+    start = time.perf_counter()
+    singles = [RandomForestRegressor(n_jobs=-1, **train.FOREST_PARAMS).fit(X_train, Y_train[:, i])
+               for i in range(len(horizons))]
+    singles_fit = time.perf_counter() - start
+
+    multi_rmse = np.sqrt(((multi.predict(X_test) - Y_test) ** 2).mean(axis=0))
+    singles_rmse = np.array([np.sqrt(((m.predict(X_test) - Y_test[:, i]) ** 2).mean())
+                             for i, m in enumerate(singles)])
+
+    row = X_test[:1]
+    multi_engine = CompiledForest.from_sklearn(multi)
+    single_engines = [CompiledForest.from_sklearn(m) for m in singles]
+    assert np.allclose(multi_engine.predict(row), multi.predict(row))
+
+    print(f"{'':<22}{'multi-output':>14}{'per-horizon':>14}")
+    print(f"{'fit (s)':<22}{multi_fit:14.2f}{singles_fit:14.2f}")
+    print(f"{'size (MB)':<22}{dumped_mb(multi):14.1f}{sum(dumped_mb(m) for m in singles):14.1f}")
+    print(f"{'profile, sklearn (ms)':<22}{p50_ms(lambda: multi.predict(row)):14.2f}"
+          f"{p50_ms(lambda: [m.predict(row) for m in singles]):14.2f}")
+    print(f"{'profile, compiled (ms)':<22}{p50_ms(lambda: multi_engine.predict(row)):14.3f}"
+          f"{p50_ms(lambda: [e.predict(row) for e in single_engines]):14.3f}")
+    print(f"{'mean RMSE':<22}{multi_rmse.mean():14.2f}{singles_rmse.mean():14.2f}")
+    for h, m, s in zip(horizons, multi_rmse, singles_rmse):
+        if h in (horizons[0], horizons[len(horizons) // 2], horizons[-1]):
+            print(f"{f'  RMSE at {h}h':<22}{m:14.2f}{s:14.2f}")
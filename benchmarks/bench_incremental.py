@@ -0,0 +1,75 @@
+# benchmarks/bench_incremental.py
+# Daily retrains as the history grows: train_incremental (new rows only, warm_start
+# trees) vs a full refit on everything, with both scored on each day's new rows.
+# Asserts the incremental retrain time stays flat while the full refit grows.
+#   python benchmarks/bench_incremental.py [--domain traffic] [--history 20000] [--step 2000] [--days 8]
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import etl # Our ETL script
+import train # Our training script
+import simulate # Our data generator
+import storage # Parquet/CSV dataset files
+from forest_engine import CompiledForest
+
+GENERATORS = {"traffic": simulate.generate_traffic_data, "energy": simulate.generate_energy_data,
+              "pollution": simulate.generate_pollution_data, "emergency": simulate.generate_emergency_data}
+MODEL_TYPES = {model_name: (domain, model_type) for model_name, domain, model_type in train.TRAINING_JOBS}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental vs full retraining as history grows.")
+    parser.add_argument("--domain", choices=list(GENERATORS), default="traffic")
+    parser.add_argument("--history", type=int, default=20_000, help="Rows before the first retrain.")
+    parser.add_argument("--step", type=int, default=2_000, help="New rows per retrain.")
+    parser.add_argument("--days", type=int, default=8, help="Number of retrains.")
+    args = parser.parse_args()
+    model_name = f"{args.domain}_model"
+    model_type = MODEL_TYPES[model_name][1]
+
+    raw = GENERATORS[args.domain](args.history + args.step * args.days, simulate.START_DATE, save=False)
+    dataset = etl.STREAM_SPECS[args.domain]["dataset"]
+    with tempfile.TemporaryDirectory() as tmp:
+        etl.LOCAL_DATA_FOLDER = os.path.join(tmp, "data")
+        train.LOCAL_MODEL_FOLDER = os.path.join(tmp, "models")
+        os.makedirs(etl.LOCAL_DATA_FOLDER)
+        os.makedirs(train.LOCAL_MODEL_FOLDER)
+
+        storage.write_dataset(raw.iloc[:args.history], etl.LOCAL_DATA_FOLDER, dataset)
+        _, status, _ = train.train_incremental(model_name, args.domain, model_type) # Bootstrap: full refit
+        assert status == "ok", status
+
+        print(f"\n{model_name}: {args.history} rows of history, +{args.step} per retrain")
+        print(f"{'history':>9}{'incr. (s)':>11}{'full (s)':>10}   holdout {'incremental':>12}{'full refit':>12}")
+        incremental_s, full_s = [], []
+        for day in range(1, args.days + 1):
+            rows = args.history + args.step * day
+            storage.write_dataset(raw.iloc[:rows], etl.LOCAL_DATA_FOLDER, dataset)
+            start = time.perf_counter()
+            _, status, timings = train.train_incremental(model_name, args.domain, model_type, compare_full=True)
+            assert status == "ok", status
+            full_s.append(timings["compare"])
+            incremental_s.append(time.perf_counter() - start - timings["compare"])
+            holdout = train.load_watermark(model_name)["history"][-1]["holdout"]
+            print(f"{rows:>9}{incremental_s[-1]:11.2f}{full_s[-1]:10.2f}   {holdout['metric']:<7} "
+                  f"{holdout['incremental']:12.3f}{holdout['full_refit']:12.3f}")
+
+        model = joblib.load(os.path.join(train.LOCAL_MODEL_FOLDER, f"{model_name}.joblib"))
+        assert len(model.estimators_) == train.FOREST_PARAMS["n_estimators"]
+        X = np.random.default_rng(0).uniform(0, 100, size=(64, model.n_features_in_))
+        expected = model.predict(pd.DataFrame(X, columns=model.feature_names_in_))
+        assert np.allclose(CompiledForest.from_sklearn(model).predict(X), expected)
+
+    # Full refits grow with the history; incremental runs only see the new rows
+    assert np.median(incremental_s[-3:]) < 1.5 * np.median(incremental_s[:3]), incremental_s
+    print(f"OK: incremental retrain {np.median(incremental_s):.2f}s median, flat in history size; "
+          f"full refit {full_s[0]:.2f}s -> {full_s[-1]:.2f}s. "
+          f"Forest kept at {len(model.estimators_)} trees and still compiles for serving.")
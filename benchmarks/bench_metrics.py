@@ -0,0 +1,105 @@
+# benchmarks/bench_metrics.py
+# Cost of the metrics timers, enabled vs disabled, per timer and per
+# single-row prediction, plus a look at what /metrics exposes, and checks that
+# stage timings observed in process-executor workers reach it too, and that
+# every ETL entry point (streaming, incremental, fleet) records its run time.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_metrics.py
+import os
+import sys
+import time
+import random
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+from fastapi.testclient import TestClient
+import app
+import etl # Our ETL script
+import metrics
+from inference_executor import InferenceExecutor
+from bench_batch import random_row
+from suite import quiet, working_directory, generate_data
+
+TIMER_CALLS = 200_000
+PREDICTIONS = 2000
+
+def timer_ns():
+    """Nanoseconds per `with histogram.time(...)` around an empty block."""
+    histogram = metrics.API_STAGE_SECONDS
+
+    def body():
+        with histogram.time("bench", "noop"):
+            pass
+    return timeit.timeit(body, number=TIMER_CALLS) / TIMER_CALLS * 1e9
+
+def stage_counts(text, domain):
+    """{stage: observations} of smart_city_api_stage_seconds for one domain in /metrics text."""
+    prefix = f'smart_city_api_stage_seconds_count{{domain="{domain}",stage="'
+    return {line[len(prefix):].split('"')[0]: float(line.split()[-1])
+            for line in text.splitlines() if line.startswith(prefix)}
+
+def etl_count(function):
+    """Observations of smart_city_etl_seconds for one ETL function so far."""
+    prefix = f'smart_city_etl_seconds_count{{function="{function}"}} '
+    return next((float(line[len(prefix):]) for line in metrics.render().splitlines() if line.startswith(prefix)), 0)
+
+def prediction_us(rows):
+    """Microseconds per single-row score_rows call (encode + inference, both timed)."""
+    start = time.perf_counter()
+    for row in rows:
+        app.score_rows("traffic", [row])
+    return (time.perf_counter() - start) / len(rows) * 1e6
+
+if __name__ == "__main__":
+    random.seed(42)
+    app.MODEL_WATCH_INTERVAL_SECONDS = 0
+    with TestClient(app.app) as client:
+        rows = [random_row("traffic") for _ in range(PREDICTIONS)]
+        for enabled in (True, False):
+            metrics.ENABLED = enabled
+            prediction_us(rows[:100]) # Warm up
+            print(f"metrics {'on ' if enabled else 'off'}: timer {timer_ns():6.0f} ns, "
+                  f"single-row score_rows {prediction_us(rows):7.1f} us")
+
+        metrics.ENABLED = True
+        for row in rows[:50]:
+            client.post("/predict/traffic", json=row)
+        client.post("/predict/traffic/batch", json=rows[:100])
+        text = client.get("/metrics").text
+        series = [line for line in text.splitlines() if line and not line.startswith("#")]
+        print(f"/metrics: {len(text)} bytes, {len(series)} series, e.g.")
+        for line in series:
+            if line.startswith(("smart_city_api_stage_seconds_count", "smart_city_api_request_seconds_count")):
+                print(f"  {line}")
+
+    # Process executor: scoring (encode, inference) happens in the workers, which send their timings back
+    app.inference = InferenceExecutor("process", workers=2)
+    app.batchers.clear() # Micro-batchers hold on to the executor they were made with
+    with TestClient(app.app) as client:
+        before = stage_counts(client.get("/metrics").text, "traffic")
+        for _ in range(50):
+            assert client.post("/predict/traffic", json=random_row("traffic")).status_code == 200
+        after = stage_counts(client.get("/metrics").text, "traffic")
+    scored = {stage: after[stage] - before.get(stage, 0) for stage in after
+              if stage not in ("validate", "serialize") and after[stage] > before.get(stage, 0)}
+    assert scored, (before, after)
+    print(f"process executor: worker stages recorded in /metrics for 50 requests: {scored}")
+
+    # ETL run times come from the functions themselves, not only from feature cache misses
+    etl_calls = {"stream_forecast": lambda: etl.stream_forecast("traffic"),
+                 "stream_waste_forecast": lambda: etl.stream_forecast("waste"),
+                 "prepare_forecast_since": lambda: etl.prepare_forecast_since("energy"),
+                 "prepare_latest": lambda: etl.prepare_latest("waste")}
+    with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        with quiet():
+            generate_data(2000)
+        for function, call in etl_calls.items():
+            before = etl_count(function)
+            call()
+            assert etl_count(function) == before + 1, function
+    print(f"ETL functions timed outside the feature cache: {', '.join(etl_calls)}")
@@ -0,0 +1,63 @@
+# benchmarks/bench_micro_batching.py
+# Concurrent single-row predictions with and without the micro-batcher: checks
+# every caller gets its own row's answer and reports throughput and batch sizes.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_micro_batching.py
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+import app
+from bench_batch import random_row
+
+DOMAINS = ["traffic", "emergency"]
+CONCURRENCY = 256 # Requests in flight at once
+REQUESTS = 2000
+SETTINGS = [(0, 1), (1, 16), (2, 64), (5, 256)] # (max_wait_ms, max_batch); 0 ms = no coalescing
+
+async def drive(domain, rows):
+    """Sends every row through app.predict_one with CONCURRENCY requests in flight."""
+    input_model = app.DOMAINS[domain]["input"]
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(row):
+        async with semaphore:
+            return await app.predict_one(domain, input_model(**row))
+    return await asyncio.gather(*(one(row) for row in rows))
+
+if __name__ == "__main__":
+    random.seed(42)
+    app.MODEL_WATCH_INTERVAL_SECONDS = 0
+    app.load_models()
+    app.inference.max_pending = REQUESTS # Measure batching, not load shedding
+    app.inference.start()
+    for domain in DOMAINS:
+        if app.DOMAINS[domain]["model_key"] not in app.models:
+            print(f"{domain}: model not available, skipping (run train.py first)")
+            continue
+        rows = [random_row(domain) for _ in range(REQUESTS)]
+        # Cached or tabled answers would hide the model calls being batched
+        app.caches.pop(app.DOMAINS[domain]["model_key"], None)
+        app.tables.pop(app.DOMAINS[domain]["model_key"], None)
+        expected = [app.format_prediction(domain, v) for v in app.run_model(domain, rows)]
+
+        for max_wait_ms, max_batch in SETTINGS:
+            app.MICROBATCH_MAX_WAIT_MS, app.MICROBATCH_MAX_BATCH = max_wait_ms, max_batch
+            app.batchers.pop(domain, None)
+            start = time.perf_counter()
+            results = asyncio.run(drive(domain, rows))
+            elapsed = time.perf_counter() - start
+            assert results == expected, f"{domain}: micro-batched answers differ from per-row scoring"
+            line = f"{domain}: wait {max_wait_ms} ms, max batch {max_batch:>3}: {REQUESTS / elapsed:8.0f} req/s"
+            if domain in app.batchers:
+                stats = app.batchers[domain].stats()
+                line += f", {stats['batches']} batches, mean size {stats['mean_batch_size']}"
+            print(line)
+    app.inference.shutdown()
@@ -0,0 +1,152 @@
+# benchmarks/bench_s3_sync.py
+# aws_utils' incremental S3 sync against an in-memory fake S3 client: files
+# with an unchanged ETag are skipped, changed ones are transferred again (in
+# either direction), a download exclude (app.compacted_joblib) skips an object
+# and deletes the copy synced earlier, and delete_from_s3 removes objects and
+# their manifest entries. Also times a sync with simulated per-request latency,
+# one transfer at a time vs MAX_TRANSFER_WORKERS in parallel.
+#   python benchmarks/bench_s3_sync.py [--files 16] [--latency-ms 50]
+import os
+import sys
+import time
+import argparse
+import hashlib
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+import app
+
+BUCKET = "bench-bucket"
+
+class FakeS3:
+    """The boto3 S3 client calls aws_utils makes, on dicts in memory; ETags are MD5s like S3's."""
+
+    def __init__(self, latency_s=0.0):
+        self.objects = {} # bucket -> {key: bytes}
+        self.latency_s = latency_s
+        self.calls = {"upload_file": 0, "download_file": 0, "delete_objects": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, call):
+        with self._lock:
+            self.calls[call] += 1
+        time.sleep(self.latency_s)
+
+    @staticmethod
+    def etag(data):
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket):
+                objects = fake.objects.get(Bucket, {})
+                yield {"Contents": [{"Key": key, "ETag": fake.etag(data), "Size": len(data)}
+                                    for key, data in sorted(objects.items())]}
+        return Paginator()
+
+    def upload_file(self, filename, bucket, key):
+        self._count("upload_file")
+        with open(filename, "rb") as f:
+            self.objects.setdefault(bucket, {})[key] = f.read()
+
+    def download_file(self, bucket, key, filename):
+        self._count("download_file")
+        with open(filename, "wb") as f:
+            f.write(self.objects[bucket][key])
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": self.etag(self.objects[Bucket][Key])}
+
+    def delete_objects(self, Bucket, Delete):
+        self._count("delete_objects")
+        for obj in Delete["Objects"]:
+            self.objects.get(Bucket, {}).pop(obj["Key"], None)
+        return {}
+
+    def put(self, bucket, key, data):
+        """Another host writing an object."""
+        self.objects.setdefault(bucket, {})[key] = data
+
+def write(folder, name, data):
+    with open(os.path.join(folder, name), "wb") as f:
+        f.write(data)
+
+def transfers(client, call):
+    """Calls of one kind since the last transfers() for that kind."""
+    count, client.calls[call] = client.calls[call], 0
+    return count
+
+def check_sync(tmp):
+    client = FakeS3()
+    source, replica = os.path.join(tmp, "source"), os.path.join(tmp, "replica")
+    os.makedirs(source)
+    for i in range(5):
+        write(source, f"file_{i}.bin", os.urandom(1000))
+
+    aws_utils.upload_to_s3(source, BUCKET, client=client)
+    assert transfers(client, "upload_file") == 5
+    result = aws_utils.upload_to_s3(source, BUCKET, client=client)
+    assert transfers(client, "upload_file") == 0 and len(result["skipped"]) == 5, result
+    write(source, "file_3.bin", os.urandom(1000)) # Changed locally: only it goes up again
+    result = aws_utils.upload_to_s3(source, BUCKET, client=client)
+    assert result["transferred"] == ["file_3.bin"] and transfers(client, "upload_file") == 1, result
+
+    aws_utils.download_from_s3(replica, BUCKET, client=client)
+    assert transfers(client, "download_file") == 5
+    result = aws_utils.download_from_s3(replica, BUCKET, client=client)
+    assert transfers(client, "download_file") == 0 and len(result["skipped"]) == 5, result
+    client.put(BUCKET, "file_1.bin", b"new version") # Changed on S3 by another host
+    write(replica, "file_4.bin", b"edited here") # Changed locally: S3's copy wins
+    result = aws_utils.download_from_s3(replica, BUCKET, client=client)
+    assert result["transferred"] == ["file_1.bin", "file_4.bin"], result
+    with open(os.path.join(replica, "file_1.bin"), "rb") as f:
+        assert f.read() == b"new version"
+    transfers(client, "download_file")
+
+    # A compact model on S3: its .joblib is skipped, and the copy synced earlier removed
+    client.put(BUCKET, "traffic_model.joblib", b"full forest")
+    aws_utils.download_from_s3(replica, BUCKET, client=client, exclude=app.compacted_joblib)
+    assert os.path.exists(os.path.join(replica, "traffic_model.joblib"))
+    client.put(BUCKET, "traffic_model_compact.npz", b"compact forest")
+    result = aws_utils.download_from_s3(replica, BUCKET, client=client, exclude=app.compacted_joblib)
+    assert result["transferred"] == ["traffic_model_compact.npz"], result
+    assert not os.path.exists(os.path.join(replica, "traffic_model.joblib"))
+    assert "traffic_model.joblib" not in aws_utils.load_manifest(replica)[BUCKET]
+
+    failed = aws_utils.delete_from_s3(replica, BUCKET, ["traffic_model_compact.npz", "missing.npz"], client=client)
+    assert not failed and "traffic_model_compact.npz" not in client.objects[BUCKET]
+    assert "traffic_model_compact.npz" not in aws_utils.load_manifest(replica)[BUCKET]
+
+def sync_seconds(tmp, n_files, latency_s, max_workers):
+    """Seconds to upload n_files to a fake S3 with latency_s per request, then download them elsewhere."""
+    client = FakeS3(latency_s)
+    source = tempfile.mkdtemp(dir=tmp)
+    for i in range(n_files):
+        write(source, f"model_{i}.joblib", os.urandom(10_000))
+    start = time.perf_counter()
+    aws_utils.upload_to_s3(source, BUCKET, max_workers=max_workers, client=client)
+    aws_utils.download_from_s3(tempfile.mkdtemp(dir=tmp), BUCKET, max_workers=max_workers, client=client)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental S3 sync against a fake S3 client.")
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated time per S3 transfer.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_sync(tmp)
+        print("Sync: unchanged ETags skipped, changed files re-transferred, excluded .joblib skipped and "
+              "deleted, delete_from_s3 cleans the manifest.")
+        serial = sync_seconds(tmp, args.files, args.latency_ms / 1000, 1)
+        parallel = sync_seconds(tmp, args.files, args.latency_ms / 1000, aws_utils.MAX_TRANSFER_WORKERS)
+    print(f"{args.files} files up and down at {args.latency_ms:.0f} ms per transfer: 1 worker {serial:.2f}s, "
+          f"{aws_utils.MAX_TRANSFER_WORKERS} workers {parallel:.2f}s ({serial / parallel:.1f}x)")
+    assert parallel < serial / 2, (serial, parallel)
+    print("OK")
@@ -0,0 +1,150 @@
+# benchmarks/bench_sensors.py
+# Raw sensor ingestion: events/sec and memory per entity of SensorState, with a
+# check that the per-event cost doesn't grow with the window or the number of
+# entities; that streamed waste readings give the same days_since_collection
+# as etl.build_waste_features; and POST /ingest + GET /sensors throughput and
+# predictions through the API.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_sensors.py [--entities 10000] [--events 200000]
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+from fastapi.testclient import TestClient
+import app
+import etl # Our ETL script
+import simulate # Our data generator
+from sensor_state import SensorState
+
+START = datetime(2024, 1, 1)
+API_BATCH = 1000
+
+def traffic_events(n_entities, n_events, seed=0):
+    """Hourly readings from n_entities road segments, interleaved in time order."""
+    rng = random.Random(seed)
+    return [{"segment_id": f"seg_{i % n_entities}", "timestamp": START + timedelta(hours=i // n_entities),
+             "vehicle_count": rng.randint(20, 300), "weather": rng.choice(["Clear", "Rain", "Fog"])}
+            for i in range(n_events)]
+
+def traffic_state(window=24, max_entities=1_000_000):
+    return SensorState("segment_id", "vehicle_count", categorical=["weather"], window=window,
+                       max_entities=max_entities)
+
+def events_per_second(state, events):
+    start = time.perf_counter()
+    counts = state.ingest(events)
+    elapsed = time.perf_counter() - start
+    assert counts["accepted"] == len(events), counts
+    return len(events) / elapsed
+
+def bytes_per_entity(n_entities, window):
+    """Traced allocations (arrays, entity index, ids) per entity.
+
+    The ring buffers are allocated up front, so one event per entity already
+    takes all the memory a full window will.
+    """
+    events = traffic_events(n_entities, n_entities)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    state = traffic_state(window)
+    state.ingest(events)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / n_entities, state.nbytes / state.capacity
+
+def check_time_zones():
+    """Events with different UTC offsets are ordered (and featurized) by their UTC time."""
+    state = traffic_state()
+    events = [datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=2))), # 08:00 UTC
+              datetime(2024, 1, 1, 9, 30, tzinfo=timezone.utc), # Later, despite the earlier wall clock
+              datetime(2024, 1, 1, 11, tzinfo=timezone(timedelta(hours=5)))] # 06:00 UTC: stale
+    counts = state.ingest([{"segment_id": "tz", "timestamp": ts, "vehicle_count": 100, "weather": "Clear"}
+                           for ts in events])
+    assert (counts["accepted"], counts["stale"]) == (2, 1), counts
+    assert state.state("tz")["last_seen"] == "2024-01-01T09:30:00" and state.features("tz")["hour"] == 9
+
+def check_waste_parity():
+    """days_since_collection of each bin's latest reading, streamed vs etl.build_waste_features."""
+    raw = simulate.generate_waste_data(49 * 400, simulate.START_DATE, save=False)
+    state = SensorState("bin_id", "fill_level_percent", categorical=["bin_type"], empty_below=10)
+    events = raw.assign(timestamp=raw["timestamp"].dt.to_pydatetime()).to_dict("records")
+    state.ingest(events)
+
+    # The ETL drops each bin's last reading (no next-day target), so compare on all but the last day
+    last_day = raw["timestamp"].max()
+    offline = etl.build_waste_features(raw)
+    offline = offline.assign(bin_id=raw.loc[offline.index, "bin_id"], timestamp=raw.loc[offline.index, "timestamp"])
+    expected = offline[offline["timestamp"] == last_day - timedelta(days=1)].set_index("bin_id")
+    replay = SensorState("bin_id", "fill_level_percent", categorical=["bin_type"], empty_below=10)
+    replay.ingest([event for event in events if event["timestamp"] < last_day])
+    for bin_id, row in expected.iterrows():
+        features = replay.features(bin_id)
+        assert features["days_since_collection"] == row["days_since_collection"], (bin_id, features, row)
+        assert features["fill_level_percent"] == row["fill_level_percent"], (bin_id, features, row)
+    return len(expected)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sensor ingestion throughput and memory.")
+    parser.add_argument("--entities", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=200_000)
+    args = parser.parse_args()
+
+    events = traffic_events(args.entities, args.events)
+    rates = {}
+    for window in (24, 720):
+        rates[window] = events_per_second(traffic_state(window), events)
+        print(f"SensorState, window {window:>4}: {rates[window]:>10,.0f} events/s "
+              f"({args.entities} segments, {args.events} events)")
+    few = events_per_second(traffic_state(), traffic_events(100, args.events))
+    print(f"SensorState, 100 segments: {few:>10,.0f} events/s")
+    # O(1) per event: neither a 30x longer window nor 100x more entities may slow ingestion down much
+    assert rates[720] > rates[24] / 1.5 and rates[24] > few / 1.5, (rates, few)
+
+    for window in (24, 168):
+        traced, arrays = bytes_per_entity(args.entities, window)
+        print(f"Memory, window {window:>4}: {traced:7.0f} B/entity traced ({arrays:.0f} B in the arrays)")
+
+    print(f"Waste parity: days_since_collection matches etl.py for {check_waste_parity()} bins")
+    check_time_zones()
+    print("Time zones: events with different UTC offsets are ordered by their UTC time")
+
+    # Through the API: ingest in batches, then forecast each segment from its state
+    with TestClient(app.app) as client:
+        api_events = [{**event, "timestamp": event["timestamp"].isoformat()} for event in events]
+        start = time.perf_counter()
+        for i in range(0, len(api_events), API_BATCH):
+            response = client.post("/ingest/traffic", json=api_events[i:i + API_BATCH]).json()
+            assert response["accepted"] == len(api_events[i:i + API_BATCH]), response
+        elapsed = time.perf_counter() - start
+        print(f"POST /ingest/traffic: {len(api_events) / elapsed:,.0f} events/s in batches of {API_BATCH}")
+
+        stale = client.post("/ingest/traffic", json=api_events[:2] + [{"segment_id": "x"},
+                            {**api_events[0], "segment_id": "new", "weather": "Snow"}]).json() # Unknown level
+        assert (stale["stale"], stale["invalid"]) == (2, 2), stale
+        assert "new" not in app.sensors["traffic"]
+
+        state = client.get("/sensors/traffic/seg_7").json()
+        expected = client.post("/predict/traffic", json=app.model_input("traffic", state["features"])).json()
+        assert state["predicted_vehicle_count_in_1_hr"] == expected["predicted_vehicle_count_in_1_hr"], (state, expected)
+        assert state["readings"] == min(app.SENSOR_WINDOW, args.events // args.entities)
+        assert np.isclose(state["rolling_mean"], np.mean([r["vehicle_count"] for r in state["window"]]))
+
+        start = time.perf_counter()
+        fleet = client.get("/sensors/traffic").json()
+        elapsed = time.perf_counter() - start
+        assert fleet["count"] == args.entities and fleet["predictions"]["seg_7"] == \
+            {"predicted_vehicle_count_in_1_hr": expected["predicted_vehicle_count_in_1_hr"]}
+        print(f"GET /sensors/traffic: {fleet['count']} segment forecasts in {elapsed * 1000:.0f} ms")
+        print(client.get("/sensors/stats").json()["traffic"])
+    print("OK")
@@ -0,0 +1,132 @@
+# benchmarks/bench_simulate.py
+# Rows/sec of each simulate.py generator, generating only (save=False) and
+# generating + writing the file (save=True, the default format), against the
+# original per-row random.* loops (kept below as the baseline, with their CSV
+# write). The baseline only runs up to BASELINE_MAX_RECORDS.
+#   python benchmarks/bench_simulate.py [num_records ...]
+import os
+import sys
+import time
+import random
+import tempfile
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulate
+
+GENERATORS = [simulate.generate_traffic_data, simulate.generate_energy_data, simulate.generate_waste_data,
+              simulate.generate_pollution_data, simulate.generate_emergency_data]
+BASELINE_MAX_RECORDS = 500_000 # The row loops take minutes beyond this
+MIN_SPEEDUP = 5 # Vectorized save=True vs the row loop + CSV, at BASELINE_MAX_RECORDS
+
+# --- Baseline: the original row-by-row generators ---
+def reference_traffic_data(num, start):
+    data = []
+    for i in range(num):
+        timestamp = start + timedelta(hours=i)
+        hour, day = timestamp.hour, timestamp.weekday()
+        weather = random.choice(["Clear", "Rain", "Fog"])
+        count = 100 # Base
+        if 6 <= hour <= 9 or 16 <= hour <= 19: count += random.randint(100, 200) # Rush hour
+        if day >= 5: count = int(count * 0.7) # Weekend
+        if weather == "Rain": count = int(count * 0.8) # Bad weather
+        data.append({"timestamp": timestamp, "hour": hour, "day_of_week": day,
+                     "weather": weather, "vehicle_count": max(20, count + random.randint(-20, 20))})
+    return pd.DataFrame(data)
+
+def reference_energy_data(num, start):
+    data = []
+    for i in range(num):
+        timestamp = start + timedelta(hours=i)
+        hour, day = timestamp.hour, timestamp.weekday()
+        temp = 15 + np.sin(i / (24 * 7)) * 10 + random.uniform(-2, 2)
+        load = 500 # Base load
+        if 17 <= hour <= 21: load += 300 # Evening peak
+        if temp > 22: load += (temp - 22) * 20 # AC
+        if temp < 10: load += (10 - temp) * 15 # Heating
+        data.append({"timestamp": timestamp, "hour": hour, "day_of_week": day,
+                     "temperature": round(temp, 2), "grid_load_mw": max(300, int(load + random.randint(-30, 30)))})
+    return pd.DataFrame(data)
+
+def reference_waste_data(num, start):
+    bins = [f"bin_{i}" for i in range(1, 50)]
+    data = []
+    bin_states = {bin_id: {'fill': 0, 'type': random.choice(["Landfill", "Recycling"])} for bin_id in bins}
+    for i in range(num // 50): # Daily updates per bin
+        timestamp = start + timedelta(days=i)
+        for bin_id, state in bin_states.items():
+            state['fill'] += random.randint(3, 15) if state['type'] == "Landfill" else random.randint(2, 10)
+            if state['fill'] > 100: state['fill'] = 100
+            data.append({"timestamp": timestamp, "bin_id": bin_id, "bin_type": state['type'],
+                         "fill_level_percent": state['fill']})
+            if state['fill'] > random.randint(75, 95) and random.random() > 0.1:
+                state['fill'] = 0 # Bin collected
+    return pd.DataFrame(data)
+
+def reference_pollution_data(num, start):
+    data = []
+    for i in range(num):
+        timestamp = start + timedelta(hours=i)
+        hour = timestamp.hour
+        traffic_level = "High" if 6 <= hour <= 9 or 16 <= hour <= 19 else "Low"
+        aqi = 30 # Base
+        if traffic_level == "High": aqi += random.randint(20, 50)
+        aqi += (np.sin(i / 24) * 10) # Daily cycle
+        data.append({"timestamp": timestamp, "hour": hour, "traffic_level": traffic_level,
+                     "aqi": max(20, int(aqi + random.randint(-5, 5)))})
+    return pd.DataFrame(data)
+
+def reference_emergency_data(num, start):
+    data = []
+    for i in range(num):
+        timestamp = start + timedelta(hours=i)
+        hour, day = timestamp.hour, timestamp.weekday()
+        weather = random.choice(["Clear", "Rain", "Fog"])
+        traffic_level = "High" if 6 <= hour <= 9 or 16 <= hour <= 19 else "Low"
+        prob = 0.01 # Base probability
+        if weather == "Rain": prob += 0.05
+        if traffic_level == "High": prob += 0.03
+        if hour > 22 or hour < 6: prob += 0.02 # Night time
+        data.append({"timestamp": timestamp, "hour": hour, "day_of_week": day, "weather": weather,
+                     "traffic_level": traffic_level, "incident_happened": 1 if random.random() < prob else 0})
+    return pd.DataFrame(data)
+
+REFERENCES = [reference_traffic_data, reference_energy_data, reference_waste_data,
+              reference_pollution_data, reference_emergency_data]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [5000, 500000, 10000000]
+    random.seed(simulate.SEED)
+    speedups = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        simulate.LOCAL_DATA_FOLDER = os.path.join(tmp, "data")
+        os.makedirs(simulate.LOCAL_DATA_FOLDER)
+        for num in sizes:
+            for generate, reference in zip(GENERATORS, REFERENCES):
+                df, generate_s = timed(lambda: generate(num, simulate.START_DATE, save=False))
+                _, save_s = timed(lambda: generate(num, simulate.START_DATE))
+                line = (f"  {generate.__name__:<26} {num:>10} records -> {len(df):>10} rows | "
+                        f"generate {generate_s:7.2f}s ({len(df) / generate_s:12,.0f} rows/s) | "
+                        f"+ {simulate.DATA_FORMAT} write {save_s:7.2f}s")
+                if num <= BASELINE_MAX_RECORDS:
+                    path = os.path.join(tmp, "baseline.csv")
+                    _, baseline_s = timed(lambda: reference(num, simulate.START_DATE).to_csv(path, index=False))
+                    speedups[generate.__name__, num] = baseline_s / save_s
+                    line += f" | row loop + CSV {baseline_s:7.2f}s ({baseline_s / save_s:6.1f}x)"
+                print(line)
+
+    largest = max((num for _, num in speedups), default=None)
+    if largest is not None and largest >= BASELINE_MAX_RECORDS:
+        slow = {name: round(s, 1) for (name, num), s in speedups.items() if num == largest and s < MIN_SPEEDUP}
+        assert not slow, f"Less than {MIN_SPEEDUP}x faster than the row loop at {largest} records: {slow}"
+        print(f"OK: every generator (with save=True) is at least {MIN_SPEEDUP}x faster than the row loop "
+              f"at {largest} records.")
@@ -0,0 +1,54 @@
+# benchmarks/bench_snapshot.py
+# One /predict/snapshot call vs the five per-domain calls the dashboard makes,
+# checking both give the same forecasts.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_snapshot.py
+import os
+import sys
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+
+from fastapi.testclient import TestClient
+import app
+from bench_batch import random_row
+
+SNAPSHOTS = 300
+
+def random_snapshot():
+    """One set of city-wide conditions covering every domain's inputs."""
+    snapshot = {}
+    for domain in app.DOMAINS:
+        snapshot.update(random_row(domain))
+    return snapshot
+
+if __name__ == "__main__":
+    random.seed(42)
+    app.MODEL_WATCH_INTERVAL_SECONDS = 0
+    with TestClient(app.app) as client:
+        for cache in app.caches.values():
+            cache.max_size = 0 # Otherwise the snapshot would hit what the per-domain calls cached
+        snapshots = [random_snapshot() for _ in range(SNAPSHOTS)]
+        per_domain, combined = [], []
+        for snapshot in snapshots:
+            start = time.perf_counter()
+            separate = {domain: client.post(f"/predict/{domain}",
+                                            json={f: snapshot[f] for f in config["input"].model_fields}).json()
+                        for domain, config in app.DOMAINS.items()}
+            per_domain.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            together = client.post("/predict/snapshot", json=snapshot).json()
+            combined.append(time.perf_counter() - start)
+            assert together == separate, f"snapshot differs from per-domain calls: {together} vs {separate}"
+
+        sep_ms, snap_ms = np.median(per_domain) * 1000, np.median(combined) * 1000
+        print(f"{SNAPSHOTS} snapshots, identical forecasts")
+        print(f"  5 per-domain calls: p50 {sep_ms:7.2f} ms")
+        print(f"  /predict/snapshot:  p50 {snap_ms:7.2f} ms ({sep_ms / snap_ms:.1f}x)")
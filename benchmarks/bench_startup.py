@@ -0,0 +1,56 @@
+# benchmarks/bench_startup.py
+# Reports API model startup time and worker RSS for eager/lazy and mmap/no-mmap loading, of the
+# .joblib forests and (after compress.py or train.py --compress) of their compact files.
+# Each configuration runs in a fresh interpreter, like a new uvicorn worker.
+# Run from the repo root after train.py has written models/:
+#   python benchmarks/bench_startup.py
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = """
+import json, time
+import aws_utils
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+import app
+from forest_engine import CompiledForest
+app.MODEL_MMAP_MODE = {mmap_mode!r}
+rss_before = app.current_rss_mb()
+start = time.perf_counter()
+app.load_models()
+startup = time.perf_counter() - start
+rss_startup = app.current_rss_mb()
+start = time.perf_counter()
+for domain in app.DOMAINS:
+    app.ensure_loaded(app.DOMAINS[domain]["model_key"])
+first_use = time.perf_counter() - start
+compact = sum(isinstance(model, CompiledForest) for model in app.models.values())
+print(json.dumps({{"startup_s": startup, "first_use_s": first_use, "rss_imports_mb": rss_before,
+                   "rss_after_startup_mb": rss_startup, "rss_all_loaded_mb": app.current_rss_mb(),
+                   "models": len(app.models), "compact": compact}}))
+"""
+
+# (label, SMART_CITY_LAZY_LOAD, MODEL_MMAP_MODE, SMART_CITY_COMPACT_MODELS)
+CONFIGS = [
+    (".joblib, eager, no mmap (before)", "0", None, "0"),
+    (".joblib, eager, mmap", "0", "r", "0"),
+    (".joblib, lazy, mmap", "1", "r", "0"),
+    ("compact, eager, mmap", "0", "r", "1"),
+    ("compact, lazy, mmap", "1", "r", "1"),
+]
+
+if __name__ == "__main__":
+    for label, lazy, mmap_mode, compact in CONFIGS:
+        env = dict(os.environ, SMART_CITY_LAZY_LOAD=lazy, SMART_CITY_COMPACT_MODELS=compact)
+        out = subprocess.run([sys.executable, "-c", WORKER.format(mmap_mode=mmap_mode)], cwd=REPO_ROOT,
+                             env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        if compact == "1" and not r["compact"]:
+            print(f"{label:<32} skipped: no compact models in models/ (run compress.py first)")
+            continue
+        print(f"{label:<32} startup {r['startup_s']:.3f}s  first use of all models {r['first_use_s']:.3f}s  "
+              f"RSS imports {r['rss_imports_mb']:.1f} MB -> after startup {r['rss_after_startup_mb']:.1f} MB "
+              f"-> all loaded {r['rss_all_loaded_mb']:.1f} MB ({r['compact']}/{r['models']} compact)")
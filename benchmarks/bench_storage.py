@@ -0,0 +1,74 @@
+# benchmarks/bench_storage.py
+# File size and read time of the raw datasets as CSV vs Parquet, for a full
+# read and for the column projection each etl.prepare_* uses. Then writes
+# hourly traffic past 2262 (where nanosecond timestamps overflow) through
+# simulate.py's save=True path and reads it back in both formats.
+#   python benchmarks/bench_storage.py [num_records]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulate
+import storage
+
+# Columns each etl.prepare_* function reads
+PROJECTIONS = {
+    "traffic_data": ['hour', 'day_of_week', 'weather', 'vehicle_count'],
+    "energy_data": ['hour', 'day_of_week', 'temperature', 'grid_load_mw'],
+    "waste_data": None,
+    "pollution_data": ['hour', 'traffic_level', 'aqi'],
+    "emergency_data": ['hour', 'day_of_week', 'weather', 'traffic_level', 'incident_happened'],
+}
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def check_far_timestamps(folder, num=3_000_000):
+    """save=True past the datetime64[ns] range: ~2.1M hourly rows from 2025 reach 2262."""
+    cwd = os.getcwd()
+    os.chdir(folder) # simulate.py writes to data/
+    os.makedirs(simulate.LOCAL_DATA_FOLDER, exist_ok=True)
+    try:
+        for fmt in ["csv", "parquet"]:
+            storage.DATA_FORMAT = simulate.DATA_FORMAT = fmt
+            df = simulate.generate_traffic_data(num, simulate.START_DATE)
+            back = storage.read_dataset(simulate.LOCAL_DATA_FOLDER, "traffic_data")
+            assert back["timestamp"].dtype == storage.TIMESTAMP_DTYPE, back["timestamp"].dtype
+            assert (back["timestamp"].to_numpy() == df["timestamp"].to_numpy()).all()
+            print(f"{fmt:<8} {num} hourly rows saved and read back, last timestamp {back['timestamp'].iloc[-1]}")
+    finally:
+        os.chdir(cwd)
+
+if __name__ == "__main__":
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    if not storage.HAS_PARQUET:
+        sys.exit("pyarrow is not installed, nothing to compare.")
+    generators = {"traffic_data": simulate.generate_traffic_data, "energy_data": simulate.generate_energy_data,
+                  "waste_data": simulate.generate_waste_data, "pollution_data": simulate.generate_pollution_data,
+                  "emergency_data": simulate.generate_emergency_data}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, generate in generators.items():
+            df = generate(num, simulate.START_DATE, save=False)
+            results = {}
+            for fmt in ["csv", "parquet"]:
+                folder = os.path.join(tmp, fmt)
+                os.makedirs(folder, exist_ok=True)
+                storage.DATA_FORMAT = fmt # Read back the format just written
+                path = storage.write_dataset(df, folder, name, fmt)
+                full = best_of(lambda: storage.read_dataset(folder, name))
+                projected = best_of(lambda: storage.read_dataset(folder, name, PROJECTIONS[name]))
+                results[fmt] = (os.path.getsize(path) / 2**20, full, projected)
+            (csv_mb, csv_full, csv_proj), (pq_mb, pq_full, pq_proj) = results["csv"], results["parquet"]
+            print(f"{name:<15} {len(df):>9} rows | size CSV {csv_mb:7.1f} MB, Parquet {pq_mb:6.1f} MB "
+                  f"({csv_mb / pq_mb:4.1f}x) | full read {csv_full:6.3f}s vs {pq_full:6.3f}s "
+                  f"({csv_full / pq_full:5.1f}x) | ETL columns {csv_proj:6.3f}s vs {pq_proj:6.3f}s "
+                  f"({csv_proj / pq_proj:5.1f}x)")
+        check_far_timestamps(tmp)
@@ -0,0 +1,85 @@
+# benchmarks/bench_waste_etl.py
+# 1. Property check: etl.build_waste_features matches the original groupby/transform
+#    implementation on randomly generated waste histories (shuffled rows, gaps,
+#    string or categorical bin ids, bins that are never emptied, sub-second times).
+# 2. Scaling benchmark over bins x days against that original implementation.
+#   python benchmarks/bench_waste_etl.py [trials]
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import etl
+
+def reference_waste_features(df):
+    """The original prepare_waste_forecast body, kept as the oracle."""
+    df = df.copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values(by=['bin_id', 'timestamp'])
+    df['last_empty_approx'] = df['timestamp'].where(df['fill_level_percent'] < 10).groupby(df['bin_id']).transform(lambda x: x.ffill())
+    df['days_since_collection'] = (df['timestamp'] - df['last_empty_approx']).dt.days
+    df = df.fillna(0)
+    df['days_since_collection'] = df['days_since_collection'].clip(lower=0)
+    df['target'] = df.groupby('bin_id')['fill_level_percent'].shift(-1)
+    features_df = df[['bin_type', 'fill_level_percent', 'days_since_collection', 'target']].copy()
+    features_df = pd.get_dummies(features_df, columns=['bin_type'], drop_first=True)
+    return features_df.dropna()
+
+def random_history(rng, n_bins, n_days):
+    """Random readings: per-bin random subsets of days, random fills, shuffled rows.
+
+    Half the histories read at sub-second times within a few seconds of the same
+    time each day, so readings a day apart are often less than a whole day apart.
+    """
+    rows = []
+    sub_second = rng.random() < 0.5
+    for b in range(n_bins):
+        days = np.sort(rng.choice(n_days, size=rng.integers(1, n_days + 1), replace=False))
+        fills = rng.integers(0, 101, len(days)) if rng.random() > 0.2 else rng.integers(10, 101, len(days))
+        if sub_second:
+            time_of_day = pd.to_timedelta(rng.integers(0, 3_000_000, len(days)), unit="us")
+        else:
+            time_of_day = pd.to_timedelta(rng.integers(0, 86_400, len(days)), unit="s")
+        rows.append(pd.DataFrame({
+            "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(days, unit="D") + time_of_day,
+            "bin_id": f"bin_{b}", "bin_type": rng.choice(["Landfill", "Recycling"]),
+            "fill_level_percent": fills,
+        }))
+    df = pd.concat(rows, ignore_index=True)
+    df = df.sample(frac=1, random_state=int(rng.integers(1 << 31))).reset_index(drop=True)
+    if rng.random() < 0.5:
+        df['bin_id'] = df['bin_id'].astype("category")
+    return df
+
+def scaling_history(n_bins, n_days, rng):
+    return pd.DataFrame({
+        "timestamp": np.repeat(pd.date_range("2025-01-01", periods=n_days, freq="D"), n_bins),
+        "bin_id": np.tile([f"bin_{b}" for b in range(n_bins)], n_days),
+        "bin_type": np.tile(rng.choice(["Landfill", "Recycling"], n_bins), n_days),
+        "fill_level_percent": rng.integers(0, 101, n_bins * n_days),
+    })
+
+if __name__ == "__main__":
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rng = np.random.default_rng(0)
+    for _ in range(trials):
+        df = random_history(rng, int(rng.integers(1, 12)), int(rng.integers(1, 40)))
+        expected, actual = reference_waste_features(df), etl.build_waste_features(df)
+        pd.testing.assert_frame_equal(actual, expected)
+    print(f"OK: build_waste_features matches the reference on {trials} random histories.")
+
+    for n_bins in [49, 1_000, 10_000]:
+        for n_days in [30, 365]:
+            df = scaling_history(n_bins, n_days, rng)
+            start = time.perf_counter()
+            reference_waste_features(df)
+            old = time.perf_counter() - start
+            start = time.perf_counter()
+            etl.build_waste_features(df)
+            new = time.perf_counter() - start
+            print(f"{n_bins:>6} bins x {n_days:>3} days ({len(df):>9} rows): "
+                  f"reference {old:7.3f}s, vectorized {new:6.3f}s ({old / new:5.1f}x)")
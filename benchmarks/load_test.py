@@ -0,0 +1,116 @@
+# benchmarks/load_test.py
+# Throughput and latency percentiles of a /predict/* endpoint at increasing concurrency.
+# Starts the API in a subprocess (S3 stubbed, models/ used as-is) unless --url is given:
+#   python benchmarks/load_test.py --executor process --workers 4 --concurrency 1,8,32,128
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+import numpy as np
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def serve(port):
+    """Runs the API in this process with S3 stubbed out (the --serve mode)."""
+    import aws_utils # Our S3 script
+    aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline: use models/ as-is
+    import uvicorn
+    import app
+    uvicorn.run(app.app, host="127.0.0.1", port=port, log_level="warning")
+
+def start_server(port, executor, workers, max_pending, max_wait_ms, max_batch):
+    env = dict(os.environ, SMART_CITY_INFERENCE_EXECUTOR=executor, SMART_CITY_MODEL_WATCH_SECONDS="0",
+               SMART_CITY_INFERENCE_WORKERS=str(workers), SMART_CITY_INFERENCE_MAX_PENDING=str(max_pending),
+               SMART_CITY_MICROBATCH_MAX_WAIT_MS=str(max_wait_ms), SMART_CITY_MICROBATCH_MAX_BATCH=str(max_batch))
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port)],
+                              cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/", timeout=1).json().get("models_loaded"):
+                return server, url
+        except (httpx.HTTPError, ValueError):
+            pass
+        if server.poll() is not None:
+            break
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("API server did not come up with models loaded")
+
+async def run_level(url, domain, concurrency, duration):
+    """Keeps `concurrency` requests in flight for `duration` seconds."""
+    from bench_batch import random_row
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.post(f"{url}/predict/{domain}", json=random_row(domain))
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    return {"concurrency": concurrency, "requests": len(latencies), "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2), "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2), "ok": statuses.get(200, 0), "rejected_503": statuses.get(503, 0)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the Smart City API.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="Test an already running API instead of starting one.")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=0, help="Inference workers (0 = one per core).")
+    parser.add_argument("--max-pending", type=int, default=0, help="Executor queue bound (0 = default).")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="Micro-batch wait (0 = off).")
+    parser.add_argument("--max-batch", type=int, default=64, help="Micro-batch size cap.")
+    parser.add_argument("--domain", default="traffic")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Comma-separated levels.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per concurrency level.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        sys.exit(0)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # For bench_batch.random_row
+    random.seed(42)
+    server, url = (None, args.url) if args.url else start_server(args.port, args.executor, args.workers,
+                                                                 args.max_pending, args.max_wait_ms,
+                                                                 args.max_batch)
+    try:
+        results = []
+        print(f"/predict/{args.domain} on {url} ({'external' if args.url else args.executor} executor)")
+        for level in [int(c) for c in args.concurrency.split(",")]:
+            result = asyncio.run(run_level(url, args.domain, level, args.duration))
+            results.append(result)
+            print(f"  concurrency {level:>4}: {result['rps']:8.1f} req/s, p50 {result['p50_ms']:8.2f} ms, "
+                  f"p99 {result['p99_ms']:8.2f} ms, {result['rejected_503']} rejected")
+        if not args.url:
+            print(f"  executor: {httpx.get(f'{url}/inference/stats').json()}")
+            print(f"  batching: {httpx.get(f'{url}/batching/stats').json().get(args.domain)}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"url": url, "executor": None if args.url else args.executor,
+                       "domain": args.domain, "results": results}, f, indent=1)
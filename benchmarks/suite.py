@@ -0,0 +1,278 @@
+# benchmarks/suite.py
+# End-to-end benchmark of the forecasting pipeline on simulate.py data at fixed
+# scales: every etl.prepare_*_forecast, every train_model fit, model load time,
+# and single-row / batch API latency through FastAPI's TestClient. Runs offline
+# (S3 is stubbed) in a scratch folder, writes the results as JSON and can
+# compare them against a stored baseline, exiting 1 on a regression.
+# Run from the repo root:
+#   python benchmarks/suite.py --scales 5k --output results.json
+#   python benchmarks/suite.py --scales 5k --save-baseline         # store benchmarks/baseline.json
+#   python benchmarks/suite.py --scales 5k --compare               # check against benchmarks/baseline.json
+#   python benchmarks/suite.py --compare-only results.json         # compare an existing result file
+# The committed baseline.json is a 5k run on one core; re-record it with --save-baseline
+# on the machine the comparisons will run on.
+# The 5M scale (hourly timestamps up to 2595) takes ~16 min on one core, almost
+# all of it in the fit stage; use --workdir to keep its data between runs.
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aws_utils # Our S3 script
+aws_utils.download_from_s3 = lambda local_folder, bucket_name, **kwargs: None # Offline
+aws_utils.upload_to_s3 = lambda local_folder, bucket_name, **kwargs: None
+
+import sklearn
+from fastapi.testclient import TestClient
+import app
+import etl # Our ETL script
+import train # Our training script
+import simulate # Our data generator
+from bench_batch import random_row
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+SCALES = {"5k": 5_000, "500k": 500_000, "5M": 5_000_000} # Hourly rows per simulated dataset
+STAGES = ["etl", "fit", "load", "api"]
+GENERATORS = [simulate.generate_traffic_data, simulate.generate_energy_data, simulate.generate_waste_data,
+              simulate.generate_pollution_data, simulate.generate_emergency_data]
+SINGLE_ROW_REQUESTS = 200 # Per domain, for the single-row latency percentiles
+BATCH_SIZE = 1000
+TOLERANCE = 0.15 # Slower than the baseline by more than this fraction is a regression...
+MIN_DELTA_SECONDS = 0.0005 # ...if it is also slower by at least this much (filters timer noise)
+
+@contextlib.contextmanager
+def quiet():
+    """Swallows the pipeline's progress prints so the suite's own lines stay readable."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+@contextlib.contextmanager
+def working_directory(path):
+    """data/, models/ etc. are relative in every script, so each scale runs inside its own folder."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def median_seconds(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def environment():
+    """What the numbers depend on, stored with them so two result files can be told apart."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "sklearn": sklearn.__version__, "platform": platform.platform(), "cpus": os.cpu_count(),
+            "data_format": simulate.DATA_FORMAT, "seed": simulate.SEED}
+
+# --- Stages ---
+def generate_data(num_records):
+    """simulate.py's datasets, each generator with the default seed, unless already in data/."""
+    os.makedirs(simulate.LOCAL_DATA_FOLDER, exist_ok=True)
+    marker = os.path.join(simulate.LOCAL_DATA_FOLDER, ".num_records")
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if f.read() == str(num_records):
+                return
+    start = time.perf_counter()
+    with quiet():
+        for generate in GENERATORS:
+            generate(num_records, simulate.START_DATE)
+    with open(marker, "w") as f:
+        f.write(str(num_records))
+    print(f"  generated {num_records} records per dataset in {time.perf_counter() - start:.1f}s")
+
+def bench_etl(results, repeats):
+    """Seconds per prepare_*_forecast; returns the frames for the fit stage."""
+    frames = {}
+    for domain, prepare in etl.PREPARE_FUNCTIONS.items():
+        with quiet():
+            frames[domain] = prepare()
+            results[f"etl/{domain}"] = median_seconds(prepare, repeats)
+        print(f"  etl/{domain:<28} {results[f'etl/{domain}']:9.3f}s ({len(frames[domain])} rows)")
+    return frames
+
+def bench_fit(results, frames):
+    """Seconds per train_model fit (one fit each: at the larger scales a fit takes minutes)."""
+    os.makedirs(train.LOCAL_MODEL_FOLDER, exist_ok=True)
+    for model_name, domain, model_type in train.TRAINING_JOBS:
+        if frames is None:
+            with quiet():
+                frame = etl.PREPARE_FUNCTIONS[domain]()
+        else:
+            frame = frames[domain]
+        with quiet():
+            timings = train.train_model(model_name, frame, model_type)
+        if timings is None:
+            print(f"  fit/{model_name}: no rows to train on, skipped")
+            continue
+        results[f"fit/{model_name}"] = timings["fit"]
+        print(f"  fit/{model_name:<28} {timings['fit']:9.3f}s")
+
+def bench_load(results, repeats):
+    """Seconds to load (read, compile, warm up and swap in) each model, as the watcher would."""
+    model_names = app.local_model_names()
+    for model_name in model_names:
+        with quiet():
+            results[f"load/{model_name}"] = median_seconds(lambda: app.load_model(model_name), repeats)
+        print(f"  load/{model_name:<27} {results[f'load/{model_name}']:9.3f}s")
+    if model_names:
+        results["load/all"] = sum(results[f"load/{name}"] for name in model_names)
+
+def bench_api(results, client, repeats):
+    """Single-row p50/p95 and whole-batch latency per domain, with the prediction cache off."""
+    for cache in app.caches.values():
+        cache.max_size = 0 # Random rows would otherwise hit a varying share of cached answers
+    for domain in app.DOMAINS:
+        if app.DOMAINS[domain]["model_key"] not in app.models:
+            print(f"  api/{domain}: model not loaded, skipped")
+            continue
+        timings = []
+        for row in [random_row(domain) for _ in range(SINGLE_ROW_REQUESTS)]:
+            start = time.perf_counter()
+            response = client.post(f"/predict/{domain}", json=row)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200 and "error" not in response.json(), response.text
+        results[f"api/{domain}/single_p50"] = float(np.percentile(timings, 50))
+        results[f"api/{domain}/single_p95"] = float(np.percentile(timings, 95))
+
+        rows = [random_row(domain) for _ in range(BATCH_SIZE)]
+        results[f"api/{domain}/batch_{BATCH_SIZE}"] = median_seconds(
+            lambda: client.post(f"/predict/{domain}/batch", json=rows), repeats)
+        print(f"  api/{domain:<10} single p50 {results[f'api/{domain}/single_p50'] * 1000:7.2f} ms, "
+              f"p95 {results[f'api/{domain}/single_p95'] * 1000:7.2f} ms, "
+              f"batch of {BATCH_SIZE} {results[f'api/{domain}/batch_{BATCH_SIZE}'] * 1000:8.1f} ms")
+
+def run_scale(scale, folder, stages, repeats):
+    """Every selected stage at one scale, inside folder. Returns {metric: seconds}."""
+    results = {}
+    os.makedirs(folder, exist_ok=True)
+    with working_directory(folder):
+        generate_data(SCALES[scale])
+        frames = bench_etl(results, repeats) if "etl" in stages else None
+        if "fit" in stages:
+            bench_fit(results, frames)
+        frames = None # The 5M-row frames are large; free them before the API loads
+        if not {"load", "api"} & set(stages):
+            return results
+        if not app.local_model_names():
+            print("  no models in this scale's models/ (include the fit stage), load/api skipped")
+            return results
+        with TestClient(app.app) as client: # Startup loads this scale's models/
+            if "load" in stages:
+                bench_load(results, repeats)
+            if "api" in stages:
+                bench_api(results, client, repeats)
+    return results
+
+# --- Baseline comparison ---
+def compare(current, baseline, tolerance=TOLERANCE, min_delta=MIN_DELTA_SECONDS):
+    """Prints every metric both runs have, and returns the ones that got slower beyond the tolerance."""
+    regressions = []
+    for scale, values in current["results"].items():
+        base_values = baseline["results"].get(scale, {})
+        shared = [name for name in values if name in base_values]
+        if not shared:
+            print(f"{scale}: not in the baseline, nothing to compare")
+            continue
+        print(f"{scale}: {'metric':<34}{'baseline':>12}{'current':>12}{'change':>9}")
+        for name in shared:
+            base, value = base_values[name], values[name]
+            change = (value - base) / base if base > 0 else 0.0
+            regressed = value > base * (1 + tolerance) and value - base >= min_delta
+            if regressed:
+                regressions.append((scale, name, base, value))
+            print(f"{'':<{len(scale) + 2}}{name:<34}{base:12.4f}{value:12.4f}{change:+9.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    def setup(result): # Everything but the commit, which differs whenever the code under test does
+        return {k: v for k, v in result.get("environment", {}).items() if k != "commit"}
+    if setup(baseline) != setup(current):
+        print("Note: the baseline was recorded in a different environment "
+              f"({baseline.get('environment')}), compare with care.")
+    return regressions
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def write_json(data, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks of the ETL, training and API.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["5k"])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Runs per ETL, load and batch timing; the median is kept.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random API request rows.")
+    parser.add_argument("--workdir", default=None,
+                        help="Keep each scale's data/ and models/ in <workdir>/<scale> and reuse the data "
+                             "on the next run (default: a temporary folder).")
+    parser.add_argument("--output", default=None, help="Write the results JSON here.")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, default=None,
+                        help=f"Also store the results as the baseline (default {BASELINE_PATH}).")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, default=None,
+                        help=f"Compare the results against a baseline (default {BASELINE_PATH}).")
+    parser.add_argument("--compare-only", default=None, metavar="RESULTS",
+                        help="Skip the benchmarks and compare an existing results file.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA_SECONDS)
+    args = parser.parse_args()
+
+    baseline_path = args.compare or (BASELINE_PATH if args.compare_only else None)
+    if baseline_path and not os.path.exists(baseline_path) and baseline_path != args.save_baseline:
+        # Checked before the benchmarks run, not after minutes of them
+        parser.error(f"no baseline at {baseline_path}; record one first with --save-baseline "
+                     f"(benchmarks/baseline.json holds the committed 5k one)")
+
+    if args.compare_only:
+        current = load_json(args.compare_only)
+    else:
+        random.seed(args.seed)
+        app.MODEL_WATCH_INTERVAL_SECONDS = 0
+        current = {"environment": environment(), "repeats": args.repeats,
+                   "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "results": {}}
+        with contextlib.ExitStack() as stack:
+            workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+            for scale in args.scales:
+                print(f"--- {scale} ({SCALES[scale]} records per dataset) ---")
+                current["results"][scale] = run_scale(scale, os.path.join(os.path.abspath(workdir), scale),
+                                                      args.stages, args.repeats)
+        if args.output:
+            write_json(current, args.output)
+            print(f"Results written to {args.output}")
+        if args.save_baseline:
+            write_json(current, args.save_baseline)
+            print(f"Baseline written to {args.save_baseline}")
+
+    if baseline_path:
+        regressions = compare(current, load_json(baseline_path), args.tolerance, args.min_delta)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%} vs {baseline_path}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} vs {baseline_path}")
@@ -0,0 +1,189 @@
+# compress.py
+import numpy as np
+from sklearn.model_selection import train_test_split
+import argparse
+import copy
+import json
+import os
+import time
+import joblib
+import feature_cache # Cached ETL output, keyed on the raw file contents
+import storage # For the model file digest
+import train # Model folder, training jobs, lookup tables
+from forest_engine import CompiledForest
+
+# --- Configuration ---
+COMPACT_SUFFIX = "_compact.npz" # Written next to <model>.joblib, served by app.py in its place
+TOLERANCE = 0.01 # Keep the fewest trees whose holdout error is within this fraction of the full forest's
+MIN_TREES = 5
+LATENCY_REPEATS = 200
+LOAD_REPEATS = 5
+# Model name -> (ETL domain, model type) for every model train.py can build
+MODEL_JOBS = {model_name: (domain, model_type)
+              for model_name, domain, model_type in train.TRAINING_JOBS + train.HORIZON_JOBS}
+
+def compact_path(model_name):
+    return os.path.join(train.LOCAL_MODEL_FOLDER, f"{model_name}{COMPACT_SUFFIX}")
+
+# --- Holdout Data ---
+def holdout(model_name):
+    """The model's test rows from train.py's split, in three parts of (X, y).
+
+    The greedy search orders trees on the first, how many to keep is decided
+    on the second, and the accuracy delta is reported on the third. A search
+    that scored its own picks would keep too few trees on small holdouts.
+    """
+    domain, model_type = MODEL_JOBS[model_name]
+    feature_columns = joblib.load(os.path.join(train.LOCAL_MODEL_FOLDER, f"{model_name}_features.joblib"))
+    horizons = None
+    targets_path = os.path.join(train.LOCAL_MODEL_FOLDER, f"{model_name}_targets.joblib")
+    if model_type == 'multi_horizon':
+        horizons = [int(name[len("target_"):-1]) for name in joblib.load(targets_path)]
+    features_df = feature_cache.load_features(domain, horizons=horizons)
+    target_columns = [c for c in features_df.columns if c == 'target' or str(c).startswith('target_')]
+    X = features_df.drop(columns=target_columns)
+    X.columns = X.columns.astype(str)
+    y = features_df[target_columns]
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42) # Same split as train_model
+    X_test = X_test.reindex(columns=feature_columns, fill_value=0).to_numpy(np.float32)
+    y_test = y_test.to_numpy(np.float64)
+    return [(X_part, y_part) for X_part, y_part in zip(np.array_split(X_test, 3), np.array_split(y_test, 3))]
+
+# --- Tree Selection ---
+def tree_predictions(model, X):
+    """(n_trees, n_rows, n_outputs): each tree's prediction, the class-1 probability for classifiers."""
+    if hasattr(model, "classes_"):
+        return np.stack([tree.predict_proba(X)[:, 1:2] for tree in model.estimators_])
+    return np.stack([tree.predict(X).reshape(len(X), -1) for tree in model.estimators_])
+
+def holdout_error(predictions, y, is_classifier):
+    """RMSE (averaged over outputs) or Brier score, over the last two axes; works on stacked candidates."""
+    squared = ((predictions - y) ** 2).mean(axis=(-2, -1))
+    return squared if is_classifier else np.sqrt(squared)
+
+def greedy_tree_order(per_tree, y, is_classifier):
+    """Forward selection: at each step, add the tree that lowers the ensemble's error most.
+
+    Returns the tree order and the error of the average of each prefix.
+    """
+    remaining = list(range(len(per_tree)))
+    order, errors = [], []
+    total = np.zeros_like(per_tree[0])
+    while remaining:
+        candidates = (total + per_tree[remaining]) / (len(order) + 1)
+        best = int(np.argmin(holdout_error(candidates, y, is_classifier)))
+        tree = remaining.pop(best)
+        order.append(tree)
+        total += per_tree[tree]
+        errors.append(float(holdout_error(total / len(order), y, is_classifier)))
+    return order, errors
+
+def select_trees(model, search, validation, tolerance=TOLERANCE):
+    """Indices of the smallest greedy tree subset within `tolerance` of the full forest's validation error."""
+    is_classifier = hasattr(model, "classes_")
+    order, _ = greedy_tree_order(tree_predictions(model, search[0]), search[1], is_classifier)
+    per_tree = tree_predictions(model, validation[0])[order]
+    prefix_means = np.cumsum(per_tree, axis=0) / np.arange(1, len(order) + 1)[:, None, None]
+    errors = holdout_error(prefix_means, validation[1], is_classifier)
+    full_error = errors[-1] # Every tree, i.e. the forest itself
+    # The smallest k past which every larger prefix stays within tolerance, not the first lucky dip
+    outside = np.flatnonzero(errors > full_error * (1 + tolerance))
+    n_keep = max(MIN_TREES, outside[-1] + 2 if len(outside) else 1)
+    return sorted(order[:min(n_keep, len(order))])
+
+# --- Compression ---
+def compress_model(model_name, tolerance=TOLERANCE):
+    """Writes <model>_compact.npz (tree subset, float32) and returns its report row."""
+    model_path = os.path.join(train.LOCAL_MODEL_FOLDER, f"{model_name}.joblib")
+    model = joblib.load(model_path)
+    is_classifier = hasattr(model, "classes_")
+    search, validation, (X_report, y_report) = holdout(model_name)
+
+    start = time.perf_counter()
+    subset = copy.copy(model)
+    subset.estimators_ = [model.estimators_[i] for i in select_trees(model, search, validation, tolerance)]
+    compact = CompiledForest.from_sklearn(subset).to_float32()
+    compact.metadata = {"source_digest": storage.file_digest(model_path), "trees": compact.n_trees,
+                        "source_trees": len(model.estimators_)}
+    train.replace_file(compact_path(model_name), compact.save)
+    select_seconds = time.perf_counter() - start
+
+    table_path = os.path.join(train.LOCAL_MODEL_FOLDER, f"{model_name}_table.npz")
+    if os.path.exists(table_path): # Rebuild it from what will now be served, or the API would reject it
+        train.materialize_model(model_name, compact, list(model.feature_names_in_),
+                                'classifier' if is_classifier else 'regressor')
+
+    full_engine = CompiledForest.from_sklearn(model)
+    def predictions(forest, X):
+        return forest.predict_proba(X)[:, 1:2] if is_classifier else forest.predict(X).reshape(len(X), -1)
+    report = {
+        "trees": [len(model.estimators_), compact.n_trees],
+        "size_mb": [os.path.getsize(model_path) / 2**20, os.path.getsize(compact_path(model_name)) / 2**20],
+        "load_ms": [load_ms(lambda: CompiledForest.from_sklearn(joblib.load(model_path, mmap_mode="r"))),
+                    load_ms(lambda: CompiledForest.load(compact_path(model_name), mmap_mode="r"))],
+        "latency_us": [latency_us(full_engine, X_report), latency_us(compact, X_report)],
+        "metric": "brier" if is_classifier else "rmse",
+        "error": [float(holdout_error(predictions(model, X_report), y_report, is_classifier)),
+                  float(holdout_error(predictions(compact, X_report), y_report, is_classifier))],
+        "select_seconds": select_seconds,
+    }
+    report["error_delta"] = (report["error"][1] - report["error"][0]) / report["error"][0]
+    return report
+
+def load_ms(load):
+    """Median milliseconds from file to a forest ready to serve (what app.py does per model)."""
+    timings = []
+    for _ in range(LOAD_REPEATS):
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def latency_us(forest, X):
+    """Median microseconds to score one row."""
+    predict = forest.predict_proba if forest.classes is not None else forest.predict
+    timings = []
+    for row in X[:LATENCY_REPEATS]:
+        start = time.perf_counter()
+        predict(row[None, :])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+def compress_all(model_names=None, tolerance=TOLERANCE):
+    """Compresses every trained model (or just model_names); returns {model_name: report}."""
+    if model_names is None:
+        model_names = [name for name in MODEL_JOBS
+                       if os.path.exists(os.path.join(train.LOCAL_MODEL_FOLDER, f"{name}.joblib"))]
+    reports = {}
+    for model_name in model_names:
+        try:
+            reports[model_name] = compress_model(model_name, tolerance)
+        except Exception as e:
+            print(f"Error compressing {model_name}: {e}")
+    print_report(reports)
+    return reports
+
+def print_report(reports):
+    print("\n--- Compression Summary (full -> compact) ---")
+    print(f"{'model':<26}{'trees':>10}{'size MB':>15}{'load ms':>15}{'latency us':>15}{'error delta':>20}")
+    for model_name, r in reports.items():
+        print(f"{model_name:<26}{r['trees'][0]:>5}->{r['trees'][1]:<3}"
+              f"{r['size_mb'][0]:7.2f}->{r['size_mb'][1]:<6.2f}{r['load_ms'][0]:7.1f}->{r['load_ms'][1]:<6.1f}"
+              f"{r['latency_us'][0]:7.1f}->{r['latency_us'][1]:<6.1f}"
+              f"{r['metric']:>7} {r['error_delta']:+7.2%}")
+
+# --- Main Executor ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress trained forests into compact float32 files for serving.")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_JOBS), default=None,
+                        help="Models to compress (default: every one in the model folder).")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Keep the fewest trees within this fraction of the full forest's holdout error.")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON here.")
+    args = parser.parse_args()
+
+    reports = compress_all(args.models, args.tolerance)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Report written to {args.report}")
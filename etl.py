@@ -1,14 +1,36 @@
 # etl.py
 import pandas as pd
-import os
+import numpy as np
+import argparse
+import functools
+import storage # Parquet/CSV dataset files
+import metrics # Prometheus-style timers and counters
 
 LOCAL_DATA_FOLDER = "data"
+FEATURES_FOLDER = "features" # Output of the streaming (chunked) ETL
+STREAM_CHUNK_SIZE = 100_000 # Raw CSV rows per chunk in streaming mode
 
+# Categories are fixed up front in streaming mode so every chunk one-hot encodes
+# to the same columns. Sorted, so drop_first drops the same level as get_dummies.
+CATEGORIES = {
+    "weather": ["Clear", "Fog", "Rain"],
+    "traffic_level": ["High", "Low"],
+    "bin_type": ["Landfill", "Recycling"],
+}
+
+def _timed(fn):
+    """Records each call's run time in metrics.ETL_SECONDS, labelled with the function's name."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with metrics.ETL_SECONDS.time(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+@_timed
 def prepare_traffic_forecast():
     """Predict vehicle_count 1 hour from now."""
-    filepath = os.path.join(LOCAL_DATA_FOLDER, "traffic_data.csv")
-    if not os.path.exists(filepath): return pd.DataFrame() # Return empty if file missing
-    df = pd.read_csv(filepath)
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, "traffic_data", columns=['hour', 'day_of_week', 'weather', 'vehicle_count'])
+    if df is None: return pd.DataFrame() # Return empty if file missing
 
     # The "target" is the vehicle count 1 hour in the future
     df['target'] = df['vehicle_count'].shift(-1)
@@ -23,11 +45,11 @@ def prepare_traffic_forecast():
     features_df = features_df.dropna()
     return features_df
 
+@_timed
 def prepare_energy_forecast():
     """Predict grid_load_mw 24 hours from now."""
-    filepath = os.path.join(LOCAL_DATA_FOLDER, "energy_data.csv")
-    if not os.path.exists(filepath): return pd.DataFrame()
-    df = pd.read_csv(filepath)
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, "energy_data", columns=['hour', 'day_of_week', 'temperature', 'grid_load_mw'])
+    if df is None: return pd.DataFrame()
 
     # The "target" is the grid load 24 hours in the future
     df['target'] = df['grid_load_mw'].shift(-24)
@@ -37,35 +59,68 @@ def prepare_energy_forecast():
     features_df = features_df.dropna()
     return features_df
 
+@_timed
 def prepare_waste_forecast():
     """Predict fill_level_percent 1 day from now."""
-    filepath = os.path.join(LOCAL_DATA_FOLDER, "waste_data.csv")
-    if not os.path.exists(filepath): return pd.DataFrame()
-    df = pd.read_csv(filepath)
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, "waste_data")
+    if df is None: return pd.DataFrame()
+    return build_waste_features(df)
 
-    # Create "days_since_collection" feature (approximate)
+def build_waste_features(df, dropna=True):
+    """Waste features from raw readings (any row order), one vectorized pass per column.
+
+    Rows are sorted by bin, then time, with a single lexsort. Each group-wise step
+    (forward-filling the last near-empty timestamp, shifting the next day's fill
+    level) is a cumulative max or a shifted array masked at bin boundaries.
+    dropna=False keeps each bin's latest reading, whose target is still NaN.
+    """
+    df = df.copy()
     df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values(by=['bin_id', 'timestamp'])
+    # Bin order follows the category order for categoricals, else sorted values (like sort_values)
+    if isinstance(df['bin_id'].dtype, pd.CategoricalDtype):
+        bin_codes = df['bin_id'].cat.codes.to_numpy()
+    else:
+        bin_codes = pd.factorize(df['bin_id'], sort=True)[0]
+    ts = df['timestamp'].to_numpy() # At the stored resolution: sub-second gaps count, as in .dt.days
+    order = np.lexsort((ts.view(np.int64), bin_codes))
+    df, bin_codes, ts = df.iloc[order], bin_codes[order], ts[order]
+
+    n = len(df)
+    positions = np.arange(n)
+    group_start = np.ones(n, dtype=bool)
+    group_start[1:] = bin_codes[1:] != bin_codes[:-1]
+    first_in_group = np.maximum.accumulate(np.where(group_start, positions, 0))
+
+    # Create "days_since_collection" feature (approximate)
     # Find the last time the bin was near empty (likely after collection)
-    df['last_empty_approx'] = df['timestamp'].where(df['fill_level_percent'] < 10).groupby(df['bin_id']).transform(lambda x: x.ffill())
-    df['days_since_collection'] = (df['timestamp'] - df['last_empty_approx']).dt.days
-    df = df.fillna(0) # Handle initial NaNs before first collection
-    df['days_since_collection'] = df['days_since_collection'].clip(lower=0)
+    fill = df['fill_level_percent'].to_numpy()
+    last_empty = np.maximum.accumulate(np.where(fill < 10, positions, -1))
+    seen_empty = last_empty >= first_in_group # Before the first collection there is none
+    days = np.zeros(n, dtype=np.float64)
+    days[seen_empty] = (ts[seen_empty] - ts[last_empty[seen_empty]]) // np.timedelta64(1, 'D')
+    days = np.clip(days, 0, None)
+    # Integer days like .dt.days when every row has a collection before it, else float (NaNs filled with 0)
+    df['days_since_collection'] = days.astype(np.int64) if seen_empty.all() else days
+    df['fill_level_percent'] = df['fill_level_percent'].fillna(0)
 
     # The "target" is the fill level 1 day in the future (within the same bin group)
-    df['target'] = df.groupby('bin_id')['fill_level_percent'].shift(-1)
+    target = np.full(n, np.nan)
+    same_bin_next = ~group_start[1:]
+    target[:-1][same_bin_next] = df['fill_level_percent'].to_numpy()[1:][same_bin_next]
+    df['target'] = target
 
     features_df = df[['bin_type', 'fill_level_percent', 'days_since_collection', 'target']].copy()
     features_df = pd.get_dummies(features_df, columns=['bin_type'], drop_first=True)
-    features_df = features_df.dropna()
+    if dropna:
+        features_df = features_df.dropna()
     return features_df
 
 
+@_timed
 def prepare_pollution_forecast():
     """Predict AQI 1 hour from now."""
-    filepath = os.path.join(LOCAL_DATA_FOLDER, "pollution_data.csv")
-    if not os.path.exists(filepath): return pd.DataFrame()
-    df = pd.read_csv(filepath)
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, "pollution_data", columns=['hour', 'traffic_level', 'aqi'])
+    if df is None: return pd.DataFrame()
 
     df['target'] = df['aqi'].shift(-1)
     features_df = df[['hour', 'traffic_level', 'aqi', 'target']].copy()
@@ -73,11 +128,12 @@ def prepare_pollution_forecast():
     features_df = features_df.dropna()
     return features_df
 
+@_timed
 def prepare_emergency_forecast():
     """Predict probability of an incident in the next hour."""
-    filepath = os.path.join(LOCAL_DATA_FOLDER, "emergency_data.csv")
-    if not os.path.exists(filepath): return pd.DataFrame()
-    df = pd.read_csv(filepath)
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, "emergency_data",
+                              columns=['hour', 'day_of_week', 'weather', 'traffic_level', 'incident_happened'])
+    if df is None: return pd.DataFrame()
 
     # The target is already 0 or 1, so no shift is needed
     df['target'] = df['incident_happened']
@@ -87,11 +143,258 @@ def prepare_emergency_forecast():
     features_df = features_df.dropna()
     return features_df
 
+# --- Registry (used by feature_cache.py) ---
+PREPARE_FUNCTIONS = {
+    "traffic": prepare_traffic_forecast, "energy": prepare_energy_forecast, "waste": prepare_waste_forecast,
+    "pollution": prepare_pollution_forecast, "emergency": prepare_emergency_forecast,
+}
+RAW_DATASETS = {domain: f"{domain}_data" for domain in PREPARE_FUNCTIONS}
+# Cached features are keyed on the whole source of this module and storage.py, so
+# any code change (a helper, CATEGORIES, SCHEMAS) invalidates them; bump a domain's
+# version when its features change without any (e.g. a pandas upgrade's behaviour)
+ETL_VERSIONS = {"traffic": 1, "energy": 1, "waste": 2, "pollution": 1, "emergency": 1}
+
+# --- Streaming (chunked) ETL ---
+# Same features as the prepare_* functions above, but each raw dataset is read in
+# chunks of STREAM_CHUNK_SIZE rows and the features are appended to
+# FEATURES_FOLDER/<domain>_features.parquet (or .csv), so memory stays bounded by the chunk
+# size instead of the file size. Raw files must be in time order (as written
+# by simulate.py); rows come out in file order rather than sorted by bin.
+STREAM_SPECS = {
+    # (also used by prepare_horizon_forecast)
+    # target column, shift horizon (rows), feature columns, categorical columns
+    "traffic": {"dataset": "traffic_data", "target": "vehicle_count", "horizon": 1,
+                "columns": ['hour', 'day_of_week', 'weather', 'vehicle_count'], "categorical": ['weather']},
+    "energy": {"dataset": "energy_data", "target": "grid_load_mw", "horizon": 24,
+               "columns": ['hour', 'day_of_week', 'temperature', 'grid_load_mw'], "categorical": []},
+    "pollution": {"dataset": "pollution_data", "target": "aqi", "horizon": 1,
+                  "columns": ['hour', 'traffic_level', 'aqi'], "categorical": ['traffic_level']},
+    "emergency": {"dataset": "emergency_data", "target": "incident_happened", "horizon": 0,
+                  "columns": ['hour', 'day_of_week', 'weather', 'traffic_level'],
+                  "categorical": ['weather', 'traffic_level']},
+}
+
+def _encode_categoricals(df, columns):
+    """One-hot encodes with the fixed CATEGORIES so every chunk gets the same columns."""
+    df = df.copy()
+    for col in columns:
+        df[col] = pd.Categorical(df[col], categories=CATEGORIES[col])
+    return pd.get_dummies(df, columns=columns, drop_first=True)
+
+@_timed
+def stream_forecast(domain, chunksize=STREAM_CHUNK_SIZE, output_folder=FEATURES_FOLDER):
+    """Streaming version of prepare_<domain>_forecast for the hourly domains.
+
+    The last `horizon` rows of each chunk are carried into the next one, since
+    their shifted target lives there. Returns (output path, rows written), or
+    None if the raw file is missing.
+    """
+    if domain == "waste":
+        return stream_waste_forecast(chunksize, output_folder)
+    spec = STREAM_SPECS[domain]
+    if storage.dataset_path(LOCAL_DATA_FOLDER, spec["dataset"]) is None: return None
+    horizon, target_source = spec["horizon"], spec["target"]
+    usecols = list(dict.fromkeys(spec["columns"] + [target_source]))
+
+    writer = storage.ChunkWriter(output_folder, f"{domain}_features")
+    carry = None # Rows still waiting for their future target
+    for chunk in storage.iter_dataset(LOCAL_DATA_FOLDER, spec["dataset"], usecols, chunksize):
+        df = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        if horizon:
+            df['target'] = df[target_source].shift(-horizon)
+            carry = df.iloc[-horizon:][usecols]
+            df = df.iloc[:-horizon]
+        else:
+            df['target'] = df[target_source]
+
+        features_df = _encode_categoricals(df[spec["columns"] + ['target']], spec["categorical"])
+        writer.write(features_df.dropna())
+    writer.close()
+    return writer.path, writer.rows
+
+@_timed
+def stream_waste_forecast(chunksize=STREAM_CHUNK_SIZE, output_folder=FEATURES_FOLDER):
+    """Streaming version of prepare_waste_forecast.
+
+    Per-bin state crosses chunk boundaries: the last near-empty timestamp of
+    each bin (for days_since_collection) and each bin's latest row, which
+    gets its target from that bin's first reading in a later chunk.
+    """
+    if storage.dataset_path(LOCAL_DATA_FOLDER, "waste_data") is None: return None
+    writer = storage.ChunkWriter(output_folder, "waste_features")
+    last_empty = pd.Series(dtype=storage.TIMESTAMP_DTYPE) # bin_id -> last time it was near empty
+    pending = None # Latest row per bin, features done, target unknown
+
+    for chunk in storage.iter_dataset(LOCAL_DATA_FOLDER, "waste_data", chunksize=chunksize):
+        chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+        chunk['bin_id'] = chunk['bin_id'].astype(str) # Plain keys for the per-bin state
+        chunk = chunk.sort_values(by=['bin_id', 'timestamp'])
+        by_bin = chunk.groupby('bin_id')
+
+        empty_at = chunk['timestamp'].where(chunk['fill_level_percent'] < 10)
+        chunk_last_empty = empty_at.groupby(chunk['bin_id']).ffill()
+        carried = pd.Series(last_empty.reindex(chunk['bin_id']).to_numpy(), index=chunk.index)
+        chunk_last_empty = chunk_last_empty.fillna(carried)
+        chunk['days_since_collection'] = (chunk['timestamp'] - chunk_last_empty).dt.days
+        chunk['days_since_collection'] = chunk['days_since_collection'].fillna(0).clip(lower=0)
+        last_empty = empty_at.groupby(chunk['bin_id']).last().dropna().combine_first(last_empty)
+
+        chunk['target'] = by_bin['fill_level_percent'].shift(-1)
+        if pending is not None:
+            first_fill = by_bin['fill_level_percent'].first()
+            pending['target'] = first_fill.reindex(pending['bin_id']).to_numpy()
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+
+        pending = chunk[chunk['target'].isna()].copy()
+        features_df = chunk[['bin_type', 'fill_level_percent', 'days_since_collection', 'target']]
+        writer.write(_encode_categoricals(features_df, ['bin_type']).dropna())
+    writer.close()
+    return writer.path, writer.rows
+
+# --- Multi-horizon ETL ---
+# Hours ahead that a <domain>_horizons_model forecasts in one pass (train.py --horizons overrides)
+HORIZONS = list(range(1, 25))
+# Domains that are one hourly series, so "h hours ahead" is simply h rows ahead (uses STREAM_SPECS)
+HORIZON_DOMAINS = ["traffic", "energy", "pollution"]
+
+def horizon_target(h):
+    return f"target_{h}h"
+
+def parse_horizons(spec):
+    """Parses "1-24" or "1,3,6,12,24" (or a mix) into a sorted list of hours."""
+    horizons = set()
+    for part in spec.split(","):
+        low, _, high = part.strip().partition("-")
+        horizons.update(range(int(low), int(high or low) + 1))
+    if not horizons or min(horizons) < 1:
+        raise ValueError(f"Horizons must be positive hours, got '{spec}'")
+    return sorted(horizons)
+
+@_timed
+def prepare_horizon_forecast(domain, horizons=HORIZONS):
+    """Features for one hourly domain with a target column per horizon.
+
+    Same features as prepare_<domain>_forecast; target_<h>h is the series h
+    rows (hours) ahead, so one multi-output model learns the whole profile.
+    """
+    spec = STREAM_SPECS[domain]
+    usecols = list(dict.fromkeys(spec["columns"] + [spec["target"]]))
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, spec["dataset"], columns=usecols)
+    if df is None: return pd.DataFrame()
+
+    series = df[spec["target"]]
+    targets = pd.DataFrame({horizon_target(h): series.shift(-h) for h in horizons}, index=df.index)
+    features_df = pd.concat([df[spec["columns"]], targets], axis=1)
+    features_df = pd.get_dummies(features_df, columns=spec["categorical"], drop_first=True)
+    # The last max(horizons) rows lack some future target
+    features_df = features_df.dropna()
+    return features_df
+
+# --- Incremental ETL (train.py --incremental) ---
+# Raw waste history re-read before the watermark, so days_since_collection can
+# still see each bin's last collection (bins are emptied well within this)
+WASTE_LOOKBACK = pd.Timedelta(days=60)
+
+@_timed
+def prepare_forecast_since(domain, since=None):
+    """Same features as prepare_<domain>_forecast, for the raw rows after `since` only.
+
+    The frame is indexed by each row's raw timestamp; its max is the next
+    watermark. Rows whose future target hasn't arrived yet are left out, so
+    they come back on a later call once it has. since=None reads all rows.
+    """
+    if domain == "waste":
+        start = None if since is None else pd.Timestamp(since) - WASTE_LOOKBACK
+        df = storage.read_dataset(LOCAL_DATA_FOLDER, "waste_data", since=start)
+        if df is None or df.empty: return pd.DataFrame()
+        features_df = build_waste_features(df)
+        features_df.index = pd.DatetimeIndex(pd.to_datetime(df['timestamp']).loc[features_df.index])
+    else:
+        spec = STREAM_SPECS[domain]
+        usecols = list(dict.fromkeys(['timestamp'] + spec["columns"] + [spec["target"]]))
+        df = storage.read_dataset(LOCAL_DATA_FOLDER, spec["dataset"], columns=usecols, since=since)
+        if df is None or df.empty: return pd.DataFrame()
+        df['target'] = df[spec["target"]].shift(-spec["horizon"]) if spec["horizon"] else df[spec["target"]]
+        features_df = _encode_categoricals(df[spec["columns"] + ['target']], spec["categorical"]).dropna()
+        features_df.index = pd.DatetimeIndex(df['timestamp'].loc[features_df.index])
+    if since is not None:
+        features_df = features_df[features_df.index > pd.Timestamp(since)]
+    return features_df
+
+# --- Latest State (fleet.py) ---
+# Column naming each reading's entity, when a raw dataset has one (the same ids
+# app.py's sensor streams use); without it the whole stream is one entity
+ENTITY_COLUMNS = {"traffic": "segment_id", "energy": "feeder_id", "waste": "bin_id", "pollution": "station_id"}
+CITY_ENTITY = "city"
+
+@_timed
+def prepare_latest(domain, rows=1):
+    """Model features of each entity's newest `rows` readings, for forecasting from now.
+
+    Same features as prepare_<domain>_forecast (without a target: it hasn't
+    happened yet), plus `entity_id` and `timestamp` columns. Every entity is
+    included, however long ago it last reported: only the timestamp and entity
+    columns are read in full, then the last `rows` hours before each entity's
+    own last reading (the last WASTE_LOOKBACK for waste).
+    """
+    dataset = RAW_DATASETS[domain]
+    columns = storage.dataset_columns(LOCAL_DATA_FOLDER, dataset)
+    if columns is None: return pd.DataFrame()
+    entity_column = ENTITY_COLUMNS.get(domain)
+    if entity_column not in columns:
+        entity_column = None
+    index = storage.read_dataset(LOCAL_DATA_FOLDER, dataset,
+                                 columns=['timestamp', entity_column] if entity_column else ['timestamp'])
+    if index.empty: return pd.DataFrame()
+    if entity_column:
+        last_seen = index.groupby(index[entity_column].astype(str))['timestamp'].max()
+    else:
+        last_seen = pd.Series([index['timestamp'].max()], index=[CITY_ENTITY])
+    lookback = WASTE_LOOKBACK if domain == "waste" else pd.Timedelta(hours=rows)
+    stale = last_seen < last_seen.max() - lookback
+    if stale.any():
+        print(f"  {stale.sum()} {domain} entities last reported over {lookback} before the newest reading "
+              f"(oldest {last_seen.min()}); forecasting from their last readings.")
+
+    df = storage.read_dataset(LOCAL_DATA_FOLDER, dataset, since=last_seen.min() - lookback)
+    entity = df[entity_column].astype(str) if entity_column else pd.Series(CITY_ENTITY, index=df.index)
+    recent = df['timestamp'] > entity.map(last_seen) - lookback # Within each entity's own window
+    df, entity = df[recent], entity[recent]
+    if domain == "waste":
+        df['bin_type'] = pd.Categorical(df['bin_type'], categories=CATEGORIES['bin_type']) # Both levels, always
+        features_df = build_waste_features(df, dropna=False).drop(columns=['target'])
+    else:
+        spec = STREAM_SPECS[domain]
+        features_df = _encode_categoricals(df[spec["columns"]], spec["categorical"])
+    features_df['entity_id'] = entity.loc[features_df.index]
+    features_df['timestamp'] = pd.to_datetime(df['timestamp']).loc[features_df.index]
+    features_df = features_df.sort_values(['entity_id', 'timestamp'], kind='stable')
+    return features_df.groupby('entity_id', sort=False).tail(rows).reset_index(drop=True)
+
+def stream_all(chunksize=STREAM_CHUNK_SIZE, output_folder=FEATURES_FOLDER):
+    """Runs the streaming ETL for every domain."""
+    for domain in ["traffic", "energy", "waste", "pollution", "emergency"]:
+        result = stream_forecast(domain, chunksize, output_folder)
+        if result is None:
+            print(f"  {domain}: raw file missing, skipped.")
+        else:
+            print(f"  {domain}: {result[1]} feature rows -> {result[0]}")
+
 if __name__ == "__main__":
-    print("Preparing all datasets for forecasting...")
-    # Example of running one function if needed for testing
-    # traffic_features = prepare_traffic_forecast()
-    # if not traffic_features.empty:
-    #     print("Traffic features prepared successfully.")
-    #     print(traffic_features.head())
-    print("(This script is normally called by train.py)")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Prepare forecasting features from the raw datasets.")
+    parser.add_argument("--stream", action="store_true",
+                        help=f"Process each CSV in chunks and write feature files to '{FEATURES_FOLDER}/'.")
+    parser.add_argument("--chunksize", type=int, default=STREAM_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.stream:
+        print("Streaming all datasets into feature files...")
+        stream_all(args.chunksize)
+    else:
+        print("Preparing all datasets for forecasting...")
+        # Example of running one function if needed for testing
+        # traffic_features = prepare_traffic_forecast()
+        # if not traffic_features.empty:
+        #     print("Traffic features prepared successfully.")
+        #     print(traffic_features.head())
+        print("(This script is normally called by train.py)")
\ No newline at end of file
@@ -0,0 +1,105 @@
+# feature_cache.py
+import pandas as pd
+import hashlib
+import inspect
+import os
+import time
+import etl # Our ETL script
+import storage # Parquet/CSV dataset files
+
+FEATURE_CACHE_FOLDER = ".feature_cache"
+FEATURE_CACHE_MAX_MB = 1024 # Least recently used entries are evicted above this
+
+def _prepare_function(domain, horizons=None):
+    """The ETL function behind a cache entry: prepare_<domain>_forecast, or the multi-horizon one."""
+    if horizons is None:
+        return etl.PREPARE_FUNCTIONS[domain]
+    return lambda: etl.prepare_horizon_forecast(domain, horizons)
+
+def cache_key(domain, horizons=None):
+    """Content hash of the domain's raw file + its ETL version and code, or None if missing.
+
+    The code is all of etl.py and storage.py, not just the prepare function, so a
+    changed helper (build_waste_features, CATEGORIES, SCHEMAS...) misses too.
+    """
+    raw_path = storage.dataset_path(etl.LOCAL_DATA_FOLDER, etl.RAW_DATASETS[domain])
+    if raw_path is None:
+        return None
+    parts = [storage.file_digest(raw_path), str(etl.ETL_VERSIONS[domain]),
+             inspect.getsource(etl), inspect.getsource(storage)]
+    if horizons:
+        parts.append(",".join(map(str, horizons)))
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:32]
+
+def _entry_path(domain, key, horizons=None):
+    ext = ".parquet" if storage.HAS_PARQUET else ".pkl"
+    name = f"{domain}_horizons" if horizons else domain
+    return os.path.join(FEATURE_CACHE_FOLDER, f"{name}-{key}{ext}")
+
+def _read(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+def _write(df, path):
+    tmp_path = f"{path}.tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp_path, index=True)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path) # Never leave a half-written entry behind
+
+def evict(max_mb=None):
+    """Deletes least recently used entries until the cache fits in max_mb."""
+    max_bytes = (FEATURE_CACHE_MAX_MB if max_mb is None else max_mb) * 2**20
+    if not os.path.isdir(FEATURE_CACHE_FOLDER):
+        return
+    entries = []
+    for filename in os.listdir(FEATURE_CACHE_FOLDER):
+        if filename.endswith(".tmp"): # Another process is still writing it
+            continue
+        path = os.path.join(FEATURE_CACHE_FOLDER, filename)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError: # Evicted by a concurrent training process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries): # Oldest first
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        print(f"  Evicted {os.path.basename(path)} from the feature cache.")
+
+def load_features(domain, rebuild=False, horizons=None):
+    """Returns etl.prepare_<domain>_forecast(), served from the cache when the raw file is unchanged.
+
+    With a list of horizons, returns etl.prepare_horizon_forecast(domain, horizons) instead.
+    """
+    prepare = _prepare_function(domain, horizons)
+    key = cache_key(domain, horizons)
+    if key is None:
+        return prepare() # Raw file missing, the ETL returns its usual empty frame
+
+    path = _entry_path(domain, key, horizons)
+    if not rebuild and os.path.exists(path):
+        try:
+            start = time.perf_counter()
+            features_df = _read(path)
+            os.utime(path) # Mark as recently used
+            print(f"Feature cache hit for {domain} ({len(features_df)} rows in {time.perf_counter() - start:.2f}s).")
+            return features_df
+        except Exception as e:
+            print(f"  Warning: Unreadable feature cache entry {path}, rebuilding: {e}")
+
+    start = time.perf_counter()
+    features_df = prepare()
+    elapsed = time.perf_counter() - start
+    print(f"Feature cache {'rebuild' if rebuild else 'miss'} for {domain}: ETL took {elapsed:.2f}s.")
+    if not features_df.empty:
+        os.makedirs(FEATURE_CACHE_FOLDER, exist_ok=True)
+        _write(features_df, path)
+        evict()
+    return features_df
@@ -0,0 +1,95 @@
+# feature_encoder.py
+import numpy as np
+
+class FeatureEncoder:
+    """Maps raw API input dicts straight into a float64 feature matrix.
+
+    Compiled once per model from its saved feature list, it reproduces what
+    pd.get_dummies + reindex(fill_value=0) produce in app.prepare_features:
+    numeric fields land at a fixed column offset and each string field gets a
+    value -> column lookup table for its one-hot slots. Values the model never
+    saw (e.g. the category dropped by drop_first) simply leave their row at 0.
+    """
+
+    def __init__(self, feature_names, input_model):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        column_index = {name: i for i, name in enumerate(self.feature_names)}
+
+        self.numeric = [] # (field, column offset)
+        self.categorical = [] # (field, {value: column offset})
+        for field, info in input_model.model_fields.items():
+            if info.annotation is str:
+                prefix = f"{field}_"
+                table = {name[len(prefix):]: i for name, i in column_index.items() if name.startswith(prefix)}
+                if table:
+                    self.categorical.append((field, table))
+            elif field in column_index:
+                self.numeric.append((field, column_index[field]))
+
+    def encode(self, rows):
+        """Encodes a list of input dicts into an (n_rows, n_features) float64 array."""
+        X = np.zeros((len(rows), self.n_features), dtype=np.float64)
+        if len(rows) == 1: # Fast path for the common single-row request
+            row, out = rows[0], X[0]
+            for field, col in self.numeric:
+                out[col] = row[field]
+            for field, table in self.categorical:
+                col = table.get(row[field])
+                if col is not None:
+                    out[col] = 1.0
+            return X
+
+        for field, col in self.numeric:
+            X[:, col] = [row[field] for row in rows]
+        for field, table in self.categorical:
+            cols = np.fromiter((table.get(row[field], -1) for row in rows), dtype=np.intp, count=len(rows))
+            hit = cols >= 0
+            X[np.nonzero(hit)[0], cols[hit]] = 1.0
+        return X
+
+class SharedEncoder:
+    """Encodes rows for several models at once, each input field a single time.
+
+    Every distinct column the given FeatureEncoders produce (a numeric field,
+    or one field=value one-hot slot) gets one slot in a shared matrix, filled
+    once per row; each model's feature matrix is then a precomputed column
+    gather from it. Columns a model has but no field fills read a spare zero
+    slot, as FeatureEncoder leaves them at 0.
+    """
+
+    def __init__(self, encoders):
+        slots = {} # (field, None) for numeric fields, (field, value) for one-hot slots
+        self.gathers = {}
+        for name, encoder in encoders.items():
+            gather = np.full(encoder.n_features, -1, dtype=np.intp)
+            for field, col in encoder.numeric:
+                gather[col] = slots.setdefault((field, None), len(slots))
+            for field, table in encoder.categorical:
+                for value, col in table.items():
+                    gather[col] = slots.setdefault((field, value), len(slots))
+            self.gathers[name] = gather
+        self.n_slots = len(slots)
+        for gather in self.gathers.values():
+            gather[gather < 0] = self.n_slots
+
+        self.numeric = [(field, slot) for (field, value), slot in slots.items() if value is None]
+        self.categorical = {} # field -> {value: slot}
+        for (field, value), slot in slots.items():
+            if value is not None:
+                self.categorical.setdefault(field, {})[value] = slot
+
+    def encode(self, rows, names=None):
+        """Returns {model name: (n_rows, n_features) float64 array} for the named models (default all).
+
+        A field missing from a row (or None) only matters to models that use it.
+        """
+        shared = np.zeros((len(rows), self.n_slots + 1), dtype=np.float64)
+        for field, slot in self.numeric:
+            shared[:, slot] = [row.get(field) for row in rows] # None -> NaN
+        for field, table in self.categorical.items():
+            for i, row in enumerate(rows):
+                slot = table.get(row.get(field))
+                if slot is not None:
+                    shared[i, slot] = 1.0
+        return {name: shared[:, self.gathers[name]] for name in (self.gathers if names is None else names)}
@@ -0,0 +1,216 @@
+# fleet.py
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+import argparse
+import os
+import sqlite3
+import time
+import joblib
+import aws_utils # Our S3 script
+import etl # Our ETL script
+import storage # For the model file digest
+from forest_engine import CompiledForest
+
+# --- Configuration ---
+LOCAL_DATA_FOLDER = etl.LOCAL_DATA_FOLDER
+LOCAL_MODEL_FOLDER = "models"
+FORECAST_DB = os.environ.get("SMART_CITY_FORECAST_DB", os.path.join("forecasts", "forecasts.sqlite"))
+CHUNK_ROWS = 50_000 # Rows per predict call (and per task on the process pool)
+KEEP_RUNS = 7 # Older runs are deleted after each new one
+# Same switch as app.py, so stored forecasts come from the model /predict serves
+SERVE_COMPACT_MODELS = os.environ.get("SMART_CITY_COMPACT_MODELS", "1") == "1"
+# What to forecast per domain: from each entity's last `rows` readings, `ahead` after each of them.
+# The energy model forecasts 24 h ahead, so the last 24 hourly readings give the next 24 hours.
+FLEET_JOBS = {
+    "traffic": {"model": "traffic_model", "rows": 1, "ahead": pd.Timedelta(hours=1)},
+    "energy": {"model": "energy_model", "rows": 24, "ahead": pd.Timedelta(hours=24)},
+    "waste": {"model": "waste_model", "rows": 1, "ahead": pd.Timedelta(days=1)},
+    "pollution": {"model": "pollution_model", "rows": 1, "ahead": pd.Timedelta(hours=1)},
+    "emergency": {"model": "emergency_model", "rows": 1, "ahead": pd.Timedelta(hours=1)},
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, started_at TEXT, finished_at TEXT, rows INTEGER);
+CREATE TABLE IF NOT EXISTS forecasts (run_id INTEGER, domain TEXT, entity_id TEXT, as_of TEXT,
+                                      target_time TEXT, value REAL, model_version TEXT);
+CREATE INDEX IF NOT EXISTS forecasts_by_entity ON forecasts (domain, run_id, entity_id, target_time);
+CREATE INDEX IF NOT EXISTS forecasts_by_time ON forecasts (domain, run_id, target_time);
+"""
+
+# --- Scoring (runs in the pool's worker processes) ---
+_models = {} # model file -> loaded model, per process
+
+def model_path(model_name):
+    """The file the API serves for a model, by app.load_forest's rule.
+
+    That is its compact copy if it was made from the current .joblib (or there
+    is no .joblib), else the .joblib.
+    """
+    path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}.joblib")
+    compact = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_compact.npz")
+    if SERVE_COMPACT_MODELS and os.path.exists(compact):
+        if (not os.path.exists(path) or storage.file_digest(path)
+                == CompiledForest.load(compact, mmap_mode="r").metadata.get("source_digest")):
+            return compact
+    return path
+
+def load_model(path):
+    if path not in _models:
+        _models[path] = (CompiledForest.load(path, mmap_mode="r") if path.endswith(".npz")
+                         else joblib.load(path, mmap_mode="r"))
+    return _models[path]
+
+def score_chunk(path, X):
+    """Predictions for one chunk: class-1 probabilities for classifiers."""
+    model = load_model(path)
+    is_classifier = getattr(model, "classes_", getattr(model, "classes", None)) is not None
+    return model.predict_proba(X)[:, 1] if is_classifier else model.predict(X)
+
+# --- Fleet Forecast ---
+def prepare_domain(domain):
+    """(model input X, forecast frame without values) for every entity of a domain."""
+    job = FLEET_JOBS[domain]
+    latest = etl.prepare_latest(domain, job["rows"])
+    if latest.empty:
+        return None, latest
+    feature_columns = joblib.load(os.path.join(LOCAL_MODEL_FOLDER, f"{job['model']}_features.joblib"))
+    X = latest.drop(columns=['entity_id', 'timestamp']).reindex(columns=feature_columns, fill_value=0)
+    forecasts = pd.DataFrame({"domain": domain, "entity_id": latest['entity_id'],
+                              "as_of": latest['timestamp'], "target_time": latest['timestamp'] + job["ahead"]})
+    return X.astype(np.float32), forecasts
+
+def forecast_all(domains=None, workers=None, chunk_rows=CHUNK_ROWS):
+    """Forecasts every entity of each domain.
+
+    Returns one frame of forecasts, per-domain ETL seconds and row counts, and
+    the seconds spent scoring (all domains together, model loads included).
+
+    Each domain's rows are scored in chunks of chunk_rows. With more than one
+    chunk in total and workers > 1, chunks run on a pool of worker processes
+    (each loads a model once); otherwise in this process.
+    """
+    domains = domains or list(FLEET_JOBS)
+    workers = workers or os.cpu_count() or 1
+    prepared, timings = {}, {}
+    for domain in domains:
+        start = time.perf_counter()
+        try:
+            prepared[domain] = prepare_domain(domain)
+        except Exception as e:
+            print(f"Error preparing {domain}: {e}")
+            continue
+        timings[domain] = {"etl": time.perf_counter() - start}
+        if prepared[domain][0] is None:
+            print(f"Skipping {domain}: no data.")
+            del prepared[domain]
+
+    paths = {domain: model_path(FLEET_JOBS[domain]["model"]) for domain in prepared}
+    tasks = [(domain, paths[domain], X.iloc[i:i + chunk_rows])
+             for domain, (X, _) in prepared.items() for i in range(0, len(X), chunk_rows)]
+    start = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            futures = [pool.submit(score_chunk, path, X) for _, path, X in tasks]
+            results = [future.result() for future in futures]
+    else:
+        results = [score_chunk(path, X) for _, path, X in tasks]
+    score_seconds = time.perf_counter() - start
+
+    frames = []
+    for domain, (X, forecasts) in prepared.items():
+        forecasts["value"] = np.concatenate([values for (task_domain, _, _), values in zip(tasks, results)
+                                             if task_domain == domain])
+        forecasts["model_version"] = storage.file_digest(paths[domain])[:12]
+        timings[domain]["rows"] = len(X)
+        frames.append(forecasts)
+    return (pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()), timings, score_seconds
+
+# --- Forecast Store (SQLite) ---
+def connect(db_path=FORECAST_DB, read_only=False):
+    if read_only:
+        return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL") # Readers (the API) keep the previous run while a new one is written
+    conn.executescript(SCHEMA)
+    return conn
+
+def write_forecasts(forecasts, started_at, db_path=FORECAST_DB, keep_runs=KEEP_RUNS):
+    """Stores one run's forecasts in a single transaction and deletes runs beyond the last keep_runs."""
+    rows = zip(forecasts["domain"], forecasts["entity_id"],
+               forecasts["as_of"].dt.strftime("%Y-%m-%dT%H:%M:%S"),
+               forecasts["target_time"].dt.strftime("%Y-%m-%dT%H:%M:%S"),
+               forecasts["value"].astype(float), forecasts["model_version"])
+    with closing(connect(db_path)) as conn, conn:
+        run_id = conn.execute("INSERT INTO runs (started_at, finished_at, rows) VALUES (?, ?, ?)",
+                              (started_at, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                               len(forecasts))).lastrowid
+        conn.executemany("INSERT INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         ((run_id, *row) for row in rows))
+        old = "SELECT run_id FROM runs ORDER BY run_id DESC LIMIT -1 OFFSET ?"
+        conn.execute(f"DELETE FROM forecasts WHERE run_id IN ({old})", (keep_runs,))
+        conn.execute(f"DELETE FROM runs WHERE run_id IN ({old})", (keep_runs,))
+    return run_id
+
+def read_forecasts(domain, entity_id=None, start=None, end=None, db_path=FORECAST_DB):
+    """(run info, forecast rows) of the latest run that forecast `domain`, or None if there is none.
+
+    Rows are (entity_id, as_of, target_time, value), optionally for one entity
+    and target times in [start, end]; both lookups are index range scans.
+    """
+    if not os.path.exists(db_path):
+        return None
+    with closing(connect(db_path, read_only=True)) as conn:
+        run_id = conn.execute("SELECT MAX(run_id) FROM forecasts WHERE domain = ?", (domain,)).fetchone()[0]
+        if run_id is None:
+            return None
+        run = conn.execute("SELECT run_id, started_at, finished_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        query = "SELECT entity_id, as_of, target_time, value FROM forecasts WHERE domain = ? AND run_id = ?"
+        params = [domain, run_id]
+        if entity_id is not None:
+            query += " AND entity_id = ?"
+            params.append(entity_id)
+        if start is not None:
+            query += " AND target_time >= ?"
+            params.append(start.strftime("%Y-%m-%dT%H:%M:%S"))
+        if end is not None:
+            query += " AND target_time <= ?"
+            params.append(end.strftime("%Y-%m-%dT%H:%M:%S"))
+        query += " ORDER BY entity_id, target_time" if entity_id is None else " ORDER BY target_time"
+        rows = conn.execute(query, params).fetchall()
+    return {"run_id": run[0], "started_at": run[1], "finished_at": run[2]}, rows
+
+def print_summary(timings, score_seconds, wall_clock):
+    print("\n--- Fleet Forecast Summary ---")
+    print(f"{'domain':<12}{'rows':>10}{'etl s':>9}")
+    for domain, t in timings.items():
+        if "rows" in t:
+            print(f"{domain:<12}{t['rows']:>10}{t['etl']:9.2f}")
+    rows = sum(t.get("rows", 0) for t in timings.values())
+    print(f"Scoring: {rows} rows in {score_seconds:.2f}s. Wall clock: {wall_clock:.2f}s")
+
+# --- Main Executor ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast every entity of every domain and store the results.")
+    parser.add_argument("--domains", nargs="+", choices=list(FLEET_JOBS), default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: one per core).")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows per predict call.")
+    parser.add_argument("--db", default=FORECAST_DB, help="SQLite file to write the forecasts to.")
+    parser.add_argument("--keep-runs", type=int, default=KEEP_RUNS, help="Runs to keep in the database.")
+    parser.add_argument("--offline", action="store_true", help="Use data/ and models/ as they are, no S3 sync.")
+    args = parser.parse_args()
+
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    start = time.perf_counter()
+    if not args.offline:
+        aws_utils.download_from_s3(LOCAL_DATA_FOLDER, aws_utils.DATA_BUCKET)
+        aws_utils.download_from_s3(LOCAL_MODEL_FOLDER, aws_utils.MODEL_BUCKET)
+
+    forecasts, timings, score_seconds = forecast_all(args.domains, args.workers, args.chunk_rows)
+    if forecasts.empty:
+        print("\nNo forecasts were made, nothing written.")
+    else:
+        run_id = write_forecasts(forecasts, started_at, args.db, args.keep_runs)
+        print(f"\nRun {run_id}: {len(forecasts)} forecasts written to {args.db}")
+    print_summary(timings, score_seconds, time.perf_counter() - start)
@@ -0,0 +1,191 @@
+# forest_engine.py
+import io
+import json
+import mmap
+import struct
+import zipfile
+import numpy as np
+
+NPY_ALIGN = 64 # Array data in saved files starts on this boundary, so mapped arrays are aligned
+ZIP_PADDING_ID = 0xD935 # Extra field id used to pad a zip member's local header (as zipalign does)
+
+def map_npz(path):
+    """{name: read-only array} viewing an uncompressed .npz mapped into memory.
+
+    np.load ignores mmap_mode for archives. Arrays that are 0-d, empty or not
+    aligned for their dtype (files not written by CompiledForest.save) are
+    left out for the caller to read normally.
+    """
+    arrays = {}
+    with open(path, "rb") as f, zipfile.ZipFile(f) as archive:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) # Outlives f; the arrays keep it open
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED or not info.filename.endswith(".npy"):
+                continue
+            f.seek(info.header_offset + 26) # Local file header: name and extra field lengths
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            read_header = {(1, 0): np.lib.format.read_array_header_1_0,
+                           (2, 0): np.lib.format.read_array_header_2_0}.get(np.lib.format.read_magic(f))
+            if read_header is None:
+                continue
+            shape, fortran_order, dtype = read_header(f)
+            offset = f.tell()
+            if not shape or 0 in shape or dtype.hasobject or offset % dtype.alignment:
+                continue
+            array = np.frombuffer(mapped, dtype, int(np.prod(shape)), offset)
+            arrays[info.filename[:-len(".npy")]] = array.reshape(shape, order="F" if fortran_order else "C")
+    return arrays
+
+class CompiledForest:
+    """A trained sklearn random forest flattened into plain NumPy arrays.
+
+    All trees' nodes live in one set of arrays (feature, threshold, children,
+    value), with each tree's root at roots[t] and node i's left/right child at
+    children[2*i] / children[2*i + 1], and a NaN input at node i going left
+    when missing_left[i] is set, as sklearn routes it. Leaves point to themselves, so
+    predicting is max_depth rounds of one vectorized step that moves every
+    (row, tree) pair to its next node. That avoids sklearn's per-call input
+    validation and joblib dispatch over the trees, which dominate small batches.
+    """
+
+    def __init__(self, roots, feature, threshold, children, value, max_depth, classes=None, n_features_in=None,
+                 metadata=None, missing_left=None):
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value # (n_nodes, n_outputs): regression value(s) or class probabilities
+        self.max_depth = max_depth
+        self.classes = classes # None for regressors
+        self.n_features_in_ = n_features_in # Same name as sklearn's, so callers can treat both alike
+        self.metadata = metadata or {} # Free-form, stored by save()
+        self.missing_left = missing_left # None (files saved before it was stored): NaN always goes left
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compiles a fitted RandomForestRegressor (single- or multi-output) / RandomForestClassifier."""
+        is_classifier = hasattr(model, "classes_")
+        if is_classifier and getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output classifiers can be compiled.")
+        roots, features, thresholds, lefts, rights, values, missing_lefts = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(offset, offset + n_nodes)
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            rights.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            # Set per split while fitting: the side that scored better with the NaN rows, or the
+            # side with more rows if the feature had none
+            missing_lefts.append(tree.missing_go_to_left.astype(bool))
+            # Regressors: (n_nodes, n_outputs, 1), classifiers: (n_nodes, 1, n_classes)
+            value = (tree.value[:, 0, :] if is_classifier else tree.value[:, :, 0]).astype(np.float64)
+            if is_classifier: # Same normalization DecisionTreeClassifier.predict_proba applies
+                totals = value.sum(axis=1, keepdims=True)
+                value = value / np.where(totals == 0, 1, totals)
+            values.append(value)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+        children = np.stack([np.concatenate(lefts), np.concatenate(rights)], axis=1).ravel()
+        return cls(np.array(roots, dtype=np.int32), np.concatenate(features).astype(np.int32),
+                   np.concatenate(thresholds), children.astype(np.int32),
+                   np.concatenate(values), max_depth,
+                   np.asarray(model.classes_) if is_classifier else None, getattr(model, "n_features_in_", None),
+                   missing_left=np.concatenate(missing_lefts))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        arrays = (self.roots, self.feature, self.threshold, self.children, self.value, self.missing_left)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def to_float32(self):
+        """Copy with float32 thresholds and values and int16 feature indices (when they fit).
+
+        Thresholds are rounded down to the nearest float32. Inputs are compared
+        as float32, so every row still goes down the same side of every split;
+        only the leaf values lose precision (about 7 significant digits kept).
+        """
+        threshold = self.threshold.astype(np.float32)
+        rounded_up = threshold > self.threshold
+        threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+        feature = self.feature.astype(np.int16) if self.feature.max(initial=0) < 2**15 else self.feature
+        return CompiledForest(self.roots, feature, threshold, self.children, self.value.astype(np.float32),
+                              self.max_depth, self.classes, self.n_features_in_, dict(self.metadata),
+                              self.missing_left)
+
+    def save(self, path):
+        """Writes the arrays plus metadata to one uncompressed .npz that load(mmap_mode="r") can map.
+
+        Each member's local header is padded so its array data starts on an
+        NPY_ALIGN boundary (.npy headers are themselves padded to 64 bytes).
+        """
+        arrays = {"roots": self.roots, "feature": self.feature, "threshold": self.threshold,
+                  "children": self.children, "value": self.value, "max_depth": np.array(self.max_depth),
+                  "metadata": np.array(json.dumps({**self.metadata, "n_features_in": self.n_features_in_}))}
+        if self.classes is not None:
+            arrays["classes"] = self.classes
+        if self.missing_left is not None:
+            arrays["missing_left"] = self.missing_left
+        with open(path, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as archive:
+            for name, array in arrays.items():
+                npy = io.BytesIO()
+                np.lib.format.write_array(npy, array, allow_pickle=False)
+                info = zipfile.ZipInfo(f"{name}.npy")
+                padding = -(f.tell() + 30 + len(info.filename) + 4) % NPY_ALIGN
+                info.extra = struct.pack("<HH", ZIP_PADDING_ID, padding) + bytes(padding)
+                archive.writestr(info, npy.getvalue())
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Reads a forest written by save().
+
+        With mmap_mode="r" the node arrays are read-only views of the file
+        mapped into memory instead of copies: nothing is read up front, and
+        every process serving the same file shares its pages in the page cache.
+        """
+        if mmap_mode not in (None, "r"):
+            raise ValueError(f"CompiledForest files can only be mapped read-only, not '{mmap_mode}'")
+        arrays = map_npz(path) if mmap_mode else {}
+        with np.load(path, allow_pickle=False) as data:
+            arrays.update({name: data[name] for name in data.files if name not in arrays})
+        metadata = json.loads(str(arrays["metadata"]))
+        return cls(arrays["roots"], arrays["feature"], arrays["threshold"], arrays["children"], arrays["value"],
+                   int(arrays["max_depth"]), arrays.get("classes"), metadata.pop("n_features_in"), metadata,
+                   arrays.get("missing_left"))
+
+    def _leaf_values(self, X):
+        """Mean over trees of the leaf values each row lands in, shape (n_rows, n_outputs)."""
+        # sklearn compares float32 inputs against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        route_nan = self.missing_left is not None and np.isnan(flat).any() # Skip the extra lookup otherwise
+        for _ in range(self.max_depth):
+            x = flat[row_offsets + self.feature[nodes]]
+            right = x > self.threshold[nodes] # False for NaN
+            if route_nan:
+                right |= np.isnan(x) & ~self.missing_left[nodes]
+            nodes = self.children[2 * nodes + right]
+        return self.value[nodes].mean(axis=1, dtype=np.float64) # float64 even for float32 leaf values
+
+    def predict(self, X):
+        if self.classes is None:
+            values = self._leaf_values(X)
+            return values[:, 0] if values.shape[1] == 1 else values # Same shapes as sklearn
+        return self.classes[np.argmax(self._leaf_values(X), axis=1)]
+
+    def predict_proba(self, X):
+        if self.classes is None:
+            raise AttributeError("predict_proba is only available for classifiers.")
+        return self._leaf_values(X)
@@ -0,0 +1,111 @@
+# inference_executor.py
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import metrics # Prometheus-style timers and counters
+
+class ExecutorBusy(Exception):
+    """Raised instead of queueing when the executor already holds max_pending calls."""
+
+def _recorded_call(fn, *args):
+    """fn(*args) in a worker process, returned with the metrics it observed there."""
+    with metrics.recording() as observations:
+        result = fn(*args)
+    return result, observations
+
+class InferenceExecutor:
+    """Runs model calls off the event loop on a dedicated, bounded pool.
+
+    kind="thread" suits the NumPy/sklearn paths, which release the GIL for
+    most of their work; kind="process" sidesteps the GIL entirely, with each
+    worker forked from a process that already has the models loaded.
+    At most max_pending calls are queued or running; past that, submit()
+    fails fast with ExecutorBusy so the API can shed load instead of letting
+    every request's latency grow. Metrics observed in a process worker (stage
+    timings) are sent back with each result and recorded in this process.
+    """
+
+    def __init__(self, kind="thread", workers=None, max_pending=None, initializer=None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind '{kind}', expected 'thread' or 'process'.")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 16 * self.workers
+        self.initializer = initializer
+        self._pool = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _new_pool(self):
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference",
+                                      initializer=self.initializer)
+        # fork keeps the parent's loaded models (compact ones stay memory-mapped, sharing
+        # their pages); elsewhere the initializer has to load them in each worker
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                   mp_context=multiprocessing.get_context(method))
+
+    def start(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._new_pool()
+
+    def restart(self):
+        """Replaces the pool; calls already running finish on the old one.
+
+        Process workers hold a copy of the models from when they were forked,
+        so the API restarts a process pool after swapping in a new version.
+        """
+        with self._lock:
+            if self._pool is None: # Not started yet, the next start() forks fresh workers anyway
+                return
+            old, self._pool = self._pool, self._new_pool()
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            old, self._pool = self._pool, None
+        if old is not None:
+            old.shutdown(wait=True)
+
+    async def submit(self, fn, *args):
+        """Awaits fn(*args) on the pool; raises ExecutorBusy if max_pending is reached."""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.pending} inference calls already pending")
+            self.pending += 1
+            self.submitted += 1
+            if self._pool is None:
+                self._pool = self._new_pool()
+            pool = self._pool
+        try:
+            if self.kind == "process":
+                result, observations = await asyncio.get_running_loop().run_in_executor(
+                    pool, _recorded_call, fn, *args)
+                metrics.replay(observations)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"kind": self.kind, "workers": self.workers, "max_pending": self.max_pending,
+                    "pending": self.pending, "submitted": self.submitted, "completed": self.completed,
+                    "failed": self.failed, "rejected": self.rejected}
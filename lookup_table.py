@@ -0,0 +1,53 @@
+# lookup_table.py
+import numpy as np
+
+class LookupTable:
+    """Precomputed predictions for every point of a discrete input grid.
+
+    Written by train.py --materialize as <model>_table.npz: a dense `values`
+    array with one axis per input field, plus the grid values of each axis.
+    Serving a row is a dict lookup per field and one array index; rows that
+    fall outside the grid are reported so the caller can use the real model.
+    """
+
+    def __init__(self, fields, axes, values):
+        self.fields = list(fields)
+        self.axes = [{value: i for i, value in enumerate(axis)} for axis in axes]
+        self.values = values.ravel()
+        self.shape = values.shape
+        self.strides = [int(np.prod(self.shape[i + 1:])) for i in range(len(self.shape))]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            fields = data["fields"].tolist()
+            axes = [data[f"axis_{field}"].tolist() for field in fields]
+            return cls(fields, axes, data["values"])
+
+    def lookup(self, rows):
+        """Returns (predictions, in_grid) for a list of input dicts.
+
+        predictions is only meaningful where the in_grid mask is True.
+        """
+        predictions = np.zeros(len(rows), dtype=np.float64)
+        in_grid = np.zeros(len(rows), dtype=bool)
+        for i, row in enumerate(rows):
+            flat = 0
+            for field, axis, stride in zip(self.fields, self.axes, self.strides):
+                pos = axis.get(row[field])
+                if pos is None:
+                    break
+                flat += pos * stride
+            else:
+                predictions[i] = self.values[flat]
+                in_grid[i] = True
+        return predictions, in_grid
+
+    def sample_rows(self, n=16):
+        """A spread of grid points (as input dicts) with their stored predictions."""
+        flat_idx = np.unique(np.linspace(0, self.values.size - 1, n).astype(int))
+        inverse_axes = [list(axis) for axis in self.axes]
+        rows = []
+        for positions in zip(*np.unravel_index(flat_idx, self.shape)):
+            rows.append({field: axis[pos] for field, axis, pos in zip(self.fields, inverse_axes, positions)})
+        return rows, self.values[flat_idx]
@@ -0,0 +1,176 @@
+# metrics.py
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# Set SMART_CITY_METRICS=0 to turn every timer into a no-op (checked on each call)
+ENABLED = os.environ.get("SMART_CITY_METRICS", "1") == "1"
+# Upper bounds (seconds) of the latency histogram buckets, 100 us to 30 s
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+REGISTRY = [] # Every metric created below, in creation order
+
+_NULL_TIMER = nullcontext()
+class _Recording(threading.local):
+    log = None # Observations held back by recording() in this thread (a class default: no AttributeError)
+
+_recording = _Recording()
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    return repr(float(value))
+
+class Counter:
+    """Monotonic counter, one series per label combination."""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *label_values, amount=1):
+        if not ENABLED:
+            return
+        log = _recording.log
+        if log is not None:
+            log.append((self.name, label_values, amount))
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {_number(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (seconds by default), per label combination."""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self.buckets = list(buckets)
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        if not ENABLED:
+            return
+        log = _recording.log
+        if log is not None:
+            log.append((self.name, label_values, value))
+            return
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            i = bisect_left(self.buckets, value) # First bucket with value <= bound
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *label_values):
+        """Context manager observing the seconds its block took (a shared no-op when disabled)."""
+        if not ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, label_values, le)} {cumulative}")
+                # Observations above the last bound only show up here
+                inf = _label_text(self.labels, label_values, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+                labels = _label_text(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram, label_values):
+        self.histogram, self.label_values = histogram, label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+@contextmanager
+def recording():
+    """Collects this thread's observations into a list instead of recording them.
+
+    For work done in another process (e.g. the API's process executor), whose
+    metrics would otherwise never reach the /metrics of the process serving
+    them: send the list back and pass it to replay() there.
+    """
+    log = _recording.log = []
+    try:
+        yield log
+    finally:
+        _recording.log = None
+
+def replay(observations):
+    """Records observations collected by recording() in this process's metrics."""
+    by_name = {metric.name: metric for metric in REGISTRY}
+    for name, label_values, value in observations:
+        metric = by_name[name]
+        if isinstance(metric, Counter):
+            metric.inc(*label_values, amount=value)
+        else:
+            metric.observe(value, *label_values)
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path):
+    """Writes render() to path atomically (for node_exporter's textfile collector)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+# --- Metrics shared by the API and the training pipeline ---
+API_REQUEST_SECONDS = Histogram("smart_city_api_request_seconds", "HTTP request latency by route",
+                                ["method", "route", "status"])
+API_STAGE_SECONDS = Histogram("smart_city_api_stage_seconds",
+                              "Time spent per request stage (validate, encode, prepare_features, inference, "
+                              "serialize)", ["domain", "stage"])
+TRAINING_PHASE_SECONDS = Histogram("smart_city_training_phase_seconds",
+                                   "Training pipeline time per model and phase (etl, fit, eval, save)",
+                                   ["model", "phase"], buckets=LATENCY_BUCKETS + [60.0, 300.0, 900.0, 3600.0])
+ETL_SECONDS = Histogram("smart_city_etl_seconds", "Run time of each prepare_*/stream_* ETL function",
+                        ["function"], buckets=LATENCY_BUCKETS + [60.0, 300.0, 900.0])
+S3_TRANSFER_SECONDS = Histogram("smart_city_s3_transfer_seconds", "Per-file S3 transfer time",
+                                ["direction", "bucket"], buckets=LATENCY_BUCKETS + [60.0, 300.0])
+S3_TRANSFER_BYTES = Counter("smart_city_s3_transferred_bytes_total", "Bytes moved to or from S3",
+                            ["direction", "bucket"])
+S3_TRANSFER_FAILURES = Counter("smart_city_s3_transfer_failures_total", "Failed S3 file transfers",
+                               ["direction", "bucket"])
+SENSOR_EVENTS = Counter("smart_city_sensor_events_total",
+                        "Ingested sensor events by outcome (accepted, stale, rejected, invalid)", ["domain", "outcome"])
@@ -0,0 +1,83 @@
+# micro_batcher.py
+import asyncio
+import threading
+
+# Upper bounds of the batch-size histogram buckets (the last bucket is open-ended)
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests for one model into one call.
+
+    While a batch for the model is already running, new rows wait up to
+    max_wait_ms (or until max_batch rows have arrived), then score_rows(rows)
+    runs once over all of them and each caller gets its own value back. A row
+    arriving when the model is idle is sent at once, so a lone request never
+    pays the wait. score_rows is an async
+    callable returning one prediction per row, in order. All methods except
+    stats() must be called from the event loop.
+    """
+
+    def __init__(self, score_rows, max_batch=64, max_wait_ms=2.0):
+        self.score_rows = score_rows
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending = [] # (row, future) of the batch being collected
+        self._timer = None
+        self._running = set() # Strong refs to in-flight batch tasks (the loop only keeps weak ones)
+        self._lock = threading.Lock() # Only guards the counters read by stats()
+        self.batches = 0
+        self.rows = 0
+        self.flushes = {"idle": 0, "full": 0, "timeout": 0} # Why each batch was sent
+        self.histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    async def submit(self, row):
+        """Queues one row into the open batch and returns its prediction."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush("full")
+        elif not self._running:
+            self._flush("idle")
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self, reason="timeout"):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._record(len(batch), reason)
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        try:
+            values = await self.score_rows([row for row, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), value in zip(batch, values):
+            if not future.done(): # The caller may have been cancelled (client went away)
+                future.set_result(value)
+
+    def _record(self, size, reason):
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound), len(BATCH_SIZE_BUCKETS))
+        with self._lock:
+            self.batches += 1
+            self.rows += size
+            self.flushes[reason] += 1
+            self.histogram[bucket] += 1
+
+    def stats(self):
+        with self._lock:
+            labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+            return {"max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000,
+                    "batches": self.batches, "rows": self.rows, "flushes": dict(self.flushes),
+                    "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                    "batch_size_histogram": dict(zip(labels, self.histogram))}
@@ -0,0 +1,69 @@
+# prediction_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+class PredictionCache:
+    """Bounded LRU cache with a per-entry TTL for one model's predictions.
+
+    Keys are tuples of validated input values, values are the raw model
+    outputs. Safe to share between FastAPI's worker threads.
+    """
+
+    def __init__(self, max_size=4096, ttl_seconds=300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0 # Model swaps that replaced this model's cache (see successor)
+
+    def get(self, key):
+        """Returns (True, value) on a fresh hit, (False, None) otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def successor(self):
+        """An empty cache with the same settings that replaces this one after a model swap.
+
+        Replacing rather than clearing keeps requests still finishing on the old
+        model from writing its results into the new cache. The invalidation
+        count carries over, plus one; this cache's entries are dropped.
+        """
+        cache = PredictionCache(self.max_size, self.ttl_seconds)
+        with self._lock:
+            self._entries.clear()
+            cache.invalidations = self.invalidations + 1
+        return cache
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries), "max_size": self.max_size, "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions, "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
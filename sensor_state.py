@@ -0,0 +1,204 @@
+# sensor_state.py
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+DAY_SECONDS = 86_400
+EPOCH_WEEKDAY = 3 # 1970-01-01 was a Thursday (Monday = 0, like pandas' dayofweek)
+NEVER = np.iinfo(np.int64).min # _last_empty of a bin that hasn't been seen near empty yet
+MAX_LEVELS = np.iinfo(np.int16).max + 1 # Distinct values per categorical field (codes are int16)
+
+def epoch_seconds(timestamp):
+    """Seconds since 1970; aware timestamps are converted to UTC first, naive ones taken as UTC."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // ONE_SECOND
+
+def to_datetime(seconds):
+    return EPOCH + timedelta(seconds=int(seconds))
+
+class SensorState:
+    """Rolling state of one sensor stream, one row of preallocated NumPy arrays per entity.
+
+    An entity (road segment, bin, grid feeder, station) keeps a ring buffer of
+    its last `window` readings and their timestamps, a running sum for the
+    rolling mean, its latest categorical/numeric fields and, with empty_below,
+    when it last read below that level (days_since_collection, as etl.py
+    derives it). Each event is O(1): a dict lookup for the entity's row and a
+    few scalar writes. Rows are added as entities appear, up to max_entities;
+    the arrays double in size when full. Events older than an entity's latest
+    are dropped as stale, and events that would add a categorical value past
+    MAX_LEVELS are rejected. Safe to share between threads.
+    """
+
+    def __init__(self, entity_field, value_field, categorical=(), numeric=(), empty_below=None,
+                 window=24, max_entities=100_000, capacity=1024):
+        self.entity_field, self.value_field = entity_field, value_field
+        self.categorical, self.numeric = list(categorical), list(numeric)
+        self.empty_below = empty_below
+        self.window, self.max_entities = window, max_entities
+        self._index = {} # entity id -> row
+        self._ids = [] # row -> entity id
+        self._levels = [{} for _ in self.categorical] # Per categorical field: value -> code
+        self._level_names = [[] for _ in self.categorical] # ...and code -> value
+        self._lock = threading.Lock()
+        self.events = self.stale = self.rejected = 0
+        self._allocate(min(capacity, max_entities))
+
+    def _allocate(self, capacity):
+        """(Re)allocates every array for `capacity` entities, keeping the existing rows."""
+        old = getattr(self, "_arrays", None)
+        arrays = {
+            "values": np.zeros((capacity, self.window), dtype=np.float32),
+            "times": np.zeros((capacity, self.window), dtype=np.int64),
+            "head": np.zeros(capacity, dtype=np.int32), # Next slot to write
+            "count": np.zeros(capacity, dtype=np.int32), # Readings in the buffer (<= window)
+            "total": np.zeros(capacity, dtype=np.float64), # Sum of the buffered readings
+            "last_time": np.zeros(capacity, dtype=np.int64),
+            "last_empty": np.full(capacity, NEVER, dtype=np.int64),
+            "codes": np.zeros((capacity, len(self.categorical)), dtype=np.int16),
+            "numeric": np.zeros((capacity, len(self.numeric)), dtype=np.float64),
+        }
+        if old is not None:
+            for name, array in arrays.items():
+                array[:len(old[name])] = old[name]
+        self._arrays = arrays
+        for name, array in arrays.items(): # Attribute access is faster than a dict lookup per event
+            setattr(self, f"_{name}", array)
+
+    @property
+    def capacity(self):
+        return len(self._head)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, entity_id):
+        return entity_id in self._index
+
+    def ingest(self, events):
+        """Applies validated event dicts in order; returns {"accepted", "stale", "rejected"} counts."""
+        accepted = stale = rejected = 0
+        with self._lock:
+            for event in events:
+                outcome = self._update(event)
+                if outcome == 0:
+                    accepted += 1
+                elif outcome == 1:
+                    stale += 1
+                else:
+                    rejected += 1
+            self.events += accepted
+            self.stale += stale
+            self.rejected += rejected
+        return {"accepted": accepted, "stale": stale, "rejected": rejected}
+
+    def _update(self, event):
+        """One event: 0 = applied, 1 = stale, 2 = rejected (no room for a new entity or categorical value)."""
+        entity_id = event[self.entity_field]
+        ts = epoch_seconds(event["timestamp"])
+        row = self._index.get(entity_id)
+        if row is None:
+            if len(self._ids) >= self.max_entities:
+                return 2
+        elif ts < self._last_time[row]:
+            return 1
+        codes = [self._code(i, event[field]) for i, field in enumerate(self.categorical)]
+        if None in codes:
+            return 2
+        if row is None:
+            row = self._add(entity_id)
+
+        value = event[self.value_field]
+        pos = int(self._head[row])
+        if self._count[row] == self.window:
+            self._total[row] -= self._values[row, pos] # Oldest reading leaves the window
+        else:
+            self._count[row] += 1
+        self._values[row, pos] = value
+        self._times[row, pos] = ts
+        self._total[row] += self._values[row, pos] # As stored (float32), so removing it later cancels exactly
+        self._head[row] = pos + 1 if pos + 1 < self.window else 0
+        self._last_time[row] = ts
+        if self.empty_below is not None and value < self.empty_below:
+            self._last_empty[row] = ts
+        for i, code in enumerate(codes):
+            self._codes[row, i] = code
+        for i, field in enumerate(self.numeric):
+            self._numeric[row, i] = event[field]
+        return 0
+
+    def _add(self, entity_id):
+        row = len(self._ids)
+        if row == self.capacity:
+            self._allocate(min(2 * self.capacity, self.max_entities))
+        self._index[entity_id] = row
+        self._ids.append(entity_id)
+        return row
+
+    def _code(self, i, value):
+        """Code of a categorical value, added if new; None once the field has MAX_LEVELS values."""
+        code = self._levels[i].get(value)
+        if code is None:
+            if len(self._level_names[i]) == MAX_LEVELS:
+                return None
+            code = self._levels[i][value] = len(self._level_names[i])
+            self._level_names[i].append(value)
+        return code
+
+    def features(self, entity_id):
+        """Model input of one entity from its latest state: the fields the /predict endpoints take.
+
+        hour and day_of_week come from the latest timestamp; waste bins also
+        get days_since_collection. Raises KeyError for an unknown entity.
+        """
+        with self._lock:
+            return self._features(self._index[entity_id])
+
+    def _features(self, row):
+        ts = int(self._last_time[row])
+        latest = self._values[row, (int(self._head[row]) - 1) % self.window]
+        features = {"hour": ts // 3600 % 24, "day_of_week": (ts // DAY_SECONDS + EPOCH_WEEKDAY) % 7,
+                    self.value_field: float(latest)}
+        for i, field in enumerate(self.categorical):
+            features[field] = self._level_names[i][self._codes[row, i]]
+        for i, field in enumerate(self.numeric):
+            features[field] = float(self._numeric[row, i])
+        if self.empty_below is not None:
+            last_empty = int(self._last_empty[row])
+            features["days_since_collection"] = 0 if last_empty == NEVER else (ts - last_empty) // DAY_SECONDS
+        return features
+
+    def feature_rows(self, entity_ids=None):
+        """(entity ids, feature dicts) of the given entities (default all), skipping unknown ids."""
+        with self._lock:
+            if entity_ids is None:
+                entity_ids = list(self._ids)
+            else:
+                entity_ids = [entity_id for entity_id in entity_ids if entity_id in self._index]
+            return entity_ids, [self._features(self._index[entity_id]) for entity_id in entity_ids]
+
+    def state(self, entity_id):
+        """Features plus the rolling window (oldest first) of one entity."""
+        with self._lock:
+            row = self._index[entity_id]
+            count, head = int(self._count[row]), int(self._head[row])
+            slots = [(head - count + i) % self.window for i in range(count)]
+            return {"features": self._features(row), "readings": count,
+                    "rolling_mean": float(self._total[row] / count),
+                    "last_seen": to_datetime(self._last_time[row]).isoformat(),
+                    "window": [{"timestamp": to_datetime(self._times[row, slot]).isoformat(),
+                                self.value_field: float(self._values[row, slot])} for slot in slots]}
+
+    def stats(self):
+        with self._lock:
+            return {"entities": len(self._ids), "capacity": self.capacity, "max_entities": self.max_entities,
+                    "window": self.window, "events": self.events, "stale": self.stale,
+                    "rejected": self.rejected, "array_bytes": self.nbytes,
+                    "bytes_per_entity": round(self.nbytes / self.capacity, 1)}
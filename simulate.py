@@ -1,138 +1,159 @@
 # simulate.py
 import pandas as pd
 import numpy as np
-import random
 from faker import Faker
-from datetime import datetime, timedelta
+from datetime import datetime
+import argparse
 import os
 import aws_utils # Our S3 script
+import storage # Parquet/CSV dataset files
 
 # --- Configuration ---
 NUM_RECORDS = 5000
 START_DATE = datetime(2025, 1, 1)
+SEED = 42 # Default seed for each generator's np.random.Generator
+WEATHERS = np.array(["Clear", "Rain", "Fog"])
+BIN_TYPES = np.array(["Landfill", "Recycling"])
 LOCAL_DATA_FOLDER = "data"
+DATA_FORMAT = storage.DATA_FORMAT # "parquet" or "csv", see --format
 fake = Faker()
 
 os.makedirs(LOCAL_DATA_FOLDER, exist_ok=True)
 
+# --- Shared Helpers ---
+def is_rush_hour(hour):
+    return ((6 <= hour) & (hour <= 9)) | ((16 <= hour) & (hour <= 19))
+
+def hourly_index(num, start):
+    """Hourly timestamps plus their hour / weekday, as NumPy arrays."""
+    timestamps = pd.date_range(start, periods=num, freq="h")
+    return timestamps, timestamps.hour.to_numpy(), timestamps.dayofweek.to_numpy()
+
+def save_dataset(df, name):
+    storage.write_dataset(df, LOCAL_DATA_FOLDER, name, DATA_FORMAT)
+
 # --- 1. Traffic Simulation ---
-def generate_traffic_data(num, start):
+def generate_traffic_data(num, start, rng=None, save=True):
     print("Generating traffic data...")
-    data = []
-    for i in range(num):
-        timestamp = start + timedelta(hours=i)
-        hour, day = timestamp.hour, timestamp.weekday()
-        weather = random.choice(["Clear", "Rain", "Fog"])
-
-        count = 100 # Base
-        if 6 <= hour <= 9 or 16 <= hour <= 19: count += random.randint(100, 200) # Rush hour
-        if day >= 5: count = int(count * 0.7) # Weekend
-        if weather == "Rain": count = int(count * 0.8) # Bad weather
-
-        data.append({
-            "timestamp": timestamp, "hour": hour, "day_of_week": day,
-            "weather": weather, "vehicle_count": max(20, count + random.randint(-20, 20))
-        })
-    pd.DataFrame(data).to_csv(os.path.join(LOCAL_DATA_FOLDER, "traffic_data.csv"), index=False)
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    timestamps, hour, day = hourly_index(num, start)
+    weather = WEATHERS[rng.integers(0, len(WEATHERS), num)]
+
+    count = 100 + np.where(is_rush_hour(hour), rng.integers(100, 201, num), 0) # Base + rush hour
+    count = np.where(day >= 5, (count * 0.7).astype(np.int64), count) # Weekend
+    count = np.where(weather == "Rain", (count * 0.8).astype(np.int64), count) # Bad weather
+
+    df = pd.DataFrame({
+        "timestamp": timestamps, "hour": hour, "day_of_week": day,
+        "weather": weather, "vehicle_count": np.maximum(20, count + rng.integers(-20, 21, num))
+    })
+    if save: save_dataset(df, "traffic_data")
+    return df
 
 # --- 2. Energy Simulation ---
-def generate_energy_data(num, start):
+def generate_energy_data(num, start, rng=None, save=True):
     print("Generating energy data...")
-    data = []
-    for i in range(num):
-        timestamp = start + timedelta(hours=i)
-        hour, day = timestamp.hour, timestamp.weekday()
-        temp = 15 + np.sin(i / (24 * 7)) * 10 + random.uniform(-2, 2)
-
-        load = 500 # Base load
-        if 17 <= hour <= 21: load += 300 # Evening peak
-        if temp > 22: load += (temp - 22) * 20 # AC
-        if temp < 10: load += (10 - temp) * 15 # Heating
-
-        data.append({
-            "timestamp": timestamp, "hour": hour, "day_of_week": day,
-            "temperature": round(temp, 2), "grid_load_mw": max(300, int(load + random.randint(-30, 30)))
-        })
-    pd.DataFrame(data).to_csv(os.path.join(LOCAL_DATA_FOLDER, "energy_data.csv"), index=False)
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    timestamps, hour, day = hourly_index(num, start)
+    temp = 15 + np.sin(np.arange(num) / (24 * 7)) * 10 + rng.uniform(-2, 2, num)
+
+    load = 500 + np.where((17 <= hour) & (hour <= 21), 300, 0) # Base load + evening peak
+    load = load + np.where(temp > 22, (temp - 22) * 20, 0) # AC
+    load = load + np.where(temp < 10, (10 - temp) * 15, 0) # Heating
+
+    df = pd.DataFrame({
+        "timestamp": timestamps, "hour": hour, "day_of_week": day,
+        "temperature": np.round(temp, 2),
+        "grid_load_mw": np.maximum(300, np.trunc(load + rng.integers(-30, 31, num)).astype(np.int64))
+    })
+    if save: save_dataset(df, "energy_data")
+    return df
 
 # --- 3. Waste Simulation ---
-def generate_waste_data(num, start):
+def generate_waste_data(num, start, rng=None, save=True):
     print("Generating waste data...")
-    BINS = [f"bin_{i}" for i in range(1, 50)]
-    data = []
-    bin_states = {bin_id: {'fill': 0, 'type': random.choice(["Landfill", "Recycling"])} for bin_id in BINS}
-
-    for i in range(num // 50): # Simulate daily updates per bin type
-        timestamp = start + timedelta(days=i)
-        for bin_id, state in bin_states.items():
-            # Simulate fill rate variation
-            fill_increase = random.randint(3, 15) if state['type'] == "Landfill" else random.randint(2, 10)
-            state['fill'] += fill_increase
-            if state['fill'] > 100: state['fill'] = 100
-
-            data.append({
-                "timestamp": timestamp, "bin_id": bin_id, "bin_type": state['type'],
-                "fill_level_percent": state['fill']
-            })
-            # Simulate collection based on fill level and randomness
-            if state['fill'] > random.randint(75, 95) and random.random() > 0.1:
-                state['fill'] = 0 # Bin collected
-
-    pd.DataFrame(data).to_csv(os.path.join(LOCAL_DATA_FOLDER, "waste_data.csv"), index=False)
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    BINS = np.array([f"bin_{i}" for i in range(1, 50)])
+    days, n_bins = num // 50, len(BINS) # Simulate daily updates per bin
+    bin_types = BIN_TYPES[rng.integers(0, len(BIN_TYPES), n_bins)]
+    landfill = bin_types == "Landfill"
+
+    # Draw every day's randomness up front, then step all bins one day at a time
+    fill_increase = np.where(landfill, rng.integers(3, 16, (days, n_bins)), rng.integers(2, 11, (days, n_bins)))
+    collect_threshold = rng.integers(75, 96, (days, n_bins))
+    collect_chance = rng.random((days, n_bins))
+
+    fill = np.zeros(n_bins, dtype=np.int64)
+    fill_levels = np.empty((days, n_bins), dtype=np.int64)
+    for d in range(days):
+        fill = np.minimum(fill + fill_increase[d], 100)
+        fill_levels[d] = fill
+        # Simulate collection based on fill level and randomness
+        fill = np.where((fill > collect_threshold[d]) & (collect_chance[d] > 0.1), 0, fill)
+
+    df = pd.DataFrame({
+        "timestamp": np.repeat(pd.date_range(start, periods=days, freq="D"), n_bins),
+        "bin_id": np.tile(BINS, days), "bin_type": np.tile(bin_types, days),
+        "fill_level_percent": fill_levels.ravel()
+    })
+    if save: save_dataset(df, "waste_data")
+    return df
 
 # --- 4. Pollution Simulation ---
-def generate_pollution_data(num, start):
+def generate_pollution_data(num, start, rng=None, save=True):
     print("Generating pollution data...")
-    data = []
-    for i in range(num):
-        timestamp = start + timedelta(hours=i)
-        hour = timestamp.hour
-        traffic_level = "Low"
-        if 6 <= hour <= 9 or 16 <= hour <= 19: traffic_level = "High"
-
-        aqi = 30 # Base
-        if traffic_level == "High": aqi += random.randint(20, 50)
-        aqi += (np.sin(i / 24) * 10) # Simulate daily cycle variation
-
-        data.append({
-            "timestamp": timestamp, "hour": hour, "traffic_level": traffic_level,
-            "aqi": max(20, int(aqi + random.randint(-5, 5)))
-        })
-    pd.DataFrame(data).to_csv(os.path.join(LOCAL_DATA_FOLDER, "pollution_data.csv"), index=False)
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    timestamps, hour, _ = hourly_index(num, start)
+    high_traffic = is_rush_hour(hour)
+
+    aqi = 30 + np.where(high_traffic, rng.integers(20, 51, num), 0) # Base + traffic
+    aqi = aqi + np.sin(np.arange(num) / 24) * 10 # Simulate daily cycle variation
+
+    df = pd.DataFrame({
+        "timestamp": timestamps, "hour": hour, "traffic_level": np.where(high_traffic, "High", "Low"),
+        "aqi": np.maximum(20, np.trunc(aqi + rng.integers(-5, 6, num)).astype(np.int64))
+    })
+    if save: save_dataset(df, "pollution_data")
+    return df
 
 # --- 5. Emergency Simulation ---
-def generate_emergency_data(num, start):
+def generate_emergency_data(num, start, rng=None, save=True):
     print("Generating emergency data...")
-    data = []
-    for i in range(num):
-        timestamp = start + timedelta(hours=i)
-        hour, day = timestamp.hour, timestamp.weekday()
-        weather = random.choice(["Clear", "Rain", "Fog"])
-        traffic_level = "Low"
-        if 6 <= hour <= 9 or 16 <= hour <= 19: traffic_level = "High"
-
-        # Calculate probability based on factors
-        prob = 0.01 # Base probability
-        if weather == "Rain": prob += 0.05
-        if traffic_level == "High": prob += 0.03
-        if hour > 22 or hour < 6: prob += 0.02 # Night time increases risk
-
-        incident_happened = 1 if random.random() < prob else 0
-
-        data.append({
-            "timestamp": timestamp, "hour": hour, "day_of_week": day,
-            "weather": weather, "traffic_level": traffic_level,
-            "incident_happened": incident_happened
-        })
-    pd.DataFrame(data).to_csv(os.path.join(LOCAL_DATA_FOLDER, "emergency_data.csv"), index=False)
+    rng = rng if rng is not None else np.random.default_rng(SEED)
+    timestamps, hour, day = hourly_index(num, start)
+    weather = WEATHERS[rng.integers(0, len(WEATHERS), num)]
+    high_traffic = is_rush_hour(hour)
+
+    # Calculate probability based on factors
+    prob = np.full(num, 0.01) # Base probability
+    prob += np.where(weather == "Rain", 0.05, 0)
+    prob += np.where(high_traffic, 0.03, 0)
+    prob += np.where((hour > 22) | (hour < 6), 0.02, 0) # Night time increases risk
+
+    df = pd.DataFrame({
+        "timestamp": timestamps, "hour": hour, "day_of_week": day,
+        "weather": weather, "traffic_level": np.where(high_traffic, "High", "Low"),
+        "incident_happened": (rng.random(num) < prob).astype(np.int64)
+    })
+    if save: save_dataset(df, "emergency_data")
+    return df
 
 # --- Main Executor ---
 if __name__ == "__main__":
-    generate_traffic_data(NUM_RECORDS, START_DATE)
-    generate_energy_data(NUM_RECORDS, START_DATE)
-    generate_waste_data(NUM_RECORDS, START_DATE)
-    generate_pollution_data(NUM_RECORDS, START_DATE)
-    generate_emergency_data(NUM_RECORDS, START_DATE)
+    parser = argparse.ArgumentParser(description="Generate synthetic smart city data and upload it to S3.")
+    parser.add_argument("--num-records", type=int, default=NUM_RECORDS, help="Hourly rows per dataset.")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--format", choices=list(storage.EXTENSIONS), default=DATA_FORMAT,
+                        help="File format for the generated datasets.")
+    args = parser.parse_args()
+    DATA_FORMAT = args.format
+
+    rng = np.random.default_rng(args.seed)
+    generate_traffic_data(args.num_records, START_DATE, rng)
+    generate_energy_data(args.num_records, START_DATE, rng)
+    generate_waste_data(args.num_records, START_DATE, rng)
+    generate_pollution_data(args.num_records, START_DATE, rng)
+    generate_emergency_data(args.num_records, START_DATE, rng)
 
     print(f"\nAll 5 datasets generated in '{LOCAL_DATA_FOLDER}' folder.")
 
@@ -0,0 +1,145 @@
+# storage.py
+import pandas as pd
+import hashlib
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError: # pyarrow is optional, CSV still works without it
+    HAS_PARQUET = False
+
+# Preferred on-disk format for the raw datasets ("parquet" or "csv"). Reads
+# fall back to the other format when only that file exists.
+DATA_FORMAT = os.environ.get("SMART_CITY_DATA_FORMAT", "parquet" if HAS_PARQUET else "csv")
+EXTENSIONS = {"parquet": ".parquet", "csv": ".csv"}
+
+# Microseconds, not pandas' old nanosecond default: ns timestamps end in 2262,
+# which hourly data from 2025 passes after ~2.1M rows
+TIMESTAMP_DTYPE = "datetime64[us]"
+# Typed columns for every raw dataset; applied on write and on CSV reads so
+# both formats hand the ETL the same dtypes.
+SCHEMAS = {
+    "traffic_data": {"timestamp": TIMESTAMP_DTYPE, "hour": "int8", "day_of_week": "int8",
+                     "weather": "category", "vehicle_count": "int32"},
+    "energy_data": {"timestamp": TIMESTAMP_DTYPE, "hour": "int8", "day_of_week": "int8",
+                    "temperature": "float64", "grid_load_mw": "int32"},
+    "waste_data": {"timestamp": TIMESTAMP_DTYPE, "bin_id": "category", "bin_type": "category",
+                   "fill_level_percent": "int8"},
+    "pollution_data": {"timestamp": TIMESTAMP_DTYPE, "hour": "int8", "traffic_level": "category",
+                       "aqi": "int16"},
+    "emergency_data": {"timestamp": TIMESTAMP_DTYPE, "hour": "int8", "day_of_week": "int8",
+                       "weather": "category", "traffic_level": "category", "incident_happened": "int8"},
+}
+
+def file_digest(path):
+    """sha256 of a file's contents, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def apply_schema(df, name):
+    """Casts a raw dataset's columns to their SCHEMAS dtypes."""
+    return df.astype({col: dtype for col, dtype in SCHEMAS[name].items() if col in df.columns})
+
+def dataset_path(folder, name):
+    """Path of the dataset file to read (preferred format first), or None if missing."""
+    formats = [DATA_FORMAT] + [fmt for fmt in EXTENSIONS if fmt != DATA_FORMAT]
+    for fmt in formats:
+        if fmt == "parquet" and not HAS_PARQUET:
+            continue
+        path = os.path.join(folder, name + EXTENSIONS[fmt])
+        if os.path.exists(path):
+            return path
+    return None
+
+def write_dataset(df, folder, name, fmt=None):
+    """Writes a raw dataset with typed columns, removing a stale copy in the other format."""
+    fmt = fmt or DATA_FORMAT
+    df = apply_schema(df, name)
+    path = os.path.join(folder, name + EXTENSIONS[fmt])
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    for other, ext in EXTENSIONS.items():
+        other_path = os.path.join(folder, name + ext)
+        if other != fmt and os.path.exists(other_path):
+            os.remove(other_path)
+    return path
+
+def dataset_columns(folder, name):
+    """Column names of a raw dataset (from the Parquet schema or CSV header only); None if missing."""
+    path = dataset_path(folder, name)
+    if path is None:
+        return None
+    if path.endswith(".parquet"):
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def _read_csv_kwargs(name, columns):
+    schema = SCHEMAS[name]
+    wanted = [col for col in columns or schema if col in schema] # Extra columns (e.g. segment_id) stay untyped
+    return {"usecols": columns,
+            "dtype": {col: schema[col] for col in wanted if not schema[col].startswith("datetime")},
+            "parse_dates": [col for col in wanted if schema[col].startswith("datetime")]}
+
+def read_dataset(folder, name, columns=None, since=None):
+    """Reads a raw dataset (only `columns`, if given); None if it doesn't exist.
+
+    With `since`, only rows with a later timestamp are returned. Parquet reads
+    skip the row groups that lie entirely before it.
+    """
+    path = dataset_path(folder, name)
+    if path is None:
+        return None
+    if path.endswith(".parquet"):
+        filters = None if since is None else [("timestamp", ">", pd.Timestamp(since))]
+        return pd.read_parquet(path, columns=columns, filters=filters)
+    df = pd.read_csv(path, **_read_csv_kwargs(name, columns))
+    return df if since is None else df[df['timestamp'] > pd.Timestamp(since)]
+
+def iter_dataset(folder, name, columns=None, chunksize=100_000):
+    """Yields a raw dataset in DataFrame chunks of up to `chunksize` rows."""
+    path = dataset_path(folder, name)
+    if path is None:
+        return
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, **_read_csv_kwargs(name, columns))
+
+class ChunkWriter:
+    """Appends DataFrame chunks to one dataset file (Parquet row groups or CSV rows)."""
+
+    def __init__(self, folder, name, fmt=None):
+        self.fmt = fmt or DATA_FORMAT
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, name + EXTENSIONS[self.fmt])
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.rows = 0
+        self._parquet_writer = None
+
+    def write(self, df):
+        if df.empty:
+            return
+        if self.fmt == "parquet":
+            if self._parquet_writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._parquet_writer.schema, preserve_index=False)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
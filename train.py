@@ -4,9 +4,15 @@ from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, accuracy_score
 import joblib
+import json
 import os
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 import etl # Our ETL script
+import feature_cache # Cached ETL output, keyed on the raw file contents
 import aws_utils # Our S3 script
+import metrics # Prometheus-style timers and counters
 import numpy as np # Make sure numpy is imported
 
 LOCAL_DATA_FOLDER = "data"
@@ -14,53 +20,364 @@ LOCAL_MODEL_FOLDER = "models"
 os.makedirs(LOCAL_MODEL_FOLDER, exist_ok=True)
 os.makedirs(LOCAL_DATA_FOLDER, exist_ok=True) # Ensure data folder exists for download
 
-def train_model(model_name, features_df, model_type='regressor'):
-    """Helper function to train and save a model."""
+# Full input grids (raw API fields) of the models whose inputs are all discrete.
+# With --materialize, every grid point is scored after fitting and saved as a
+# lookup table that app.py serves without touching the forest.
+MATERIALIZE_GRIDS = {
+    "emergency_model": {"hour": list(range(24)), "day_of_week": list(range(7)),
+                        "weather": ["Clear", "Rain", "Fog"], "traffic_level": ["Low", "High"]},
+    "pollution_model": {"hour": list(range(24)), "traffic_level": ["Low", "High"],
+                        "aqi": list(range(0, 301))}, # Integer AQI, same range as the dashboard input
+}
+
+# Forest settings shared by every model train.py fits
+FOREST_PARAMS = {"n_estimators": 100, "random_state": 42, "max_depth": 10, "min_samples_leaf": 5}
+TUNED_PARAMS_FILE = "tuned_params.json" # Per-model overrides of FOREST_PARAMS, written by tune.py --apply
+
+def forest_params(model_name):
+    """FOREST_PARAMS with the model's tuned settings (if any) on top."""
+    params = dict(FOREST_PARAMS)
+    if os.path.exists(TUNED_PARAMS_FILE):
+        with open(TUNED_PARAMS_FILE) as f:
+            params.update(json.load(f).get(model_name, {}))
+    return params
+
+def replace_file(path, write):
+    """Writes path via write(tmp_path) + rename, so an API watching the model
+    folder never sees a half-written file or has one truncated under its mmap."""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def materialize_model(model_name, model, feature_columns, model_type):
+    """Scores the model's whole input grid and saves it next to the .joblib."""
+    grid = MATERIALIZE_GRIDS[model_name]
+    fields = list(grid)
+    grid_df = pd.MultiIndex.from_product([grid[f] for f in fields], names=fields).to_frame(index=False)
+    # Same encoding the API applies to raw input
+    X_grid = pd.get_dummies(grid_df).reindex(columns=feature_columns, fill_value=0)
+
+    if model_type == 'regressor':
+        values = model.predict(X_grid)
+    else:
+        values = model.predict_proba(X_grid)[:, 1] # Probability of class '1'
+    values = values.reshape([len(grid[f]) for f in fields])
+
+    table_path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_table.npz")
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f: # A file object stops np.savez appending ".npz"
+            np.savez(f, values=values, fields=np.array(fields),
+                     **{f"axis_{f}": np.array(grid[f]) for f in fields})
+    replace_file(table_path, write)
+    print(f"Lookup table saved locally: {table_path} ({values.size} grid points, {values.nbytes / 1024:.1f} KB)")
+
+def train_model(model_name, features_df, model_type='regressor', materialize=False, n_jobs=-1):
+    """Helper function to train and save a model.
+
+    n_jobs is the number of threads the forest uses. Returns the seconds spent
+    per phase (fit / eval / save), or None if there was nothing to train on.
+    """
     print(f"\n--- Training {model_name} ---")
 
     if features_df.empty:
         print(f"Skipping {model_name}: Input DataFrame is empty (ETL might have failed or data missing).")
         return
 
-    # Split data into features (X) and target (y)
-    X = features_df.drop('target', axis=1)
-    y = features_df['target']
+    # Split data into features (X) and target (y); multi-horizon frames have one target_<h>h column per horizon
+    target_columns = [c for c in features_df.columns if c == 'target' or str(c).startswith('target_')]
+    X = features_df.drop(columns=target_columns)
+    y = features_df[target_columns] if len(target_columns) > 1 else features_df[target_columns[0]]
 
     # Ensure all feature names are strings (important for consistency)
     X.columns = X.columns.astype(str)
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    timings = {}
 
     if model_type == 'regressor':
         # Use RandomForestRegressor for continuous values
-        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1, max_depth=10, min_samples_leaf=5)
+        model = RandomForestRegressor(n_jobs=n_jobs, **forest_params(model_name))
+        start = time.perf_counter()
         model.fit(X_train, y_train)
+        timings["fit"] = time.perf_counter() - start
 
         # Evaluate
+        start = time.perf_counter()
         preds = model.predict(X_test)
         mse = mean_squared_error(y_test, preds) # Calculate Mean Squared Error
         rmse = np.sqrt(mse)                     # Calculate Root Mean Squared Error
-        print(f"Model RMSE (Root Mean Squared Error): {rmse:.2f}")
+        if y.ndim > 1: # mean_squared_error averages the outputs
+            print(f"Model RMSE (Root Mean Squared Error), mean over {y.shape[1]} horizons: {rmse:.2f}")
+        else:
+            print(f"Model RMSE (Root Mean Squared Error): {rmse:.2f}")
 
     else: # classifier
         # Use RandomForestClassifier for probabilities (emergency)
-        model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1, max_depth=10, min_samples_leaf=5)
+        model = RandomForestClassifier(n_jobs=n_jobs, **forest_params(model_name))
+        start = time.perf_counter()
         model.fit(X_train, y_train)
+        timings["fit"] = time.perf_counter() - start
 
         # Evaluate
+        start = time.perf_counter()
         preds = model.predict(X_test)
         acc = accuracy_score(y_test, preds)
         print(f"Model Accuracy: {acc*100:.2f}%")
+    timings["eval"] = time.perf_counter() - start
 
     # Save model locally
+    start = time.perf_counter()
     model_path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}.joblib")
-    joblib.dump(model, model_path)
+    # Uncompressed so app.py can memory-map it
+    replace_file(model_path, lambda tmp_path: joblib.dump(model, tmp_path, compress=0))
     print(f"Model saved locally: {model_path}")
 
     # Also save the feature columns, we need them for prediction
-    joblib.dump(list(X.columns), os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_features.joblib"))
+    replace_file(os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_features.joblib"),
+                 lambda tmp_path: joblib.dump(list(X.columns), tmp_path))
+    if y.ndim > 1: # And which output is which horizon
+        replace_file(os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_targets.joblib"),
+                     lambda tmp_path: joblib.dump(target_columns, tmp_path))
+
+    table_path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_table.npz")
+    if materialize and model_name in MATERIALIZE_GRIDS:
+        materialize_model(model_name, model, list(X.columns), model_type)
+    elif os.path.exists(table_path):
+        os.remove(table_path) # A table from an older model would no longer match
+    if os.path.exists(watermark_path(model_name)):
+        os.remove(watermark_path(model_name)) # It records what the previous forest learned
+    timings["save"] = time.perf_counter() - start
+    return timings
+
+# --- Parallel Training Orchestrator ---
+# (model name, ETL domain, model type) for every model train.py builds
+TRAINING_JOBS = [
+    ("traffic_model", "traffic", 'regressor'),
+    ("energy_model", "energy", 'regressor'),
+    ("waste_model", "waste", 'regressor'),
+    ("pollution_model", "pollution", 'regressor'),
+    ("emergency_model", "emergency", 'classifier'),
+]
+# Multi-output forests forecasting every hour in etl.HORIZONS at once (train.py --horizons)
+HORIZON_JOBS = [(f"{domain}_horizons_model", domain, 'multi_horizon') for domain in etl.HORIZON_DOMAINS]
+PHASES = ["etl", "fit", "eval", "save"]
+
+def train_domain(model_name, domain, model_type, n_jobs=-1, rebuild_features=False, materialize=False,
+                 horizons=etl.HORIZONS, incremental=False, compare_full=False):
+    """ETL + fit + save for one domain. Never raises, so one failure can't stop the others.
+
+    model_type 'multi_horizon' fits one regressor on all `horizons` (always
+    from scratch); with `incremental` the other models go through train_incremental.
+    Returns (model_name, status, {phase: seconds}).
+    """
+    if incremental and model_type != 'multi_horizon':
+        return train_incremental(model_name, domain, model_type, n_jobs, materialize, compare_full)
+    timings = {}
+    try:
+        start = time.perf_counter()
+        if model_type == 'multi_horizon':
+            features_df = feature_cache.load_features(domain, rebuild=rebuild_features, horizons=horizons)
+            model_type = 'regressor'
+        else:
+            features_df = feature_cache.load_features(domain, rebuild=rebuild_features)
+        timings["etl"] = time.perf_counter() - start
+        fit_timings = train_model(model_name, features_df, model_type, materialize, n_jobs)
+        if fit_timings is None:
+            return model_name, "skipped", timings
+        timings.update(fit_timings)
+        return model_name, "ok", timings
+    except Exception as e:
+        print(f"Error training {domain} model: {e}")
+        return model_name, f"failed: {e}", timings
+
+# --- Incremental Training (train.py --incremental) ---
+# Each model keeps a watermark: the timestamp of the newest raw row it has
+# learned from. A run reads only the rows after it, fits INCREMENTAL_TREES new
+# trees on them with warm_start and retires the oldest trees, so the forest
+# stays at its n_estimators (forest_params) trees and a run costs the same
+# however long the history gets.
+INCREMENTAL_TREES = 20 # Trees added per run, fit on the new rows only
+MIN_INCREMENTAL_ROWS = 100 # Fewer new rows than this: keep the current model
+WATERMARK_HISTORY = 100 # Past runs kept in the watermark file
+
+def watermark_path(model_name):
+    return os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_watermark.json")
+
+def load_watermark(model_name):
+    """The model's watermark state, or None if it has none (never trained incrementally)."""
+    path = watermark_path(model_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_watermark(model_name, watermark, rows, mode, holdout=None, previous=None):
+    history = (previous or {}).get("history", [])
+    history.append({"watermark": watermark.isoformat(), "rows": rows, "mode": mode, "holdout": holdout,
+                    "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+    state = {"watermark": watermark.isoformat(), "history": history[-WATERMARK_HISTORY:]}
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+    replace_file(watermark_path(model_name), write)
+
+def holdout_score(model, X, y, model_type):
+    """RMSE (regressors) or accuracy (classifiers) on rows the model hasn't learned."""
+    if model_type == 'regressor':
+        return float(np.sqrt(mean_squared_error(y, model.predict(X))))
+    return float(accuracy_score(y, model.predict(X)))
+
+def train_incremental(model_name, domain, model_type, n_jobs=-1, materialize=False, compare_full=False):
+    """Grows the saved forest on the rows after its watermark; a full refit if it has none.
+
+    The new rows are scored by the current model before it learns them, so
+    the holdout quality is always on unseen data. With compare_full, a forest
+    refit from scratch on all rows up to the watermark is scored on the same
+    rows. Never raises; returns (model_name, status, {phase: seconds}).
+    """
+    timings = {}
+    model_path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}.joblib")
+    try:
+        previous = load_watermark(model_name)
+        since = pd.Timestamp(previous["watermark"]) if previous and os.path.exists(model_path) else None
+        start = time.perf_counter()
+        features_df = etl.prepare_forecast_since(domain, since)
+        timings["etl"] = time.perf_counter() - start
+
+        if since is None:
+            print(f"{model_name}: no watermark yet, full refit on {len(features_df)} rows.")
+            fit_timings = train_model(model_name, features_df.reset_index(drop=True), model_type, materialize, n_jobs)
+            if fit_timings is None:
+                return model_name, "skipped", timings
+            timings.update(fit_timings)
+            save_watermark(model_name, features_df.index.max(), len(features_df), "full")
+            return model_name, "ok", timings
+        if len(features_df) < MIN_INCREMENTAL_ROWS:
+            print(f"{model_name}: {len(features_df)} new rows since {since}, keeping the current model.")
+            return model_name, "unchanged", timings
+
+        model = joblib.load(model_path)
+        feature_columns = joblib.load(os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_features.joblib"))
+        X = features_df.drop(columns='target').reindex(columns=feature_columns, fill_value=0)
+        y = features_df['target']
+        if model_type == 'classifier' and not np.array_equal(np.unique(y), model.classes_):
+            # New trees must predict the same classes as the old ones
+            print(f"{model_name}: new rows don't contain every class, full refit instead.")
+            os.remove(watermark_path(model_name))
+            return train_incremental(model_name, domain, model_type, n_jobs, materialize, compare_full)
+
+        start = time.perf_counter()
+        holdout = {"metric": "rmse" if model_type == 'regressor' else "accuracy",
+                   "incremental": holdout_score(model, X, y, model_type)}
+        timings["eval"] = time.perf_counter() - start
+        if compare_full:
+            start = time.perf_counter()
+            history = etl.prepare_forecast_since(domain)
+            history = history[history.index <= since]
+            forest = RandomForestRegressor if model_type == 'regressor' else RandomForestClassifier
+            full = forest(n_jobs=n_jobs, **forest_params(model_name)).fit(
+                history.drop(columns='target').reindex(columns=feature_columns, fill_value=0), history['target'])
+            holdout["full_refit"] = holdout_score(full, X, y, model_type)
+            timings["compare"] = time.perf_counter() - start
+        print(f"{model_name}: {len(features_df)} new rows since {since}, holdout {holdout['metric']} "
+              + ", ".join(f"{name} {value:.3f}" for name, value in holdout.items() if name != "metric"))
+
+        start = time.perf_counter()
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_TREES, n_jobs=n_jobs)
+        model.fit(X, y) # Fits only the added trees
+        retired = len(model.estimators_) - forest_params(model_name)["n_estimators"]
+        if retired > 0:
+            model.estimators_ = model.estimators_[retired:] # Oldest first
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+        timings["fit"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        replace_file(model_path, lambda tmp_path: joblib.dump(model, tmp_path, compress=0))
+        table_path = os.path.join(LOCAL_MODEL_FOLDER, f"{model_name}_table.npz")
+        if materialize and model_name in MATERIALIZE_GRIDS:
+            materialize_model(model_name, model, feature_columns, model_type)
+        elif os.path.exists(table_path):
+            os.remove(table_path)
+        save_watermark(model_name, features_df.index.max(), len(features_df), "incremental", holdout, previous)
+        timings["save"] = time.perf_counter() - start
+        print(f"{model_name}: +{INCREMENTAL_TREES} trees, {max(retired, 0)} retired, watermark "
+              f"{features_df.index.max()}")
+        return model_name, "ok", timings
+    except Exception as e:
+        print(f"Error training {domain} model incrementally: {e}")
+        return model_name, f"failed: {e}", timings
+
+def train_all(jobs=TRAINING_JOBS, cores=None, workers=None, rebuild_features=False, materialize=False,
+              horizons=etl.HORIZONS, incremental=False, compare_full=False):
+    """Runs every domain's ETL + fit concurrently within a core budget.
+
+    `workers` domain pipelines run in separate processes, and each forest gets
+    cores // workers threads, so the two levels together use `cores` cores.
+    """
+    job_args = (rebuild_features, materialize, horizons, incremental, compare_full)
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers or len(jobs), len(jobs), cores))
+    tree_jobs = max(1, cores // workers)
+    print(f"Training {len(jobs)} models: {workers} domain process(es) x {tree_jobs} tree thread(s), {cores} core(s).")
+
+    start = time.perf_counter()
+    if workers == 1: # No pool needed, run in this process
+        results = [train_domain(*job, tree_jobs, *job_args) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(job[0], pool.submit(train_domain, *job, tree_jobs, *job_args)) for job in jobs]
+            results = []
+            for model_name, future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e: # e.g. the worker process was killed
+                    print(f"Error training {model_name}: {e}")
+                    results.append((model_name, f"failed: {e}", {}))
+
+    for model_name, _, timings in results: # Phases ran in worker processes, record them here
+        for phase, seconds in timings.items():
+            metrics.TRAINING_PHASE_SECONDS.observe(seconds, model_name, phase)
+    print_training_summary(results, time.perf_counter() - start)
+    return results
+
+def print_training_summary(results, wall_clock):
+    print("\n--- Training Summary (seconds) ---")
+    print(f"{'model':<26}{'status':<10}" + "".join(f"{phase:>8}" for phase in PHASES) + f"{'total':>8}")
+    for model_name, status, timings in results:
+        cells = "".join(f"{timings[phase]:8.2f}" if phase in timings else f"{'-':>8}" for phase in PHASES)
+        print(f"{model_name:<26}{status.split(':')[0]:<10}{cells}{sum(timings.values()):8.2f}")
+    print(f"Wall clock: {wall_clock:.2f}s")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ETL and train all smart city models.")
+    parser.add_argument("--materialize", action="store_true",
+                        help="Also save precomputed lookup tables for the discrete-input models "
+                             f"({', '.join(MATERIALIZE_GRIDS)}).")
+    parser.add_argument("--rebuild-features", action="store_true",
+                        help="Ignore the feature cache and rerun the ETL for every domain.")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="Total core budget for training (default: all cores).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Domains trained concurrently (default: one per domain, capped at --cores). "
+                             "Each forest gets cores // workers threads; 1 trains sequentially.")
+    parser.add_argument("--horizons", default=None,
+                        help="Also train one multi-output model per hourly domain "
+                             f"({', '.join(etl.HORIZON_DOMAINS)}) forecasting these hours ahead, "
+                             "e.g. '1-24' or '1,3,6,12,24'.")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write ETL/fit/S3 timings here in Prometheus text format when done "
+                             "(e.g. for node_exporter's textfile collector).")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Only learn the rows after each model's watermark: add {INCREMENTAL_TREES} trees fit "
+                             "on them and retire as many of the oldest (a full refit when a model has no watermark).")
+    parser.add_argument("--compare-full-refit", action="store_true",
+                        help="With --incremental, also refit each model from scratch on its whole history "
+                             "and report both on the new rows (slow: this is the cost --incremental avoids).")
+    parser.add_argument("--compress", action="store_true",
+                        help="Also write a compact copy of each model for serving (see compress.py); "
+                             "models that already have one always get it refreshed.")
+    args = parser.parse_args()
+
     # 1. Download data from S3
     aws_utils.download_from_s3(LOCAL_DATA_FOLDER, aws_utils.DATA_BUCKET)
 
@@ -70,31 +387,37 @@ if __name__ == "__main__":
         print(f"Please check S3 bucket '{aws_utils.DATA_BUCKET}' and credentials.")
     else:
         print("\nStarting ETL and Training process...")
-        # 2. Run ETL (locally on downloaded data) and train models
-        # Error handling for each ETL step
-        try:
-            train_model("traffic_model", etl.prepare_traffic_forecast(), model_type='regressor')
-        except Exception as e:
-            print(f"Error training traffic model: {e}")
-        try:
-            train_model("energy_model", etl.prepare_energy_forecast(), model_type='regressor')
-        except Exception as e:
-            print(f"Error training energy model: {e}")
-        try:
-            train_model("waste_model", etl.prepare_waste_forecast(), model_type='regressor')
-        except Exception as e:
-            print(f"Error training waste model: {e}")
-        try:
-            train_model("pollution_model", etl.prepare_pollution_forecast(), model_type='regressor')
-        except Exception as e:
-            print(f"Error training pollution model: {e}")
-        try:
-            train_model("emergency_model", etl.prepare_emergency_forecast(), model_type='classifier')
-        except Exception as e:
-            print(f"Error training emergency model: {e}")
+        # 2. Run ETL (locally on downloaded data) and train models, one process per domain.
+        # Errors are handled per domain inside train_domain.
+        jobs = TRAINING_JOBS + (HORIZON_JOBS if args.horizons else [])
+        horizons = etl.parse_horizons(args.horizons) if args.horizons else etl.HORIZONS
+        results = train_all(jobs, cores=args.cores, workers=args.workers, rebuild_features=args.rebuild_features,
+                            materialize=args.materialize, horizons=horizons, incremental=args.incremental,
+                            compare_full=args.compare_full_refit)
+
+        import compress # Our compression script (imports this one)
+        # app.py serves a model's compact file, and doesn't even download its .joblib when S3 has one,
+        # so every compact copy of a retrained model, here or on S3, is refreshed or else deleted
+        trained = [model_name for model_name, status, _ in results if status == "ok"]
+        remote = aws_utils.list_bucket(aws_utils.MODEL_BUCKET) # None if it can't be listed
+        to_compress = [model_name for model_name in trained if args.compress
+                       or os.path.exists(compress.compact_path(model_name))
+                       or os.path.basename(compress.compact_path(model_name)) in (remote or {})]
+        compressed = compress.compress_all(to_compress) if to_compress else {}
+        stale = [compress.compact_path(model_name) for model_name in trained if model_name not in compressed]
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+        # Deleted even if the listing failed; deleting a missing key is a no-op
+        aws_utils.delete_from_s3(LOCAL_MODEL_FOLDER, aws_utils.MODEL_BUCKET, [os.path.basename(path) for path in stale
+                                 if remote is None or os.path.basename(path) in remote])
 
         # 3. Upload trained models to S3 (only if models were created)
         if os.listdir(LOCAL_MODEL_FOLDER):
              aws_utils.upload_to_s3(LOCAL_MODEL_FOLDER, aws_utils.MODEL_BUCKET)
         else:
-            print("\nNo models were trained successfully, skipping upload to S3.")
\ No newline at end of file
+            print("\nNo models were trained successfully, skipping upload to S3.")
+
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
+        print(f"Metrics written to {args.metrics_file}")
\ No newline at end of file
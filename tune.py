@@ -0,0 +1,254 @@
+# tune.py
+import pandas as pd
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import etl # Our ETL script
+import feature_cache # For the raw-file content key
+import train # Forest settings, training jobs, tuned params file
+from forest_engine import CompiledForest
+
+# --- Configuration ---
+# Forest settings searched for every model (train.FOREST_PARAMS is one of the points)
+PARAM_GRID = {
+    "n_estimators": [25, 50, 100, 200],
+    "max_depth": [6, 10, 14],
+    "min_samples_leaf": [1, 5, 20],
+}
+N_FOLDS = 4 # Walk-forward folds: fold k trains on blocks 0..k, tests on block k+1
+TOLERANCE = 0.02 # Suggest the fastest forest whose CV error is within this of the best
+LATENCY_REPEATS = 200 # Single-row predictions timed per candidate
+TUNING_CACHE_FOLDER = ".tuning_cache"
+# How far ahead each domain's target lies: training rows this close to a test
+# block are purged, their target would be a test-period value
+TARGET_HORIZONS = {domain: pd.Timedelta(hours=spec["horizon"]) for domain, spec in etl.STREAM_SPECS.items()}
+TARGET_HORIZONS["waste"] = pd.Timedelta(days=1)
+
+# --- Fold Matrices ---
+def matrix_key(domain):
+    """Content key of the domain's raw file plus the ETL code that builds the matrix."""
+    raw_key = feature_cache.cache_key(domain)
+    if raw_key is None:
+        return None
+    source = inspect.getsource(etl.prepare_forecast_since) + inspect.getsource(build_matrices)
+    return hashlib.sha256(f"{raw_key}\0{source}".encode()).hexdigest()[:32]
+
+def build_matrices(domain, folder):
+    """Time-ordered X (float32, what the forests fit on anyway), y and timestamps, saved as .npy."""
+    features_df = etl.prepare_forecast_since(domain)
+    features_df = features_df.iloc[np.argsort(features_df.index.to_numpy(), kind="stable")]
+    os.makedirs(folder, exist_ok=True)
+    X = features_df.drop(columns='target')
+    for name, array in (("X", X.to_numpy(np.float32)), ("y", features_df['target'].to_numpy(np.float64)),
+                        ("timestamps", features_df.index.to_numpy(dtype='datetime64[us]'))):
+        np.save(os.path.join(folder, f"{name}.tmp.npy"), array)
+        os.replace(os.path.join(folder, f"{name}.tmp.npy"), os.path.join(folder, f"{name}.npy"))
+    with open(os.path.join(folder, "columns.json"), "w") as f:
+        json.dump(list(X.columns.astype(str)), f)
+
+def load_matrices(folder):
+    """Memory-mapped X, y, timestamps: every fold and every worker shares the same pages."""
+    return tuple(np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r") for name in ("X", "y", "timestamps"))
+
+def matrix_folder(domain, rebuild=False):
+    """Folder with the domain's cached matrices, built on first use or when the raw file changed."""
+    key = matrix_key(domain)
+    if key is None:
+        return None
+    folder = os.path.join(TUNING_CACHE_FOLDER, f"{domain}-{key}")
+    if rebuild or not os.path.exists(os.path.join(folder, "columns.json")):
+        start = time.perf_counter()
+        build_matrices(domain, folder)
+        print(f"Built {domain} fold matrices in {time.perf_counter() - start:.2f}s.")
+    else:
+        print(f"Reusing cached {domain} fold matrices.")
+    return folder
+
+def walk_forward_folds(timestamps, n_folds, horizon):
+    """(train_end, test_start, test_end) row ranges over the time-ordered rows.
+
+    The rows are cut into n_folds + 1 blocks; fold k trains on blocks 0..k
+    minus the rows whose target falls inside block k + 1, and tests on it.
+    """
+    bounds = np.linspace(0, len(timestamps), n_folds + 2).astype(int)
+    folds = []
+    for k in range(1, n_folds + 1):
+        test_start, test_end = bounds[k], bounds[k + 1]
+        train_end = int(np.searchsorted(timestamps, timestamps[test_start] - horizon.to_timedelta64(), side="left"))
+        if train_end > 0 and test_end > test_start:
+            folds.append((train_end, test_start, test_end))
+    return folds
+
+# --- Search ---
+def candidates(grid=PARAM_GRID):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def fold_error(model, X, y, model_type):
+    """RMSE for regressors, Brier score (squared error of the served probability) for classifiers."""
+    if model_type == 'regressor':
+        return float(np.sqrt(np.mean((model.predict(X) - y) ** 2)))
+    return float(np.mean((model.predict_proba(X)[:, 1] - y) ** 2))
+
+def single_row_latency_us(model, X, model_type):
+    """Median microseconds the API's compiled forest takes to score one row."""
+    engine = CompiledForest.from_sklearn(model)
+    predict = engine.predict if model_type == 'regressor' else engine.predict_proba
+    rows = np.asarray(X[:LATENCY_REPEATS], dtype=np.float64)
+    timings = []
+    for i in range(len(rows)):
+        start = time.perf_counter()
+        predict(rows[i:i + 1])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+def evaluate(folder, model_type, params, fold, n_jobs, measure_latency):
+    """Fits one candidate on one fold (runs in a worker process)."""
+    X, y, _ = load_matrices(folder)
+    train_end, test_start, test_end = fold
+    forest = RandomForestRegressor if model_type == 'regressor' else RandomForestClassifier
+    model = forest(n_jobs=n_jobs, **{**train.FOREST_PARAMS, **params})
+    start = time.perf_counter()
+    model.fit(X[:train_end], y[:train_end])
+    result = {"fit_seconds": time.perf_counter() - start,
+              "error": fold_error(model, X[test_start:test_end], y[test_start:test_end], model_type)}
+    if measure_latency:
+        result["latency_us"] = single_row_latency_us(model, X[test_start:test_end], model_type)
+        result["nodes"] = int(sum(estimator.tree_.node_count for estimator in model.estimators_))
+    return result
+
+def pareto_front(results):
+    """Candidates no other candidate beats on both CV error and latency, fastest first."""
+    front, best_error = [], np.inf
+    for result in sorted(results, key=lambda r: (r["latency_us"], r["error"])):
+        if result["error"] < best_error:
+            front.append(result)
+            best_error = result["error"]
+    return front
+
+def suggest(front, tolerance=TOLERANCE):
+    """The fastest forest on the front whose error is within `tolerance` of the best one."""
+    best_error = min(result["error"] for result in front)
+    return next(result for result in front if result["error"] <= best_error * (1 + tolerance))
+
+def tune_all(jobs=train.TRAINING_JOBS, grid=PARAM_GRID, n_folds=N_FOLDS, cores=None, workers=None,
+             rebuild=False, tolerance=TOLERANCE):
+    """Walk-forward CV of every grid point for every model, all folds and candidates in one pool.
+
+    Like train.train_all, `workers` fits run at once and each forest gets
+    cores // workers threads. Returns {model_name: report}.
+    """
+    tasks = [] # (model_name, candidate index, fold index, evaluate() args before n_jobs, measure_latency)
+    setups = {}
+    for model_name, domain, model_type in jobs:
+        folder = matrix_folder(domain, rebuild)
+        if folder is None:
+            print(f"Skipping {model_name}: no {domain} data found in '{etl.LOCAL_DATA_FOLDER}/'.")
+            continue
+        _, _, timestamps = load_matrices(folder)
+        folds = walk_forward_folds(timestamps, n_folds, TARGET_HORIZONS[domain])
+        setups[model_name] = {"model_type": model_type, "rows": len(timestamps), "folds": folds,
+                              "candidates": candidates(grid)}
+        for c, params in enumerate(setups[model_name]["candidates"]):
+            for f, fold in enumerate(folds):
+                # Latency is a property of the forest, measured once on the largest fold
+                tasks.append((model_name, c, f, (folder, model_type, params, fold), f == len(folds) - 1))
+
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers or cores, cores, len(tasks) or 1))
+    tree_jobs = max(1, cores // workers)
+    print(f"Tuning {len(setups)} models: {len(tasks)} fits ({len(candidates(grid))} candidates x {n_folds} folds "
+          f"each), {workers} process(es) x {tree_jobs} tree thread(s), {cores} core(s).")
+
+    start = time.perf_counter()
+    outcomes = {}
+    if workers == 1:
+        for model_name, c, f, args, measure_latency in tasks:
+            outcomes[model_name, c, f] = evaluate(*args, tree_jobs, measure_latency)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {(model_name, c, f): pool.submit(evaluate, *args, tree_jobs, measure_latency)
+                       for model_name, c, f, args, measure_latency in tasks}
+            for key, future in futures.items():
+                outcomes[key] = future.result()
+    print(f"Search finished in {time.perf_counter() - start:.1f}s.")
+
+    reports = {}
+    for model_name, setup in setups.items():
+        results = []
+        for c, params in enumerate(setup["candidates"]):
+            folds = [outcomes[model_name, c, f] for f in range(len(setup["folds"]))]
+            errors = [fold["error"] for fold in folds]
+            results.append({"params": params, "error": float(np.mean(errors)), "error_std": float(np.std(errors)),
+                            "fit_seconds": float(sum(fold["fit_seconds"] for fold in folds)),
+                            "latency_us": folds[-1]["latency_us"], "nodes": folds[-1]["nodes"]})
+        front = pareto_front(results)
+        baseline = next((r for r in results
+                         if all(train.FOREST_PARAMS.get(k) == v for k, v in r["params"].items())), None)
+        reports[model_name] = {"metric": "rmse" if setup["model_type"] == 'regressor' else "brier",
+                               "rows": setup["rows"], "folds": [list(map(int, fold)) for fold in setup["folds"]],
+                               "candidates": results, "pareto_front": front, "baseline": baseline,
+                               "suggested": suggest(front, tolerance)}
+    return reports
+
+def print_report(model_name, report):
+    print(f"\n--- {model_name}: latency vs accuracy Pareto front "
+          f"({report['metric']}, {len(report['folds'])} walk-forward folds, {report['rows']} rows) ---")
+    print(f"{'trees':>6}{'depth':>6}{'leaf':>6}{report['metric'] + ' (cv)':>16}{'latency us':>12}"
+          f"{'nodes':>9}{'fit s':>8}")
+    rows = list(report["pareto_front"])
+    if report["baseline"] is not None and not any(result is report["baseline"] for result in rows):
+        rows.append(report["baseline"]) # Off the front: something is both faster and more accurate
+    for result in rows:
+        params = result["params"]
+        tags = [tag for tag, entry in (("suggested", report["suggested"]), ("current", report["baseline"]))
+                if entry is result]
+        print(f"{params['n_estimators']:>6}{str(params['max_depth']):>6}{params['min_samples_leaf']:>6}"
+              f"{result['error']:10.4f} ±{result['error_std']:<5.3f}{result['latency_us']:12.1f}"
+              f"{result['nodes']:>9}{result['fit_seconds']:8.2f}  {', '.join(tags)}")
+
+def apply_suggestions(reports, path=train.TUNED_PARAMS_FILE):
+    """Saves each model's suggested params where train.py picks them up."""
+    tuned = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)
+    tuned.update({model_name: report["suggested"]["params"] for model_name, report in reports.items()})
+    with open(path, "w") as f:
+        json.dump(tuned, f, indent=2, sort_keys=True)
+    print(f"\nSuggested params saved to {path}, train.py will use them from the next run.")
+
+# --- Main Executor ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward CV search over the forest settings of every model.")
+    parser.add_argument("--models", nargs="+", choices=[job[0] for job in train.TRAINING_JOBS], default=None,
+                        help="Models to tune (default: all).")
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--cores", type=int, default=None, help="Total core budget (default: all cores).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Fits run concurrently (default: one per core); each gets cores // workers threads.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Suggest the fastest forest within this fraction of the best CV error.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the cached fold matrices.")
+    parser.add_argument("--report", default="tuning_report.json", help="Where to write the full JSON report.")
+    parser.add_argument("--apply", action="store_true",
+                        help=f"Save the suggested params to {train.TUNED_PARAMS_FILE} for train.py.")
+    args = parser.parse_args()
+
+    jobs = [job for job in train.TRAINING_JOBS if args.models is None or job[0] in args.models]
+    reports = tune_all(jobs, n_folds=args.folds, cores=args.cores, workers=args.workers, rebuild=args.rebuild,
+                       tolerance=args.tolerance)
+    for model_name, report in reports.items():
+        print_report(model_name, report)
+    with open(args.report, "w") as f:
+        json.dump(reports, f, indent=2)
+    print(f"\nFull report written to {args.report}")
+    if args.apply:
+        apply_suggestions(reports)